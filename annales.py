@@ -1,12 +1,17 @@
+import hashlib
 import json
 import os
-import re
-import unicodedata
-from typing import Any, Dict, List
+
+from snapshot import Snapshot, snapshot_path, write_snapshot
+from stats import compute_stats, load_stats, stats_path
+from topics import RULES_VERSION, standardize_topics
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
 
+STATE_FILE = "exercises_standardises.state.json"
+PAGES_FILE = "exercise_pages.json"  # plages de pages détectées par exercise_pages.py
+
 EXERCISES_CACHE = None
 
 def load_exercises(path):
@@ -18,107 +23,110 @@ def load_exercises(path):
 
 
 def get_themes(exos):
-    themes = []
+    # thèmes distincts, dans l'ordre d'apparition
+    return list(dict.fromkeys(theme for exo in exos for theme in exo["topics"]))
 
-    for exo in exos:
-        for theme in exo["topics"]:
-            if theme not in themes:
-                themes.append(theme)
-    
-    return themes
 
+def _record_hash(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
 
-def _strip_accents(s: str) -> str:
-    # enlève les accents (Amérique -> Amerique)
-    return "".join(
-        c for c in unicodedata.normalize("NFKD", s)
-        if not unicodedata.combining(c)
-    )
 
-
-def _normalize_topic(topic: str) -> str:
-    """
-    Normalise un topic vers un format homogène.
-    À adapter selon tes règles métier.
+def _occurrence_keys(records):
     """
-    if not isinstance(topic, str):
-        return ""
-
-    t = topic.strip().lower()
-    t = t.replace("’", "'")
-    t = _strip_accents(t)
-
-    # espaces propres
-    t = re.sub(r"\s+", " ", t)
-
-    contains_rules = [
-        ("objet", "poo"),
-        ("gloutons", "algorithmes gloutons"),
-        ("arbres", "arbres"),
-        ("arbre", "arbres"),
-        ("algo", "programmation"),
-        ("securite", "chiffrement"),
-        ("sql", "bases de donnees"),
-        ("programmation", "programmation"),
-        ("graphe", "graphes"),
-        ("liste", "listes"),
-        ("tableau", "tableaux"),
-        ("huffman", "divers"),
-        ("goban", "divers"),
-    ]
-
-    # règles "contient → devient"
-    for needle, replacement in contains_rules:
-        if needle in t:
-            return replacement
-
-    # exemples de standardisation (tu peux enrichir)
-    aliases = {
-        "poo": "programmation orientee objet",
-        "programmation orientee objet": "programmation orientee objet",
-        "programmation orientee objet (poo)": "programmation orientee objet",
-        "arbres binaires": "arbres binaires",
-        "recursivite": "recursivite",
-        "algorithmes": "algorithmes",
-    }
-    t = aliases.get(t, t)
-
-    return t
-
-
-def _standardize_topics(topics: Any) -> List[str]:
+    Clé par enregistrement : l'`id`, suffixé du rang d'apparition quand un
+    même id revient plusieurs fois (ex. sujets zéro de 2023/2024).
     """
-    - garde seulement les strings
-    - normalise
-    - supprime les vides
-    - supprime doublons en gardant l'ordre
-    - tri optionnel (désactivé ici, on garde l'ordre d'apparition)
-    """
-    if not isinstance(topics, list):
-        return []
-
-    seen = set()
-    out: List[str] = []
-    for x in topics:
-        if not isinstance(x, str):
-            continue
-        nx = _normalize_topic(x)
-        if not nx:
+    seen = {}
+    for obj in records:
+        ex_id = obj.get("id") if isinstance(obj, dict) else None
+        if ex_id is None:
+            yield None
             continue
-        if nx in seen:
+        n = seen.get(ex_id, 0)
+        seen[ex_id] = n + 1
+        yield ex_id if n == 0 else f"{ex_id}#{n}"
+
+
+def _apply_pages(records, ranges):
+    """Champ `pages` = [première, dernière] de l'exercice dans son sujet, s'il est connu."""
+    for obj in records:
+        if not isinstance(obj, dict):
             continue
-        seen.add(nx)
-        out.append(nx)
-    return out
+        r = ranges.get(obj.get("local_subject_file"), {}).get(str(obj.get("exercise")))
+        if r:
+            obj["pages"] = r
+        else:
+            obj.pop("pages", None)
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json_atomic(path: str, data, **dump_kwargs):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+    os.replace(tmp, path)
 
 
-def standardiser(DOWNLOADS_DIR: str) -> str:
+def _read_previous(out_path: str):
+    """Sortie précédente : depuis l'instantané binaire s'il est à jour (plus rapide), sinon le JSON."""
+    try:
+        snap = Snapshot(snapshot_path(out_path))
+        if snap.is_fresh(out_path):
+            return list(snap)
+    except (OSError, ValueError):
+        pass
+    return _read_json(out_path, None)
+
+
+def _content_version(path: str) -> str:
+    # même empreinte que la version du jeu de données côté serveur (dataset.py)
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def _update_snapshot(out_path: str, records, version: str):
+    """Réécrit l'instantané binaire s'il manque ou ne correspond plus au JSON."""
+    path = snapshot_path(out_path)
+    try:
+        if Snapshot(path).is_fresh(out_path):
+            return
+    except (OSError, ValueError):
+        pass
+    try:
+        write_snapshot(records, path, version, source_path=out_path)
+    except ValueError as e:
+        print(f"Instantané binaire non écrit : {e}")
+
+
+def _update_stats(out_path: str, records, version: str):
+    """Réécrit les statistiques des thèmes (stats.py) si elles ne correspondent plus au JSON."""
+    path = stats_path(out_path)
+    if load_stats(path, version) is None:
+        _write_json_atomic(path, compute_stats(records, version), separators=(",", ":"))
+
+
+def standardiser(DOWNLOADS_DIR: str, incremental: bool = True) -> str:
     """
     Entree  : path = os.path.join(DOWNLOADS_DIR, "exercises.json")
     Sortie  : path = os.path.join(DOWNLOADS_DIR, "exercises_standardises.json")
+
+    En mode incrémental, seuls les exercices nouveaux ou modifiés (hash de
+    l'enregistrement, par `id`) sont restandardisés ; tout est recalculé si
+    les règles de topics.py ont changé (RULES_VERSION). La sortie n'est
+    réécrite (atomiquement) que si son contenu change ; l'instantané binaire
+    lu au démarrage du serveur (snapshot.py) et les statistiques des thèmes
+    (stats.py) sont tenus à jour à côté.
     """
     in_path = os.path.join(DOWNLOADS_DIR, "exercises.json")
     out_path = os.path.join(DOWNLOADS_DIR, "exercises_standardises.json")
+    state_path = os.path.join(DOWNLOADS_DIR, STATE_FILE)
 
     with open(in_path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -126,24 +134,55 @@ def standardiser(DOWNLOADS_DIR: str) -> str:
     if not isinstance(data, list):
         raise ValueError("Le JSON attendu est une liste d'objets (array).")
 
-    for obj in data:
-        if isinstance(obj, dict) and "topics" in obj:
-            obj["topics"] = _standardize_topics(obj["topics"])
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
+    # état du run précédent : {"rules_version", "hashes": {id: hash de l'entrée}}
+    state = _read_json(state_path, {}) if incremental else {}
+    previous = _read_previous(out_path) if state.get("rules_version") == RULES_VERSION else None
+    if not isinstance(previous, list):
+        previous, state = [], {}
+    prev_by_key = {key: o for key, o in zip(_occurrence_keys(previous), previous) if key is not None}
+    prev_hashes = state.get("hashes") or {}
+
+    out = []
+    hashes = {}
+    recomputed = 0
+    for key, obj in zip(_occurrence_keys(data), data):
+        if not isinstance(obj, dict):
+            out.append(obj)
+            continue
+        h = _record_hash(obj)
+        if key is not None:
+            hashes[key] = h
+            if prev_hashes.get(key) == h and key in prev_by_key:
+                out.append(dict(prev_by_key[key]))  # copie : _apply_pages ne doit pas modifier `previous`
+                continue
+        if "topics" in obj:
+            obj["topics"] = standardize_topics(obj["topics"])
+        out.append(obj)
+        recomputed += 1
+
+    # import local : exercise_pages charge pypdf (via fulltext), inutile sans plages
+    from exercise_pages import load_ranges
+    _apply_pages(out, load_ranges(os.path.join(DOWNLOADS_DIR, PAGES_FILE)))
+
+    if out != previous or not os.path.exists(out_path):
+        _write_json_atomic(out_path, out, indent=2)
+    version = _content_version(out_path)
+    _update_snapshot(out_path, out, version)
+    _update_stats(out_path, out, version)
+    if hashes != prev_hashes or state.get("rules_version") != RULES_VERSION:
+        _write_json_atomic(state_path, {"rules_version": RULES_VERSION, "hashes": hashes})
+
+    print(f"Standardisation: {recomputed} exercice(s) recalculé(s) sur {len(data)}.")
     return out_path
 
 
+if __name__ == "__main__":
+    src_std = os.path.join(DOWNLOADS_DIR, "exercises_standardises.json")
 
-src = path = os.path.join(DOWNLOADS_DIR, "exercises.json")
-src_std = os.path.join(DOWNLOADS_DIR, "exercises_standardises.json")
-
-out = standardiser(DOWNLOADS_DIR)
+    out = standardiser(DOWNLOADS_DIR)
 
-exos_std = load_exercises(src_std)
+    exos_std = load_exercises(src_std)
 
-themes = get_themes(exos_std)
+    themes = get_themes(exos_std)
 
-print(themes)
+    print(themes)
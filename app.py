@@ -1,21 +1,160 @@
-from flask import Flask, render_template, send_from_directory, abort, request, jsonify
-import os, json, random
+from flask import Flask, Response, render_template, send_file, abort, redirect, request, jsonify, g
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.security import safe_join
+import os, json, mimetypes, multiprocessing, random, threading, time
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import LRUCache
+from dataset import DatasetManager, load_dataset, load_sqlite_dataset
+from exercise_index import bitset, positions
+from exercise_pages import SliceCache
+from fulltext import INDEX_PATH as FULLTEXT_INDEX_PATH, FullTextIndex, page_numbers
+import packet
+import http_cache
+from http_cache import IMMUTABLE, REVALIDATE, file_digest, file_signature, precompressed
+import metrics
+from metrics import PhaseTimer
+from snapshot import SNAPSHOT_FILE
+from solver import DEFAULT_BUDGET, max_coverage
+import thumbnails
 
 app = Flask(__name__)
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
 
-EXERCISES_CACHE = None
-
-def load_exercises():
-    global EXERCISES_CACHE
-    if EXERCISES_CACHE is None:
-        path = os.path.join(DOWNLOADS_DIR, "exercises_standardises.json")
-        with open(path, "r", encoding="utf-8") as f:
-            EXERCISES_CACHE = json.load(f)
-    print(EXERCISES_CACHE)
-    return EXERCISES_CACHE
+EXERCISES_FILE = "exercises_standardises.json"
+
+# base SQLite optionnelle (python sqlite_store.py) : NSIBAC_DB=downloads/annales.sqlite
+DB_PATH = os.environ.get("NSIBAC_DB")
+
+# jeu de données rechargé à chaud quand le fichier (ou le manifeste du crawl)
+# change, voir dataset.py ; lu depuis l'instantané binaire (snapshot.py)
+# quand il est à jour. Les variantes compressées de /data sont préparées à
+# chaque chargement
+def _precompress_data(ds):
+    # en tâche de fond : le démarrage ne doit pas attendre la lecture du JSON
+    threading.Thread(target=precompressed, args=(os.path.join(DOWNLOADS_DIR, EXERCISES_FILE),), daemon=True).start()
+
+DATASET = DatasetManager(DB_PATH or os.path.join(DOWNLOADS_DIR, EXERCISES_FILE),
+                         loader=load_sqlite_dataset if DB_PATH else load_dataset,
+                         on_load=_precompress_data,
+                         files_root=DOWNLOADS_DIR,
+                         watch=[os.path.join(DOWNLOADS_DIR, "crawl_manifest.json"),
+                                os.path.join(DOWNLOADS_DIR, SNAPSHOT_FILE)])
+
+GENERATE_CACHE = LRUCache(maxsize=256)  # résultats de /api/generate avec graine
+STATS_CACHE = LRUCache(maxsize=4)       # (version, avec exercices) -> corps JSON de /api/stats
+
+# index plein texte (construit hors ligne par fulltext.py), rechargé s'il change
+FULLTEXT = {"signature": None, "index": None}
+SLICES = SliceCache()                   # PDF d'un seul exercice, découpés à la demande
+FILE_EXERCISES = LRUCache(maxsize=2)    # version du dataset -> {fichier: [(position, type, libellé)]}
+
+# ---------- Métriques (/metrics, format Prometheus) ----------
+
+METRICS = metrics.Registry()
+REQUEST_SECONDS = METRICS.add(metrics.Histogram(
+    "nsibac_request_duration_seconds", "Durée des requêtes (jusqu'aux en-têtes de la réponse)", ("route", "method")))
+REQUESTS = METRICS.add(metrics.Counter("nsibac_requests_total", "Requêtes traitées", ("route", "method", "status")))
+RESPONSE_BYTES = METRICS.add(metrics.Counter(
+    "nsibac_response_bytes_total", "Octets envoyés (réponses de taille connue)", ("route",)))
+PHASE_SECONDS = METRICS.add(metrics.Histogram(
+    "nsibac_phase_seconds", "Durée des phases de traitement (generate = pool + score + completion + output)",
+    ("route", "phase"), metrics.PHASE_BUCKETS))
+
+# profilage des requêtes lentes, activable à chaud (POST /metrics/profile)
+# ou au démarrage : NSIBAC_PROFILE_SLOW_MS=500
+PROFILER = metrics.SlowProfiler()
+if os.environ.get("NSIBAC_PROFILE_SLOW_MS"):
+    PROFILER.configure(float(os.environ["NSIBAC_PROFILE_SLOW_MS"]))
+ADMIN_TOKEN = os.environ.get("NSIBAC_ADMIN_TOKEN")  # sinon /metrics/profile n'est accessible qu'en local
+# jamais profilées : une collecte ou la lecture des profils ne doit ni occuper
+# le profileur (un seul à la fois) ni remplir les profils conservés
+UNPROFILED_ROUTES = {"/metrics", "/metrics/profile"}
+
+def _caches():
+    ds = DATASET.current()
+    caches = {"generate": GENERATE_CACHE, "stats": STATS_CACHE, "file_exercises": FILE_EXERCISES,
+              **http_cache.CACHES}
+    if hasattr(ds.exercises, "cache"):  # exercices relus depuis l'instantané ou la base
+        caches["records"] = ds.exercises.cache
+    return {name: (c.hits, c.misses) for name, c in caches.items()}
+
+def _cache_ratios():
+    return {(name,): hits / (hits + misses) if hits + misses else 0.0 for name, (hits, misses) in _caches().items()}
+
+METRICS.add(metrics.Gauge("nsibac_cache_hits_total", "Succès des caches", ("cache",),
+                          lambda: {(name,): h for name, (h, _) in _caches().items()}, kind="counter"))
+METRICS.add(metrics.Gauge("nsibac_cache_misses_total", "Échecs des caches", ("cache",),
+                          lambda: {(name,): m for name, (_, m) in _caches().items()}, kind="counter"))
+METRICS.add(metrics.Gauge("nsibac_cache_hit_ratio", "Taux de succès des caches", ("cache",), _cache_ratios))
+METRICS.add(metrics.Gauge("nsibac_dataset_load_seconds", "Durée du chargement du jeu de données en service", (),
+                          lambda: {(): DATASET.current().load_seconds or 0.0}))
+METRICS.add(metrics.Gauge("nsibac_dataset_exercises", "Exercices du jeu de données en service", (),
+                          lambda: {(): len(DATASET.current().exercises)}))
+METRICS.add(metrics.Gauge("nsibac_dataset_loads_total", "Chargements du jeu de données", (),
+                          lambda: {(): DATASET.loads}, kind="counter"))
+METRICS.add(metrics.Gauge("nsibac_dataset_reload_failures_total", "Rechargements en échec", (),
+                          lambda: {(): DATASET.failures}, kind="counter"))
+
+def _route():
+    return request.url_rule.rule if request.url_rule else "(inconnue)"
+
+@app.before_request
+def _metrics_start():
+    g.t0 = time.perf_counter()
+    route = _route()
+    metrics.start_request(route)
+    g.profile = PROFILER.start() if route not in UNPROFILED_ROUTES else None
+
+@app.after_request
+def _metrics_end(resp):
+    elapsed = time.perf_counter() - g.t0
+    route = _route()
+    prof = g.pop("profile", None)
+    if prof is not None:
+        PROFILER.stop(prof, route, request.method, elapsed)
+    REQUEST_SECONDS.observe(elapsed, route, request.method)
+    REQUESTS.inc(route, request.method, str(resp.status_code))
+    if resp.content_length is not None:
+        RESPONSE_BYTES.inc(route, amount=resp.content_length)
+    phases = metrics.end_request()
+    if phases:
+        resp.headers["Server-Timing"] = metrics.server_timing(phases)
+    return resp
+
+@app.teardown_request
+def _metrics_teardown(exc):
+    # requête interrompue avant after_request : on libère le profileur
+    prof = g.pop("profile", None)
+    if prof is not None:
+        PROFILER.stop(prof, _route(), request.method, time.perf_counter() - g.t0)
+    metrics.end_request()
+
+@app.get("/metrics")
+def metrics_page():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics/profile", methods=["GET", "POST"])
+def metrics_profile():
+    """
+    GET : réglages et derniers profils conservés.
+    POST {"slow_ms": 500, "sample": 0.1} active le profilage ({"slow_ms": null} le coupe).
+    """
+    if ADMIN_TOKEN is None and request.remote_addr not in ("127.0.0.1", "::1"):
+        abort(403)
+    if ADMIN_TOKEN is not None and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        abort(403)
+    if request.method == "POST":
+        data = request.get_json(force=True) or {}
+        try:
+            PROFILER.configure(data.get("slow_ms"), data.get("sample", 1.0))
+        except (TypeError, ValueError):
+            return jsonify({"error": "slow_ms / sample invalides."}), 400
+    return jsonify(PROFILER.state())
 
 @app.get("/")
 def home():
@@ -25,83 +164,412 @@ def home():
 def generator_page():
     return render_template("generator.html")
 
+def _cache_control(resp, digest, immutable=False):
+    # ?v=<empreinte> : adressé par contenu ; sinon revalidation (304) à chaque fois
+    resp.headers["Cache-Control"] = IMMUTABLE if immutable or request.args.get("v") == digest else REVALIDATE
+    return resp
+
+# derrière nginx : NSIBAC_ACCEL_REDIRECT=/_downloads/ (location "internal" qui
+# pointe sur downloads/). nginx envoie alors lui-même les fichiers (sendfile,
+# Range) : Flask ne produit que les en-têtes.
+ACCEL_REDIRECT = os.environ.get("NSIBAC_ACCEL_REDIRECT")
+
+def _send_file_cached(full, digest=None):
+    """
+    Fichier brut avec ETag fort (sha256), 304 et Range (If-Range).
+    `digest` fourni : le nom du fichier est déjà son empreinte, la réponse
+    est gardée indéfiniment.
+    """
+    immutable = digest is not None
+    if digest is None:
+        digest = file_digest(full)
+    if ACCEL_REDIRECT:
+        rel = os.path.relpath(full, DOWNLOADS_DIR).replace(os.sep, "/")
+        resp = Response(mimetype=mimetypes.guess_type(full)[0] or "application/octet-stream")
+        resp.headers["X-Accel-Redirect"] = ACCEL_REDIRECT.rstrip("/") + "/" + quote(rel)
+        resp.set_etag(digest)
+        resp.make_conditional(request)
+        return _cache_control(resp, digest, immutable)
+    # sous waitress / gunicorn, send_file passe par wsgi.file_wrapper : le
+    # fichier est envoyé par le serveur (boucle d'E/S, sendfile), pas par ce thread
+    resp = send_file(full, etag=digest, conditional=True)
+    return _cache_control(resp, digest, immutable)
+
+def _send_slice(f):
+    """
+    Extrait de SLICES, déjà ouvert : envoyé depuis ce descripteur, il reste
+    lisible même si une autre requête l'évince du cache entre-temps.
+    """
+    # nom = empreinte du sujet + pages, et le découpage est déterministe
+    digest = os.path.basename(f.name)[:-len(".pdf")]
+    if ACCEL_REDIRECT:
+        f.close()  # nginx rouvre le fichier lui-même
+        return _send_file_cached(f.name)
+    size = os.fstat(f.fileno()).st_size
+    resp = send_file(f, mimetype="application/pdf", download_name=os.path.basename(f.name), etag=digest)
+    resp.content_length = size
+    try:
+        resp.make_conditional(request, accept_ranges=True, complete_length=size)
+    except RequestedRangeNotSatisfiable:
+        f.close()
+        raise
+    return _cache_control(resp, digest)
+
 @app.get("/data/<path:filename>")
 def data_files(filename):
-    full = os.path.join(DOWNLOADS_DIR, filename)
-    if not os.path.isfile(full):
+    full = safe_join(DOWNLOADS_DIR, filename)
+    if full is None or not os.path.isfile(full):
+        abort(404)
+    if not filename.endswith(".json"):
+        return _send_file_cached(full)
+
+    # JSON minifié, précompressé (gzip/brotli) selon Accept-Encoding
+    variants = precompressed(full)
+    enc = variants.choose(request.accept_encodings)
+    resp = Response(variants.bodies[enc], mimetype="application/json")
+    if enc != "identity":
+        resp.headers["Content-Encoding"] = enc
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(variants.etag(enc))
+    resp.make_conditional(request)
+    return _cache_control(resp, variants.digest)
+
+@app.get("/pdf/exercise/<path:ex_id>")
+def exercise_pdf(ex_id):
+    """Pages de l'exercice `ex_id` dans son sujet (champ `pages`)."""
+    ds = DATASET.current()
+    i = ds.index.position_of.get(ex_id)
+    if i is None:
+        abort(404)
+    ex = ds.exercises[i]
+    subject = ex.get("local_subject_file")
+    full = safe_join(DOWNLOADS_DIR, subject) if subject else None
+    if full is None or not os.path.isfile(full):
         abort(404)
-    return send_from_directory(DOWNLOADS_DIR, filename)
+    if not ex.get("pages"):
+        return redirect(f"/pdf/{subject}")
+
+    first, last = ex["pages"]
+    f = SLICES.open(full, file_digest(full), first, last)
+    if f is None:
+        # pypdf absent : sujet complet, ouvert à la bonne page
+        return redirect(f"/pdf/{subject}#page={first}")
+    return _send_slice(f)
+
+@app.get("/thumbs/<name>")
+def thumbnail(name):
+    """Miniature <sha256>-<page>.jpg d'un PDF (thumbnails.py), adressée par contenu."""
+    full = thumbnails.existing_thumb(name)
+    if full is None:
+        abort(404)
+    return _send_file_cached(full, digest=name[:-len(".jpg")])
 
 @app.get("/pdf/<path:filepath>")
 def pdf_files(filepath):
-    full = os.path.join(DOWNLOADS_DIR, filepath)
-    if not os.path.isfile(full):
+    full = safe_join(DOWNLOADS_DIR, filepath)
+    if full is None or not os.path.isfile(full):
         abort(404)
-    directory = os.path.dirname(full)
-    name = os.path.basename(full)
-    return send_from_directory(directory, name)
+    return _send_file_cached(full)
+
+SEARCH_PAGE_SIZE = 100
+MAX_BUDGET = 2.0  # secondes, plafond du time_budget_ms de /api/generate
+SEARCH_PAGE_MAX = 500
+BATCH_MAX = 200             # nombre maximal de sujets par /api/generate/batch
+BATCH_PARALLEL_MIN = 32     # à partir de là, les sujets indépendants sont répartis sur le pool de génération
+# processus dédiés à la génération (serve.py en fixe par défaut) : le calcul
+# ne prend plus le GIL aux threads qui servent les autres requêtes.
+# 0 = génération dans le thread de la requête.
+GENERATE_PROCESSES = int(os.environ.get("NSIBAC_GENERATE_PROCESSES", "0"))
+OFFLOAD_MIN_EXERCISES = 5000  # en glouton, sur place en dessous (un aller-retour coûte ~1 ms)
+# délai d'attente du pool (plus le budget du mode optimal de chaque sujet) : 503 au-delà
+GENERATE_TIMEOUT = float(os.environ.get("NSIBAC_GENERATE_TIMEOUT", "30"))
+
+@app.get("/api/search")
+def api_search():
+    """
+    Recherche paginée : q, tags (répétable), strict, year, session, points,
+    cursor (opaque, renvoyé dans next_cursor), limit.
+    Renvoie une page d'exercices + le total + les comptes par facette.
+    """
+    args = request.args
+    index = DATASET.current().index
+
+    bits = index.search(
+        q=args.get("q", ""),
+        tags=args.getlist("tags"),
+        strict=args.get("strict", "").lower() in ("1", "true", "on"),
+        year=args.get("year"),
+        session=args.get("session"),
+        points=args.get("points"),
+    )
+
+    try:
+        limit = max(0, min(SEARCH_PAGE_MAX, int(args.get("limit", SEARCH_PAGE_SIZE))))
+        start = max(0, int(args.get("cursor") or 0))
+    except ValueError:
+        return jsonify({"error": "Paramètre limit/cursor invalide."}), 400
+
+    # le curseur est la position (dans l'index) à partir de laquelle reprendre
+    page = positions(bits >> start)[:limit + 1]
+    next_cursor = str(start + page[limit]) if len(page) > limit else None
+
+    return jsonify({
+        "total": bits.bit_count(),
+        "items": [index.exercises[start + i] for i in page[:limit]],
+        "next_cursor": next_cursor,
+        "facets": index.facets(bits),
+    })
+
+@app.get("/api/stats")
+def api_stats():
+    """
+    Statistiques des thèmes (stats.py, calculées par la standardisation) :
+    fréquences, paires de thèmes (co-occurrences), couverture par année et
+    par session. exercises=1 : ids des exercices couvrant chaque paire.
+    """
+    ds = DATASET.current()
+    with_exercises = request.args.get("exercises", "").lower() in ("1", "true", "on")
+    key = (ds.version, with_exercises)
+    body = STATS_CACHE.get(key)
+    if body is None:
+        stats = ds.stats
+        names = list(ds.index.exercise_ids)  # id interné -> id
+        ids = ds.index.ids
+        pairs = []
+        for p in stats["pairs"]:
+            item = {"topics": p["topics"], "count": p["count"]}
+            if with_exercises:
+                item["exercises"] = [names[ids[i]] for i in p["exercises"]]
+            pairs.append(item)
+        body = json.dumps({
+            "dataset_version": ds.version,
+            "count": stats["count"],
+            "topics": stats["topics"],
+            "pairs": pairs,
+            "by_year": stats["by_year"],
+            "by_session": stats["by_session"],
+        }, ensure_ascii=False, separators=(",", ":"))
+        STATS_CACHE.put(key, body)
+
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(f"{ds.version}-{int(with_exercises)}")
+    resp.headers["Cache-Control"] = REVALIDATE
+    return resp.make_conditional(request)
+
+FULLTEXT_PAGE_SIZE = 20
+FULLTEXT_PAGE_MAX = 100
+
+def load_fulltext():
+    sig = file_signature(FULLTEXT_INDEX_PATH)
+    if sig is None:
+        return None
+    if FULLTEXT["signature"] != sig:
+        try:
+            FULLTEXT["index"] = FullTextIndex.load(FULLTEXT_INDEX_PATH)
+        except ValueError as e:  # ancien format : à reconstruire
+            print(f"[fulltext] {e}")
+            FULLTEXT["index"] = None
+        FULLTEXT["signature"] = sig
+    return FULLTEXT["index"]
+
+def _file_exercises(ds):
+    """Fichier local (relatif à downloads/) -> exercices qui le référencent."""
+    mapping = FILE_EXERCISES.get(ds.version)
+    if mapping is None:
+        mapping = {}
+        for i, ex in enumerate(ds.exercises):
+            if ex.get("local_subject_file"):
+                mapping.setdefault(ex["local_subject_file"], []).append((i, "sujet", None))
+            for c in ex.get("corriges") or []:
+                if c.get("local_file"):
+                    mapping.setdefault(c["local_file"], []).append((i, "corrigé", c.get("label")))
+        FILE_EXERCISES.put(ds.version, mapping)
+    return mapping
+
+@app.get("/api/fulltext")
+def api_fulltext():
+    """
+    Recherche dans le texte des PDF (sujets et corrigés), classement BM25.
+    Un exercice prend le meilleur score des fichiers qui le concernent ;
+    chaque fichier trouvé est listé avec les pages qui contiennent la requête.
+    """
+    q = request.args.get("q", "").strip()
+    try:
+        limit = max(0, min(FULLTEXT_PAGE_MAX, int(request.args.get("limit", FULLTEXT_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({"error": "Paramètre limit invalide."}), 400
+
+    ft = load_fulltext()
+    if ft is None:
+        return jsonify({"error": "Index plein texte absent ou périmé : lancer python fulltext.py."}), 503
+
+    ds = DATASET.current()
+    files = _file_exercises(ds)
+
+    # regroupement par exercice, dans l'ordre des scores
+    hits = {}
+    for score, doc, pages in ft.search(q):
+        for i, kind, label in files.get(ft.docs[doc]["path"], []):
+            hits.setdefault(i, []).append((score, doc, pages, kind, label))
+
+    items = []
+    for i, matches in list(hits.items())[:limit]:
+        items.append({
+            "score": round(matches[0][0], 4),
+            "exercise": ds.exercises[i],
+            "matches": [{
+                "file": ft.docs[doc]["path"],
+                "kind": kind,
+                "label": label,
+                "score": round(score, 4),
+                "pages": page_numbers(pages),
+            } for score, doc, pages, kind, label in matches],
+        })
+
+    return jsonify({"query": q, "total": len(hits), "items": items})
+
+def _in_pool_order(bits, rank):
+    """Exercices de `bits` présents dans le pool, dans l'ordre du pool."""
+    out = [i for i in positions(bits) if rank[i] >= 0]
+    out.sort(key=rank.__getitem__)
+    return out
+
+def _candidate_levels(index, pool, remaining, rank):
+    """
+    Candidats à examiner, par niveaux : d'abord les exercices qui couvrent au
+    moins deux tags manquants (paires de stats.py), puis un seul, puis tout
+    le pool. Le meilleur score (bonus < 1) est forcément dans le premier
+    niveau qui contient un exercice autorisé : le choix est le même qu'en
+    parcourant tout le pool.
+    """
+    if remaining:
+        tids = positions(remaining)
+        pairs = 0
+        for x, a in enumerate(tids):
+            for b in tids[x + 1:]:
+                pairs |= index.pair_bits.get((a, b), 0)
+        if pairs:
+            yield _in_pool_order(pairs, rank)
+        single = 0
+        for t in tids:
+            single |= index.by_topic[t]
+        yield _in_pool_order(single & ~pairs, rank)
+    yield pool
+
+def _greedy_pick(index, pool, chosen, wanted, k, avoid_same_subject):
+    """
+    Complète `chosen` jusqu'à k exercices en prenant à chaque tour le meilleur
+    score (tags encore manquants + bonus), premier trouvé dans l'ordre de `pool`.
+    """
+    masks = index.masks
+    subjects = index.subjects
+    ids = index.ids
+    bonus = index.bonus
+
+    chosen = list(chosen)
+    used_subjects = {subjects[i] for i in chosen}
+    taken = {ids[i] for i in chosen}
+    remaining = wanted
+    for i in chosen:
+        remaining &= ~masks[i]
+
+    # rang de chaque exercice dans le pool (-1 : hors pool), pour l'élagage
+    rank = None
+    if remaining:
+        rank = [-1] * len(index)
+        for r, i in enumerate(pool):
+            rank[i] = r
+
+    while len(chosen) < k:
+        best = None
+        best_score = -1
 
-def exercise_score(ex, remaining_tags, allowed_tags=None):
-    ex_tags = set(ex.get("topics") or [])
-    if allowed_tags is not None:
-        ex_tags = ex_tags & allowed_tags  # on ne “compte” que les thèmes sélectionnés
-    new_cov = len(ex_tags & remaining_tags)
+        for candidates in _candidate_levels(index, pool, remaining, rank):
+            for i in candidates:
+                if ids[i] in taken or (avoid_same_subject and subjects[i] in used_subjects):
+                    continue
+                sc = (masks[i] & remaining).bit_count() + bonus[i]
+                if sc > best_score:
+                    best = i
+                    best_score = sc
+            if best is not None:
+                break
 
-    pts = ex.get("points") or 0
-    pts_bonus = 0.05 if pts >= 8 else 0.0
-    return new_cov + pts_bonus
+        if best is None:
+            break
 
-def generate_combo(exercises, wanted_tags, k=3, avoid_same_subject=True, only_selected=False, seed=None):
-    if seed is not None:
-        random.seed(seed)
+        chosen.append(best)
+        taken.add(ids[best])
+        used_subjects.add(subjects[best])
+        remaining &= ~masks[best]
+
+    return chosen
+
+
+def generate_combo(index, candidates, wanted_tags, k=3, avoid_same_subject=True, only_selected=False, seed=None,
+                   mode="greedy", time_budget=DEFAULT_BUDGET):
+    """
+    Choisit k exercices parmi `candidates` (bitset de l'index) en couvrant
+    au mieux `wanted_tags` (glouton, départage aléatoire).
+    mode="optimal" : la couverture est ensuite maximisée exactement
+    (solver.max_coverage) dans la limite de `time_budget` secondes ; le champ
+    "optimal" indique si le résultat est prouvé optimal.
+    """
+    timer = PhaseTimer(PHASE_SECONDS)
+    # générateur propre à la requête : pas d'interférence entre threads
+    rng = random.Random(seed)
 
     wanted_tags = set(wanted_tags)
-    remaining = set(wanted_tags)
+    wanted = index.tags_mask(wanted_tags)
+    # tags inconnus de l'index : jamais couverts
+    unknown = {t for t in wanted_tags if t not in index.topic_ids}
 
-    chosen = []
-    used_subjects = set()
+    masks = index.masks
+    subjects = index.subjects
+    ids = index.ids
 
-    pool = exercises[:]
-    random.shuffle(pool)
+    pool = positions(candidates)
+    rng.shuffle(pool)
 
     # Filtrage strict: topics(ex) ⊆ wanted_tags
     if only_selected and wanted_tags:
-        pool = [ex for ex in pool if set(ex.get("topics") or []).issubset(wanted_tags)]
-
-    for _ in range(k):
-        best = None
-        best_score = -1
-
-        for ex in pool:
-            if avoid_same_subject and ex.get("subject_id") in used_subjects:
-                continue
-            sc = exercise_score(ex, remaining, allowed_tags=wanted_tags if wanted_tags else None)
-            if sc > best_score:
-                best = ex
-                best_score = sc
-
-        if best is None:
-            break
-
-        chosen.append(best)
-        used_subjects.add(best.get("subject_id"))
-        remaining -= (set(best.get("topics") or []) & wanted_tags)
-
-        pool = [e for e in pool if e.get("id") != best.get("id")]
+        strict = set(positions(index.subset_of(wanted)))
+        pool = [i for i in pool if i in strict]
+    timer.lap("pool")
+
+    chosen = _greedy_pick(index, pool, [], wanted, k, avoid_same_subject)
+
+    proven = None
+    if mode == "optimal":
+        # le glouton sert de solution de départ : on ne le remplace que s'il est battu
+        better, proven = max_coverage(index, pool, wanted, k, avoid_same_subject, incumbent=chosen, budget=time_budget)
+        if better is not None:
+            chosen = _greedy_pick(index, pool, better, wanted, k, avoid_same_subject)
+    timer.lap("score")
+
+    used_subjects = {subjects[i] for i in chosen}
+    taken = {ids[i] for i in chosen}
+    remaining = wanted
+    for i in chosen:
+        remaining &= ~masks[i]
 
     # Complétion: seulement si on n'est PAS en mode strict
-    while len(chosen) < k and pool and not only_selected:
-        ex = pool.pop()
-        if avoid_same_subject and ex.get("subject_id") in used_subjects:
+    rest = [i for i in pool if ids[i] not in taken]
+    while len(chosen) < k and rest and not only_selected:
+        i = rest.pop()
+        if avoid_same_subject and subjects[i] in used_subjects:
             continue
-        chosen.append(ex)
-        used_subjects.add(ex.get("subject_id"))
+        chosen.append(i)
+        used_subjects.add(subjects[i])
+    timer.lap("completion")
 
-    covered = wanted_tags - remaining
+    missing = {index.topics[t] for t in positions(remaining)} | unknown
+    covered = wanted_tags - missing
 
     # Ajout de champs d’affichage: topics_used/topics_other
     out_ex = []
-    for ex in chosen:
+    for i in chosen:
+        ex = index.exercises[i]
         ex_tags = set(ex.get("topics") or [])
         used = sorted(ex_tags & wanted_tags)
         other = sorted(ex_tags - wanted_tags) if wanted_tags else []
@@ -110,47 +578,408 @@ def generate_combo(exercises, wanted_tags, k=3, avoid_same_subject=True, only_se
         ex2["topics_other"] = other
         out_ex.append(ex2)
 
-    return {
+    result = {
         "requested_tags": sorted(wanted_tags),
         "covered_tags": sorted(covered),
-        "missing_tags": sorted(remaining),
+        "missing_tags": sorted(missing),
         "count": len(out_ex),
         "exercises": out_ex
     }
+    if mode == "optimal":
+        result["mode"] = mode
+        result["optimal"] = proven
+    timer.lap("output")
+    return result
+
+def _generate_params(data):
+    """
+    Paramètres communs à /api/generate et /api/generate/batch.
+    Renvoie (params, None) ou (None, message d'erreur).
+    """
+    k = int(data.get("k") or 3)
+
+    mode = data.get("mode") or "greedy"
+    if mode not in ("greedy", "optimal"):
+        return None, "mode doit valoir \"greedy\" ou \"optimal\"."
+    try:
+        budget_ms = float(data.get("time_budget_ms") or DEFAULT_BUDGET * 1000)
+    except (TypeError, ValueError):
+        return None, "time_budget_ms invalide."
+
+    return {
+        "wanted_tags": data.get("tags") or [],
+        "k": max(3, min(5, k)),
+        "avoid_same_subject": bool(data.get("avoid_same_subject", True)),
+        "only_selected": bool(data.get("only_selected_topics", False)),
+        "mode": mode,
+        "time_budget": max(0.0, min(MAX_BUDGET, budget_ms / 1000)),
+    }, None
+
+def _sessions(data):
+    """Filtre `sessions` de la requête : une chaîne seule vaut une liste d'une session."""
+    sessions = data.get("sessions")
+    if isinstance(sessions, str):
+        sessions = [sessions]
+    return sessions
+
+def _generate_key(version, data, params):
+    """Clé de cache : requête normalisée + version du jeu de données."""
+    def year(v):
+        try:
+            return int(v)
+        except (TypeError, ValueError):
+            return v
+    return json.dumps([
+        version,
+        sorted(set(params["wanted_tags"])),
+        params["k"], params["avoid_same_subject"], params["only_selected"],
+        params["mode"], params["time_budget"],
+        year(data.get("year_min")), year(data.get("year_max")),
+        sorted(_sessions(data) or []),
+        data.get("seed"),
+    ], ensure_ascii=False)
 
 @app.post("/api/generate")
 def api_generate():
     data = request.get_json(force=True) or {}
-    tags = data.get("tags") or []
-    k = int(data.get("k") or 3)
-    k = max(3, min(5, k))
-
-    avoid_same_subject = bool(data.get("avoid_same_subject", True))
-    year_min = data.get("year_min")
-    year_max = data.get("year_max")
-    sessions = data.get("sessions")  # liste optionnelle
-    only_selected = bool(data.get("only_selected_topics", False))
-
-    exercises = load_exercises()
-
-    # filtres optionnels
-    def ok(ex):
-        y = ex.get("year")
-        if year_min is not None and y is not None and int(y) < int(year_min):
-            return False
-        if year_max is not None and y is not None and int(y) > int(year_max):
-            return False
-        if sessions and ex.get("session") not in sessions:
-            return False
-        return True
-
-    pool = [ex for ex in exercises if ok(ex)]
+    params, error = _generate_params(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    ds = DATASET.current()
+    index = ds.index
+    timer = PhaseTimer(PHASE_SECONDS)
+
+    # filtres optionnels (bitset d'exercices)
+    pool = index.filter(data.get("year_min"), data.get("year_max"), _sessions(data))
+    timer.lap("filter")
     if not pool:
         return jsonify({"error": "Aucun exercice après filtres."}), 400
 
-    result = generate_combo(pool, tags, k=k, avoid_same_subject=avoid_same_subject, only_selected=only_selected, seed=data.get("seed"))
+    result = _generate_cached(ds, pool, data, params)
+    timer.lap("generate")
+    resp = jsonify(result)
+    timer.lap("serialize")
+    return resp
+
+def _generate_cached(ds, pool, data, params):
+    seed = data.get("seed")
+    if seed is None:
+        return _run_generate(ds, pool, seed, params)
+
+    # avec une graine, le résultat est déterministe : on le garde en cache
+    key = _generate_key(ds.version, data, params)
+    result = GENERATE_CACHE.get(key)
+    if result is None:
+        result = _run_generate(ds, pool, seed, params)
+        GENERATE_CACHE.put(key, result)
+    return result
+
+def _run_generate(ds, pool, seed, params):
+    """generate_combo, dans le pool de processus pour les calculs longs."""
+    if params["mode"] == "optimal" or len(ds.index) >= OFFLOAD_MIN_EXERCISES:
+        chunks = _in_generation_pool(ds, _batch_worker, [(pool, [seed], params)], _generation_timeout(params, 1))
+        if chunks is not None:
+            return chunks[0][0]
+    return generate_combo(ds.index, pool, seed=seed, **params)
+
+# index du processus de travail (copié une fois par processus, pas par sujet)
+_WORKER_INDEX = None
+
+def _batch_worker_init(index):
+    global _WORKER_INDEX
+    _WORKER_INDEX = index
+
+def _batch_worker(job):
+    pool, seeds, params = job
+    return [generate_combo(_WORKER_INDEX, pool, seed=s, **params) for s in seeds]
+
+class GenerationUnavailable(Exception):
+    """Le pool de génération n'a pas répondu à temps."""
+
+@app.errorhandler(GenerationUnavailable)
+def _generation_unavailable(e):
+    resp = jsonify({"error": "Génération momentanément indisponible, réessayez."})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "5"
+    return resp
+
+def _generation_timeout(params, count):
+    budget = params["time_budget"] if params["mode"] == "optimal" else 0.0
+    return GENERATE_TIMEOUT + count * budget
+
+# pool de génération persistant, lié à une version du jeu de données. Les
+# processus sont lancés par "spawn" : un fork depuis un serveur multithread
+# pourrait hériter d'un verrou tenu (métriques, caches) et s'y bloquer.
+# Un ancien pool n'est arrêté que lorsque plus aucune requête ne s'en sert.
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+_GEN_POOL = {"version": None, "executor": None}
+_GEN_USERS = {}  # pool -> requêtes en cours qui s'en servent
+_GEN_POOL_LOCK = threading.Lock()
+
+def _acquire_executor(ds):
+    """
+    Pool de processus (index de `ds` copié une fois), recréé quand la version
+    change ; None si désactivé, ou si `ds` n'est plus le jeu en service (la
+    requête calcule alors sur place). À rendre avec _release_executor.
+    """
+    if GENERATE_PROCESSES < 1:
+        return None
+    current = ds is DATASET.current()
+    with _GEN_POOL_LOCK:
+        if _GEN_POOL["version"] != ds.version:
+            if not current:
+                return None
+            old = _GEN_POOL["executor"]
+            _GEN_POOL["executor"] = ProcessPoolExecutor(max_workers=GENERATE_PROCESSES, mp_context=_MP_CONTEXT,
+                                                        initializer=_batch_worker_init, initargs=(ds.index,))
+            _GEN_POOL["version"] = ds.version
+            if old is not None and old not in _GEN_USERS:
+                old.shutdown(wait=False)
+        executor = _GEN_POOL["executor"]
+        _GEN_USERS[executor] = _GEN_USERS.get(executor, 0) + 1
+        return executor
+
+def _release_executor(executor, broken=False):
+    with _GEN_POOL_LOCK:
+        if broken and _GEN_POOL["executor"] is executor:
+            _GEN_POOL["version"] = None  # processus mort : le prochain appel recrée le pool
+        _GEN_USERS[executor] -= 1
+        if _GEN_USERS[executor] == 0:
+            del _GEN_USERS[executor]
+            if _GEN_POOL["executor"] is not executor or _GEN_POOL["version"] is None:
+                executor.shutdown(wait=False)
+
+def _in_generation_pool(ds, fn, jobs, timeout):
+    """
+    [fn(job) for job in jobs] dans le pool de génération, None s'il n'est
+    pas utilisable. Pool cassé : une seconde tentative sur un pool neuf.
+    GenerationUnavailable si les résultats n'arrivent pas avant `timeout`.
+    """
+    for _ in range(2):
+        executor = _acquire_executor(ds)
+        if executor is None:
+            return None
+        broken = False
+        futures = []
+        try:
+            futures = [executor.submit(fn, job) for job in jobs]
+            deadline = time.monotonic() + timeout
+            return [f.result(timeout=max(0.0, deadline - time.monotonic())) for f in futures]
+        except FutureTimeout:
+            raise GenerationUnavailable()
+        except BrokenProcessPool:
+            broken = True
+        finally:
+            for f in futures:
+                f.cancel()  # sans effet sur les calculs terminés ou en cours
+            _release_executor(executor, broken)
+    raise GenerationUnavailable()
+
+def _batch_independent(ds, pool, seeds, params):
+    """
+    Sujets indépendants : dans le pool de génération (réparti sur ses
+    processus quand ils sont nombreux), sinon dans le thread de la requête.
+    Pas de pool créé pour une requête : copier l'index dans de nouveaux
+    processus coûte plus que la génération elle-même.
+    """
+    if GENERATE_PROCESSES >= 1:
+        parts = GENERATE_PROCESSES if len(seeds) >= BATCH_PARALLEL_MIN else 1
+        step = -(-len(seeds) // parts)
+        jobs = [(pool, seeds[i:i + step], params) for i in range(0, len(seeds), step)]
+        chunks = _in_generation_pool(ds, _batch_worker, jobs, _generation_timeout(params, step))
+        if chunks is not None:
+            return [r for chunk in chunks for r in chunk]
+    return [generate_combo(ds.index, pool, seed=s, **params) for s in seeds]
+
+def _batch_distinct_worker(job):
+    pool, seeds, params = job
+    return _batch_distinct(_WORKER_INDEX, pool, seeds, params)
+
+def _batch_distinct(index, pool, seeds, params):
+    """
+    Sujets générés à la suite, chacun parmi les exercices pas encore utilisés.
+    Quand il n'en reste plus assez pour un sujet complet, on recommence un
+    tour avec tout le pool : un exercice n'est réutilisé qu'une fois le pool épuisé.
+    """
+    ids = index.ids
+    pool_pos = positions(pool)
+    used_ids = set()
+    results = []
+    for s in seeds:
+        fresh = pool & ~bitset([i for i in pool_pos if ids[i] in used_ids], len(index))
+        result = None
+        if used_ids and fresh:
+            result = generate_combo(index, fresh, seed=s, **params)
+            if result["count"] < params["k"]:
+                result = None
+        if result is None:
+            used_ids = set()
+            result = generate_combo(index, pool, seed=s, **params)
+        for ex in result["exercises"]:
+            used_ids.add(index.exercise_ids[ex.get("id")])
+        results.append(result)
+    return results
+
+@app.post("/api/generate/batch")
+def api_generate_batch():
+    """
+    Génère `n` sujets d'un coup (mêmes paramètres que /api/generate).
+    - seed : graine de base ; le sujet i utilise la graine "<seed>:<i>" (renvoyée) ;
+    - overlap : "min" (défaut, exercices distincts tant que le pool le permet)
+      ou "any" (sujets indépendants : chacun est reproductible seul via
+      /api/generate avec sa graine).
+    """
+    data = request.get_json(force=True) or {}
+    params, error = _generate_params(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        n = int(data.get("n", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "n invalide."}), 400
+    if not 1 <= n <= BATCH_MAX:
+        return jsonify({"error": f"n doit être compris entre 1 et {BATCH_MAX}."}), 400
+    overlap = data.get("overlap") or "min"
+    if overlap not in ("min", "any"):
+        return jsonify({"error": "overlap doit valoir \"min\" ou \"any\"."}), 400
+
+    base_seed = data.get("seed")
+    if base_seed is None:
+        base_seed = int.from_bytes(os.urandom(4), "big")
+    seeds = [f"{base_seed}:{i}" for i in range(n)]
+
+    # index et pool calculés une seule fois pour tout le lot
+    ds = DATASET.current()
+    index = ds.index
+    pool = index.filter(data.get("year_min"), data.get("year_max"), _sessions(data))
+    if not pool:
+        return jsonify({"error": "Aucun exercice après filtres."}), 400
 
-    return jsonify(result)
+    if overlap == "any":
+        results = _batch_independent(ds, pool, seeds, params)
+    else:
+        chunks = _in_generation_pool(ds, _batch_distinct_worker, [(pool, seeds, params)],
+                                     _generation_timeout(params, len(seeds)))
+        results = chunks[0] if chunks is not None else _batch_distinct(index, pool, seeds, params)
+
+    uses = {}
+    for r in results:
+        for ex in r["exercises"]:
+            uses[ex.get("id")] = uses.get(ex.get("id"), 0) + 1
+
+    return jsonify({
+        "dataset_version": ds.version,
+        "seed": base_seed,
+        "overlap": overlap,
+        "count": len(results),
+        "distinct_exercises": len(uses),
+        "max_uses": max(uses.values(), default=0),
+        "sets": [dict(r, seed=s) for s, r in zip(seeds, results)],
+    })
+
+PACKET_MAX_SETS = 40
+
+def _local_file(rel, available):
+    full = safe_join(DOWNLOADS_DIR, rel) if rel and available else None
+    return full if full and os.path.isfile(full) else None
+
+def _packet_subject(ex):
+    """
+    PDF du sujet pour un paquet : l'extrait de l'exercice si possible, ouvert
+    seulement au moment de l'écrire (rien ne reste ouvert si l'envoi s'arrête),
+    sinon le chemin du sujet.
+    """
+    full = _local_file(ex.get("local_subject_file"), ex.get("subject_available_locally"))
+    if full and ex.get("pages"):
+        first, last = ex["pages"]
+        return lambda: SLICES.open(full, file_digest(full), first, last) or open(full, "rb")
+    return full
+
+def _packet_corrige(c):
+    return _local_file(c.get("local_file"), c.get("available_locally"))
+
+@app.post("/api/generate/packet")
+def api_generate_packet():
+    """
+    Paquet téléchargeable pour une combinaison : mêmes paramètres que
+    /api/generate (ou `exercise_ids` pour une combinaison déjà choisie), plus
+    - format : "zip" (défaut : sujets + corrigés + summary.json) ou "pdf" (un seul PDF) ;
+    - include_corriges : true par défaut ;
+    - n : nombre de sujets (ZIP seulement, un dossier par sujet, comme /api/generate/batch).
+    La réponse est envoyée en flux, sans être construite en mémoire.
+    """
+    data = request.get_json(force=True) or {}
+    fmt = data.get("format") or "zip"
+    if fmt not in ("zip", "pdf"):
+        return jsonify({"error": "format doit valoir \"zip\" ou \"pdf\"."}), 400
+    if fmt == "pdf" and packet.PdfWriter is None:
+        return jsonify({"error": "Le format PDF nécessite le module pypdf."}), 503
+    include_corriges = bool(data.get("include_corriges", True))
+
+    ds = DATASET.current()
+    index = ds.index
+    try:
+        n = int(data.get("n", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "n invalide."}), 400
+    if not 1 <= n <= PACKET_MAX_SETS or (fmt == "pdf" and n > 1):
+        return jsonify({"error": f"n doit être compris entre 1 et {PACKET_MAX_SETS} (1 pour le format pdf)."}), 400
+
+    if data.get("exercise_ids") is not None:
+        ids = data["exercise_ids"]
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return jsonify({"error": "exercise_ids doit être une liste non vide d'identifiants."}), 400
+        unknown = [i for i in ids if i not in index.position_of]
+        if unknown:
+            return jsonify({"error": f"Exercices inconnus : {', '.join(map(str, unknown))}"}), 400
+        results = [{"exercises": [ds.exercises[index.position_of[i]] for i in ids]}]
+        seeds = [None]
+    else:
+        params, error = _generate_params(data)
+        if error:
+            return jsonify({"error": error}), 400
+        pool = index.filter(data.get("year_min"), data.get("year_max"), _sessions(data))
+        if not pool:
+            return jsonify({"error": "Aucun exercice après filtres."}), 400
+        if n == 1:
+            seeds = [data.get("seed")]
+            results = [_generate_cached(ds, pool, data, params)]
+        else:
+            base_seed = data.get("seed")
+            if base_seed is None:
+                base_seed = int.from_bytes(os.urandom(4), "big")
+            seeds = [f"{base_seed}:{i}" for i in range(n)]
+            results = _batch_distinct(index, pool, seeds, params)
+
+    entries = []
+    sets = []
+    for j, (seed, result) in enumerate(zip(seeds, results)):
+        prefix = f"sujet-{j + 1:02d}/" if n > 1 else ""
+        files = packet.packet_entries(result["exercises"], _packet_subject, _packet_corrige, include_corriges, prefix)
+        entries.extend(files)
+        sets.append({
+            "seed": seed,
+            **{key: result[key] for key in ("requested_tags", "covered_tags", "missing_tags") if key in result},
+            "exercises": [{key: ex.get(key) for key in ("id", "year", "session", "code", "exercise", "points", "topics", "pages")}
+                          for ex in result["exercises"]],
+            "files": [name for name, _ in files],
+        })
+    if not entries:
+        return jsonify({"error": "Aucun PDF local pour ces exercices."}), 404
+
+    if fmt == "pdf":
+        merged = packet.merged_pdf([path for _, path in entries])
+        return Response(packet.stream_file(merged), mimetype="application/pdf", headers={
+            "Content-Length": str(packet.file_size(merged)),
+            "Content-Disposition": 'attachment; filename="paquet.pdf"',
+        })
+
+    summary = {"dataset_version": ds.version, "sets": sets}
+    return Response(packet.stream_zip(entries, summary), mimetype="application/zip", headers={
+        "Content-Disposition": 'attachment; filename="paquet.zip"',
+    })
 
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8000, debug=True)
@@ -0,0 +1,307 @@
+"""
+Mesures de performance sur des corpus synthétiques.
+
+    python bench.py                          # 1k, 10k et 100k exercices
+    python bench.py --sizes 1000,10000 --repeat 5
+    python bench.py --compare bench_results/ancien.json
+
+Pour chaque taille, un corpus (exercises.json + subjects.json) est généré
+dans un dossier temporaire à partir des distributions du vrai corpus
+(downloads/exercises.json) : libellés de thèmes, nombre de thèmes par
+exercice, points, sessions, exercices par sujet, corrigés. On chronomètre
+ensuite la classification des thèmes (split_topics, et l'automate de
+topics.py face à un re.search par motif, la méthode d'avant topics.py),
+standardiser(), le chargement (load_exercises,
+load_dataset avec et sans instantané binaire), generate_combo (glouton et
+optimal), /api/generate et /api/search via le client de test Flask.
+
+Les résultats (secondes) sont écrits en JSON dans bench_results/<commit>.json
+pour comparer deux commits (--compare).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import annales
+import topics
+from dataset import DatasetManager, load_dataset
+from snapshot import snapshot_path
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
+RESULTS_DIR = os.path.join(BASE_DIR, "bench_results")
+
+SIZES = [1_000, 10_000, 100_000]
+REPEAT = 3
+REQUESTS = 20          # requêtes de génération / recherche par répétition
+OPTIMAL_BUDGET = 0.2   # secondes par génération en mode optimal
+SEARCH_QUERIES = ["graphe", "arbres binaires", "sql", "récursivité", "programmation orientée objet"]
+
+
+# ---------- Corpus synthétique ----------
+
+def _weighted(counter: Counter):
+    values = list(counter)
+    return values, [counter[v] for v in values]
+
+
+def synth_corpus(n: int, out_dir: str, seed: int = 0, source: str = os.path.join(DOWNLOADS_DIR, "exercises.json")):
+    """
+    Écrit exercises.json et subjects.json (n exercices) dans `out_dir`, au
+    format de getAnnales.py. Les libellés sont des combinaisons des
+    fragments de libellés réels (fréquences conservées).
+    """
+    with open(source, "r", encoding="utf-8") as f:
+        real = json.load(f)
+    rng = random.Random(seed)
+
+    fragments = Counter()
+    for ex in real:
+        for part in topics._SPLIT_RE.split(ex.get("raw") or ""):
+            part = part.strip(" .\n\t")
+            if part:
+                fragments[part] += 1
+    frag_values, frag_weights = _weighted(fragments)
+    n_topics = _weighted(Counter(max(1, len(ex.get("topics") or [])) for ex in real))
+    points = _weighted(Counter(ex.get("points") for ex in real))
+    sessions = _weighted(Counter(ex.get("session") for ex in real))
+    per_subject = _weighted(Counter(Counter(ex["subject_id"] for ex in real).values()))
+    corriges = _weighted(Counter(tuple(c.get("label") for c in ex.get("corriges") or []) for ex in real))
+
+    exercises, subjects = [], []
+    s = 0
+    while len(exercises) < n:
+        year = 2021 + s % 10
+        session = rng.choices(*sessions)[0]
+        code = f"{year % 100}-NSIJ{1 + s % 2}S{s:06d}"
+        subject_id = f"{year}-{session.lower().replace(' ', '-')}-{code}"
+        folder = f"NSI/{year}/{session}/{code}"
+        labels = rng.choices(*corriges)[0]
+        subject = {
+            "id": subject_id, "year": year, "session": session, "subject_label": f"Sujet {1 + s % 2}",
+            "code": code, "date": None, "page": "https://example.org/annales",
+            "pdf_subject_url": f"https://example.org/{code}.pdf", "local_subject_file": f"{folder}/SUJET.pdf",
+            "corriges": [{"label": label, "url": f"https://example.org/{code}-corr{i}.pdf",
+                          "local_file": f"{folder}/{label}.pdf"} for i, label in enumerate(labels)],
+        }
+        subjects.append(subject)
+        for k in range(1, rng.choices(*per_subject)[0] + 1):
+            if len(exercises) == n:
+                break
+            raw = ", ".join(dict.fromkeys(rng.choices(frag_values, frag_weights, k=rng.choices(*n_topics)[0])))
+            exercises.append({
+                "id": f"{subject_id}-ex{k}", "subject_id": subject_id, "year": year, "session": session,
+                "subject_label": subject["subject_label"], "code": code, "exercise": k,
+                "points": rng.choices(*points)[0], "topics": topics.split_topics(raw), "raw": raw,
+                "pdf_subject_url": subject["pdf_subject_url"], "local_subject_file": subject["local_subject_file"],
+                "corriges": [dict(c) for c in subject["corriges"]],
+            })
+        s += 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, data in (("exercises.json", exercises), ("subjects.json", subjects)):
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    return exercises
+
+
+# ---------- Mesures ----------
+
+def _stats(runs):
+    return {"runs": [round(r, 6) for r in runs], "min": round(min(runs), 6),
+            "median": round(statistics.median(runs), 6), "mean": round(statistics.fmean(runs), 6)}
+
+
+def timed(fn, repeat: int, setup=None):
+    """Durées (s) de `repeat` appels de fn() ; setup() avant chacun, hors chrono."""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t)
+    return _stats(runs)
+
+
+def per_call(fn, args_list, repeat: int):
+    """Durée médiane d'un appel, par répétition, sur une série d'arguments."""
+    runs = []
+    for _ in range(repeat):
+        calls = []
+        for args in args_list:
+            t = time.perf_counter()
+            fn(*args)
+            calls.append(time.perf_counter() - t)
+        runs.append(statistics.median(calls))
+    return _stats(runs)
+
+
+def _tag_sets(index, rng, count):
+    freq = [b.bit_count() for b in index.by_topic]
+    return [sorted(set(rng.choices(index.topics, freq, k=rng.randint(3, 6)))) for _ in range(count)]
+
+
+def bench_size(n: int, repeat: int, workdir: str) -> dict:
+    import app as app_module
+    from app import generate_combo
+
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    out = {}
+    rng = random.Random(n)
+    records = synth_corpus(n, workdir, seed=n)
+    raws = [ex["raw"] for ex in records]
+    std_path = os.path.join(workdir, "exercises_standardises.json")
+
+    def clear_topic_caches():
+        topics.norm_topic.cache_clear()
+        topics.normalize_topic.cache_clear()
+
+    out["split_topics"] = timed(lambda: [topics.split_topics(r) for r in raws], repeat, clear_topic_caches)
+    # détection seule des motifs, sur les mêmes textes nettoyés
+    cleaned = [topics.clean_theme_text(r).lower() for r in raws]
+    per_pattern = [re.compile(pat, re.I) for _, pat in topics.TOPIC_PATTERNS]
+    out["topic_match_per_pattern"] = timed(
+        lambda: [[i for i, pat in enumerate(per_pattern) if pat.search(s)] for s in cleaned], repeat)
+    out["topic_match"] = timed(lambda: [topics._matching_patterns(s) for s in cleaned], repeat)
+
+    with quiet:
+        out["standardiser_full"] = timed(lambda: annales.standardiser(workdir, incremental=False), repeat,
+                                         clear_topic_caches)
+        out["standardiser_incremental"] = timed(lambda: annales.standardiser(workdir), repeat)
+
+    def reset_cache():
+        annales.EXERCISES_CACHE = None
+    out["load_exercises"] = timed(lambda: annales.load_exercises(std_path), repeat, reset_cache)
+    out["load_dataset_snapshot"] = timed(lambda: load_dataset(std_path, workdir), repeat)
+    snap = snapshot_path(std_path)
+    os.rename(snap, snap + ".off")
+    out["load_dataset_json"] = timed(lambda: load_dataset(std_path, workdir), repeat)
+    os.rename(snap + ".off", snap)
+
+    index = load_dataset(std_path, workdir).index
+    tag_sets = _tag_sets(index, rng, REQUESTS)
+    out["generate_combo_greedy"] = per_call(
+        lambda tags, seed: generate_combo(index, index.all, tags, k=3, seed=seed),
+        [(tags, i) for i, tags in enumerate(tag_sets)], repeat)
+    out["generate_combo_greedy_strict"] = per_call(
+        lambda tags, seed: generate_combo(index, index.all, tags, k=3, seed=seed, only_selected=True),
+        [(tags, i) for i, tags in enumerate(tag_sets)], repeat)
+    out["generate_combo_optimal"] = per_call(
+        lambda tags, seed: generate_combo(index, index.all, tags, k=3, seed=seed, mode="optimal",
+                                          time_budget=OPTIMAL_BUDGET),
+        [(tags, i) for i, tags in enumerate(tag_sets)], repeat)
+
+    # API : le serveur est branché sur le corpus synthétique
+    saved = app_module.DATASET
+    app_module.DATASET = DatasetManager(std_path, files_root=workdir)
+    try:
+        with quiet:
+            app_module.DATASET.current()
+        client = app_module.app.test_client()
+
+        def post(body):
+            r = client.post("/api/generate", json=body)
+            assert r.status_code == 200, r.get_data(as_text=True)
+
+        def get(url):
+            r = client.get(url)
+            assert r.status_code == 200, r.get_data(as_text=True)
+
+        bodies = [{"tags": tags, "k": 3, "seed": i, "year_min": 2022, "year_max": 2028}
+                  for i, tags in enumerate(tag_sets)]
+        runs = []
+        for _ in range(repeat):
+            app_module.GENERATE_CACHE.clear()
+            runs.append(per_call(post, [(b,) for b in bodies], 1)["median"])
+        out["api_generate"] = _stats(runs)
+        out["api_generate_cached"] = per_call(post, [(b,) for b in bodies], repeat)
+        out["api_generate_optimal"] = per_call(
+            post, [({**b, "seed": None, "mode": "optimal", "time_budget_ms": OPTIMAL_BUDGET * 1000},)
+                   for b in bodies], repeat)
+        out["api_search"] = per_call(get, [(f"/api/search?q={q}",) for q in SEARCH_QUERIES], repeat)
+        out["api_search_tags"] = per_call(
+            get, [("/api/search?" + "&".join(f"tags={t}" for t in tags),) for tags in tag_sets], repeat)
+    finally:
+        app_module.DATASET = saved
+    return out
+
+
+# ---------- Rapport ----------
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(old: dict, new: dict):
+    """Affiche le rapport nouveau / ancien (médianes) pour les mesures communes."""
+    print(f"\n{'taille':>8} {'mesure':<30} {'ancien':>10} {'nouveau':>10} {'ratio':>7}")
+    for size, results in new["sizes"].items():
+        for name, r in results.items():
+            before = old.get("sizes", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = r["median"] / before["median"] if before["median"] else float("inf")
+            flag = "  ⚠️" if ratio > 1.2 else ""
+            print(f"{size:>8} {name:<30} {before['median']:>10.4f} {r['median']:>10.4f} {ratio:>6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="tailles de corpus (ex. 1000,10000)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--out", help="fichier de résultats (défaut : bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="résultats d'un run précédent à comparer")
+    args = parser.parse_args()
+
+    commit, dirty = _git_commit()
+    report = {
+        "commit": commit, "dirty": dirty,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0], "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "repeat": args.repeat, "sizes": {},
+    }
+    for n in (int(s) for s in args.sizes.split(",")):
+        workdir = tempfile.mkdtemp(prefix=f"nsibench-{n}-")
+        try:
+            t = time.perf_counter()
+            report["sizes"][str(n)] = results = bench_size(n, args.repeat, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"\n{n} exercices ({time.perf_counter() - t:.1f} s)")
+        for name, r in results.items():
+            print(f"  {name:<30} médiane {r['median'] * 1000:10.2f} ms   min {r['min'] * 1000:10.2f} ms")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{(commit or 'local')[:10]}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nRésultats : {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Jeu de données rechargeable à chaud.
+
+Le serveur ne garde plus exercises_standardises.json pour toute la durée du
+processus : DatasetManager surveille le fichier (inode, mtime, taille) et,
+quand il change (nouveau scraping / standardisation), reconstruit l'index
+dans un thread à part puis remplace l'instantané d'un coup. Les requêtes en
+cours gardent l'instantané qu'elles ont pris.
+
+Chaque instantané indique aussi quels PDF sont présents dans downloads/
+(drapeaux available_locally), pour que l'interface ouvre directement le
+fichier local sans le sonder. Ils sont recalculés au chargement et quand les
+fichiers surveillés en plus (manifeste du crawl) changent.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Set
+
+from exercise_index import ExerciseIndex
+from snapshot import Snapshot, snapshot_path
+from stats import compute_stats, load_stats, stats_path
+
+CHECK_INTERVAL = 2.0  # secondes entre deux stat() du fichier
+
+
+class Dataset:
+    """Instantané immuable : exercices + index dérivés + version."""
+
+    def __init__(self, exercises: List[dict], version: str, signature=None, text_search=None, stats=None):
+        self.exercises = exercises
+        if isinstance(exercises, Snapshot):
+            self.index = ExerciseIndex(exercises, rows=exercises.index_rows(), text=exercises.search_text())
+        else:
+            self.index = ExerciseIndex(exercises, text_search=text_search)
+        # statistiques des thèmes (stats.py) : celles de la standardisation, ou recalculées
+        if stats is None:
+            stats = compute_stats(exercises.index_rows() if isinstance(exercises, Snapshot) else exercises)
+        self.stats = stats
+        self.index.set_pairs(stats["pairs"])
+        self.version = version      # empreinte du contenu, pour les caches et les ETag
+        self.signature = signature  # (inode, mtime, taille) des fichiers surveillés
+        self.load_seconds = None    # durée du chargement (lecture + index)
+
+
+def _signature(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def local_files(root: str) -> Set[str]:
+    """Chemins (relatifs à `root`, séparateur /) de tous les fichiers présents."""
+    out = set()
+    for dirpath, _, filenames in os.walk(root):
+        rel = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        prefix = "" if rel == "." else rel + "/"
+        out.update(prefix + name for name in filenames)
+    return out
+
+
+def _rel(path) -> str:
+    return path[len("downloads/"):] if path.startswith("downloads/") else path
+
+
+def mark_available(exercises: List[dict], files: Set[str]) -> Set[str]:
+    """
+    Ajoute les drapeaux de présence locale du sujet et de chaque corrigé.
+    Retourne les fichiers référencés effectivement présents.
+    """
+    present = set()
+    for ex in exercises:
+        if not isinstance(ex, dict):
+            continue
+        subject = ex.get("local_subject_file")
+        ex["subject_available_locally"] = bool(subject) and _rel(subject) in files
+        if ex["subject_available_locally"]:
+            present.add(_rel(subject))
+        for c in ex.get("corriges") or []:
+            local = c.get("local_file")
+            c["available_locally"] = bool(local) and _rel(local) in files
+            if c["available_locally"]:
+                present.add(_rel(local))
+    return present
+
+
+def load_dataset(path: str, files_root: Optional[str] = None) -> Dataset:
+    """
+    Charge le JSON, ou l'instantané binaire écrit à côté par la
+    standardisation (snapshot.py) s'il correspond toujours au JSON.
+    """
+    snap = _fresh_snapshot(path)
+    if snap is not None:
+        if files_root is not None:
+            files = local_files(files_root)
+            snap.available = {p for p in snap.local_files() if _rel(p) in files}
+        return Dataset(snap, _version(snap.version, snap.available), _signature(path),
+                       stats=load_stats(stats_path(path), snap.version))
+
+    with open(path, "rb") as f:
+        signature = _signature(path)
+        raw = f.read()
+    exercises = json.loads(raw.decode("utf-8"))
+
+    present = mark_available(exercises, local_files(files_root)) if files_root is not None else None
+    content_version = hashlib.sha1(raw).hexdigest()[:16]
+    return Dataset(exercises, _version(content_version, present), signature,
+                   stats=load_stats(stats_path(path), content_version))
+
+
+def _version(content_version: str, present: Optional[Set[str]]) -> str:
+    if present is None:
+        return content_version
+    # la version change aussi quand un PDF référencé apparaît ou disparaît
+    h = hashlib.sha1(content_version.encode("utf-8"))
+    h.update("\n".join(sorted(_rel(p) for p in present)).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _fresh_snapshot(json_path: str) -> Optional[Snapshot]:
+    path = snapshot_path(json_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        snap = Snapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"[dataset] instantané {path} ignoré : {e}")
+        return None
+    return snap if snap.is_fresh(json_path) else None
+
+
+def load_sqlite_dataset(path: str, files_root: Optional[str] = None) -> Dataset:
+    """
+    Même chose depuis la base de sqlite_store.py : les exercices restent dans
+    la base (relus à la demande), la recherche texte passe par son index FTS5.
+    """
+    from sqlite_store import ExerciseRows
+
+    signature = _signature(path)
+    rows = ExerciseRows(path)
+    if files_root is not None:
+        files = local_files(files_root)
+        rows.available = {p for p in rows.local_files() if _rel(p) in files}
+    return Dataset(rows, _version(rows.version(), rows.available), signature, text_search=rows.text_search)
+
+
+class DatasetManager:
+    def __init__(self, path: str, check_interval: float = CHECK_INTERVAL, on_load=None,
+                 files_root: Optional[str] = None, watch: Iterable[str] = (), loader=load_dataset):
+        self.path = path
+        self.loader = loader          # load_dataset (JSON) ou load_sqlite_dataset
+        self.files_root = files_root  # dossier des PDF (drapeaux available_locally)
+        self.watch = list(watch)      # autres fichiers dont un changement déclenche un rechargement
+        self.on_load = on_load  # appelé avec chaque nouvel instantané, avant sa mise en service
+        self.check_interval = check_interval
+        self._current: Optional[Dataset] = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self._next_check = 0.0
+        self._failed = None  # signature dont le chargement a échoué
+        self.loads = 0       # chargements réussis
+        self.failures = 0    # rechargements en échec
+
+    def current(self) -> Dataset:
+        """
+        Instantané courant. Le premier appel charge le fichier ; ensuite un
+        changement du fichier déclenche une reconstruction en arrière-plan
+        et l'ancien instantané reste servi en attendant.
+        """
+        ds = self._current
+        if ds is None:
+            with self._lock:
+                if self._current is None:
+                    self._swap(self._load())
+                return self._current
+
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            sig = self._signature()
+            if sig[0] is not None and sig != ds.signature and sig != self._failed:
+                self._start_reload()
+        return ds
+
+    def reload(self) -> Dataset:
+        """Recharge immédiatement (bloquant)."""
+        with self._lock:
+            self._swap(self._load())
+            return self._current
+
+    def _start_reload(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._reload_worker, name="dataset-reload", daemon=True).start()
+
+    def _reload_worker(self):
+        try:
+            ds = self._load()
+        except (OSError, ValueError) as e:
+            self._failed = self._signature()
+            self.failures += 1
+            print(f"[dataset] rechargement de {self.path} impossible : {e}")
+            return
+        finally:
+            with self._lock:
+                self._loading = False
+        with self._lock:
+            self._swap(ds)
+
+    def _signature(self):
+        return tuple(_signature(p) for p in [self.path] + self.watch)
+
+    def _load(self) -> Dataset:
+        sig = self._signature()
+        t = time.perf_counter()
+        ds = self.loader(self.path, self.files_root)
+        ds.load_seconds = time.perf_counter() - t
+        ds.signature = sig
+        self.loads += 1
+        if self.on_load is not None:
+            self.on_load(ds)
+        return ds
+
+    def _swap(self, ds: Dataset):
+        old = self._current
+        if old is not None and old.version == ds.version:
+            # contenu identique (fichier simplement réécrit) : on garde l'index
+            old.signature = ds.signature
+            return
+        self._current = ds
+        self._failed = None
+        print(f"[dataset] {len(ds.exercises)} exercices chargés en {ds.load_seconds:.2f} s (version {ds.version})")
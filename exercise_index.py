@@ -0,0 +1,256 @@
+"""
+Index en mémoire des exercices, construit une fois au chargement.
+
+Les thèmes et les sujets sont internés en petits entiers ; chaque critère
+(thème, année, session, points) pointe vers un "bitset" Python (int) dont le
+bit i est à 1 si l'exercice i le vérifie. Les filtres de /api/generate et le
+test "topics ⊆ tags" deviennent des opérations bit à bit.
+
+Pour la recherche texte, la "botte de foin" normalisée de chaque exercice
+(mêmes champs que l'ancien matches() côté client) est précalculée et
+concaténée : une requête est un str.find répété sur un seul texte. Avec la
+base SQLite, elle est remplacée par une fonction de recherche (`text_search`)
+qui interroge l'index FTS5.
+"""
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from topics import strip_accents
+
+# séparateur entre exercices dans le texte concaténé (absent des requêtes)
+_SEP = "\x00"
+
+
+def normalize_text(s: str) -> str:
+    """Équivalent serveur du normalize() de static/app.js."""
+    return strip_accents((s or "").lower()).strip()
+
+
+def _haystack(ex: dict) -> str:
+    def txt(v):
+        return "" if v is None else str(v)
+    return normalize_text(" | ".join([
+        txt(ex.get("session")),
+        txt(ex.get("subject_label")),
+        txt(ex.get("code")),
+        f"exercice {txt(ex.get('exercise'))}",
+        f"{txt(ex.get('points'))} points",
+        " ".join(ex.get("topics") or []),
+        txt(ex.get("raw")),
+    ]))
+
+
+def positions(bits: int) -> List[int]:
+    """Indices des bits à 1 (ordre croissant)."""
+    s = bin(bits)[:1:-1]  # bits de poids faible en premier, sans "0b"
+    out = []
+    i = s.find("1")
+    while i != -1:
+        out.append(i)
+        i = s.find("1", i + 1)
+    return out
+
+
+def bitset(indices: Iterable[int], size: int) -> int:
+    """Construit le bitset d'une liste d'indices en une passe (évite n décalages de grands entiers)."""
+    buf = bytearray((size + 7) // 8)
+    for i in indices:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+class ExerciseIndex:
+    def __init__(self, exercises: List[dict], text_search: Optional[Callable[[str], Iterable[int]]] = None,
+                 rows: Optional[Iterable[dict]] = None, text: Optional[Tuple[str, List[int]]] = None):
+        # rows / text : champs et texte normalisé déjà disponibles (instantané binaire),
+        # pour ne pas relire chaque exercice
+        self.exercises = exercises
+        self.text_search = text_search
+
+        self.topic_ids: Dict[str, int] = {}
+        self.topics: List[str] = []
+        self.subject_ids: Dict[str, int] = {}
+        self.exercise_ids: Dict[str, int] = {}
+
+        # colonnes par exercice
+        self.masks: List[int] = []      # bitmask des thèmes
+        self.subjects: List[int] = []   # id interné du sujet
+        self.ids: List[int] = []        # id interné de l'exercice (certains ids sont dupliqués)
+        self.position_of: Dict[str, int] = {}  # id -> première position
+        self.bonus: List[float] = []    # bonus de score (exercices longs)
+
+        # listes inversées : critère -> bitset d'exercices
+        self.by_topic: List[int] = []
+        self.by_year: Dict[int, int] = {}
+        self.by_session: Dict[str, int] = {}
+        self.pair_bits: Dict[Tuple[int, int], int] = {}  # (thème, thème) -> exercices qui couvrent les deux
+        self.by_points: Dict[int, int] = {}
+        self.no_year = 0
+
+        n = len(exercises)
+        topic_post: List[List[int]] = []
+        year_post: Dict[int, List[int]] = {}
+        session_post: Dict[str, List[int]] = {}
+        points_post: Dict[int, List[int]] = {}
+        no_year: List[int] = []
+
+        for i, ex in enumerate(exercises if rows is None else rows):
+            mask = 0
+            for t in ex.get("topics") or []:
+                tid = self.topic_ids.get(t)
+                if tid is None:
+                    tid = self.topic_ids[t] = len(self.topics)
+                    self.topics.append(t)
+                    topic_post.append([])
+                mask |= 1 << tid
+                topic_post[tid].append(i)
+            self.masks.append(mask)
+
+            self.subjects.append(self.subject_ids.setdefault(ex.get("subject_id"), len(self.subject_ids)))
+            self.ids.append(self.exercise_ids.setdefault(ex.get("id"), len(self.exercise_ids)))
+            self.position_of.setdefault(ex.get("id"), i)
+
+            pts = ex.get("points") or 0
+            self.bonus.append(0.05 if pts >= 8 else 0.0)
+            points_post.setdefault(pts, []).append(i)
+
+            y = ex.get("year")
+            if y is None:
+                no_year.append(i)
+            else:
+                year_post.setdefault(int(y), []).append(i)
+
+            session_post.setdefault(ex.get("session"), []).append(i)
+
+        self.by_topic = [bitset(p, n) for p in topic_post]
+        self.by_year = {y: bitset(p, n) for y, p in year_post.items()}
+        self.by_session = {s: bitset(p, n) for s, p in session_post.items()}
+        self.by_points = {pts: bitset(p, n) for pts, p in points_post.items()}
+        self.no_year = bitset(no_year, n)
+        self.all = (1 << n) - 1
+
+        # texte normalisé concaténé + position de début de chaque exercice
+        self.text_starts: List[int] = []
+        self.text = ""
+        if text is not None:
+            self.text, self.text_starts = text
+        elif text_search is None:
+            parts = []
+            offset = 0
+            for ex in exercises:
+                h = _haystack(ex)
+                self.text_starts.append(offset)
+                parts.append(h)
+                offset += len(h) + len(_SEP)
+            self.text = _SEP.join(parts)
+
+    def __len__(self):
+        return len(self.exercises)
+
+    def set_pairs(self, pairs: List[dict]):
+        """Bitsets des paires de thèmes à partir des co-occurrences de stats.py."""
+        n = len(self)
+        self.pair_bits = {}
+        for p in pairs:
+            a, b = (self.topic_ids.get(t) for t in p["topics"])
+            if a is not None and b is not None:
+                self.pair_bits[(min(a, b), max(a, b))] = bitset(p["exercises"], n)
+
+    def tags_mask(self, tags: Iterable[str]) -> int:
+        """Bitmask des thèmes connus parmi `tags` (les inconnus sont ignorés)."""
+        mask = 0
+        for t in tags:
+            tid = self.topic_ids.get(t)
+            if tid is not None:
+                mask |= 1 << tid
+        return mask
+
+    def filter(self, year_min=None, year_max=None, sessions: Optional[Iterable[str]] = None) -> int:
+        """
+        Bitset des exercices qui passent les filtres optionnels
+        (un exercice sans année passe les filtres d'année).
+        """
+        bits = self.all
+        if year_min is not None or year_max is not None:
+            lo = int(year_min) if year_min is not None else None
+            hi = int(year_max) if year_max is not None else None
+            years = self.no_year
+            for y, b in self.by_year.items():
+                if (lo is None or y >= lo) and (hi is None or y <= hi):
+                    years |= b
+            bits &= years
+        if sessions:
+            sess = 0
+            for s in sessions:
+                sess |= self.by_session.get(s, 0)
+            bits &= sess
+        return bits
+
+    def subset_of(self, mask: int) -> int:
+        """Bitset des exercices dont tous les thèmes sont dans `mask`."""
+        outside = 0
+        for tid, b in enumerate(self.by_topic):
+            if not (mask >> tid) & 1:
+                outside |= b
+        return self.all & ~outside
+
+    def text_match(self, q: str) -> int:
+        """Bitset des exercices dont le texte normalisé contient `q`."""
+        q = normalize_text(q)
+        if not q:
+            return self.all
+        if self.text_search is not None:
+            return bitset(self.text_search(q), len(self))
+        hits = []
+        starts = self.text_starts
+        pos = self.text.find(q)
+        while pos != -1:
+            i = bisect_right(starts, pos) - 1
+            hits.append(i)
+            # on saute au début de l'exercice suivant
+            nxt = starts[i + 1] if i + 1 < len(starts) else len(self.text)
+            pos = self.text.find(q, nxt)
+        return bitset(hits, len(self))
+
+    def search(self, q: str = "", tags: Iterable[str] = (), strict: bool = False, year=None, session=None, points=None) -> int:
+        """
+        Bitset des exercices correspondant à la recherche de la page d'accueil :
+        texte, tous les `tags` (et seulement eux si `strict`), année, session, points.
+        """
+        bits = self.all
+        if year not in (None, ""):
+            bits &= self.by_year.get(_as_int(year), 0)
+        if session not in (None, ""):
+            bits &= self.by_session.get(session, 0)
+        if points not in (None, ""):
+            bits &= self.by_points.get(_as_int(points), 0)
+
+        tags = list(tags)
+        for t in tags:
+            tid = self.topic_ids.get(t)
+            bits &= self.by_topic[tid] if tid is not None else 0
+        if strict and tags:
+            bits &= self.subset_of(self.tags_mask(tags))
+
+        if bits and q:
+            bits &= self.text_match(q)
+        return bits
+
+    def facets(self, bits: int) -> Dict[str, list]:
+        """Comptes par année/session/points/thème parmi `bits`."""
+        def count(d):
+            return [(v, (bits & b).bit_count()) for v, b in d.items()]
+        topics = [(t, (bits & self.by_topic[tid]).bit_count()) for t, tid in self.topic_ids.items()]
+        return {
+            "year": [{"value": v, "count": c} for v, c in sorted(count(self.by_year)) if c],
+            "session": [{"value": v, "count": c} for v, c in sorted(count(self.by_session), key=lambda x: str(x[0])) if c],
+            "points": [{"value": v, "count": c} for v, c in sorted(count(self.by_points)) if c],
+            "topics": [{"value": v, "count": c} for v, c in sorted(topics, key=lambda x: (-x[1], x[0])) if c],
+        }
+
+
+def _as_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,194 @@
+"""
+Pages de chaque exercice dans les SUJET.pdf.
+
+Étape hors ligne (python exercise_pages.py, après fulltext.py) : à partir du
+texte par page mis en cache par fulltext.py, repère les titres "Exercice N"
+de chaque sujet et écrit downloads/exercise_pages.json
+({sujet: {"sha256", "exercises": {N: [première, dernière]}}}), puis relance
+la standardisation, qui recopie ces plages dans le champ `pages` des
+exercices.
+
+Côté serveur, SliceCache découpe à la demande les pages d'un exercice
+(module optionnel pypdf) et garde les PDF obtenus dans un dossier de taille
+bornée, le moins récemment servi étant supprimé en premier.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, Optional
+
+from fulltext import file_sha256, load_pages
+
+try:
+    from pypdf import PdfReader, PdfWriter  # optionnel : seulement pour le découpage
+except ImportError:
+    PdfReader = PdfWriter = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
+PAGES_PATH = os.path.join(DOWNLOADS_DIR, "exercise_pages.json")
+SLICES_DIR = os.path.join(DOWNLOADS_DIR, "slices")
+SLICE_CACHE_BYTES = 200 * 1024 * 1024
+
+# titre en début de ligne : "Exercice 2", "EXERCICE N°2", ...
+_HEADING_RE = re.compile(r"^\s*exercice\s*(?:n\s*°\s*)?(\d+)\b", re.I | re.M)
+TOP_LINES = 3  # un titre dans les premières lignes ouvre la page
+
+
+def _headings(page: str) -> Dict[int, bool]:
+    """{numéro d'exercice: titre en haut de page ?} pour une page."""
+    out = {}
+    for m in _HEADING_RE.finditer(page):
+        n = int(m.group(1))
+        lines_before = sum(1 for line in page[:m.start()].splitlines() if line.strip())
+        out.setdefault(n, lines_before < TOP_LINES)
+    return out
+
+
+def detect_ranges(pages: List[str]) -> Dict[int, List[int]]:
+    """
+    Plages [première, dernière] (pages numérotées à partir de 1) de chaque
+    exercice. Une page qui cite plus de deux exercices (sommaire) est
+    ignorée ; les exercices sont cherchés dans l'ordre 1, 2, 3...
+    """
+    found = []  # [(numéro, page, titre en haut de page)]
+    for p, text in enumerate(pages, start=1):
+        heads = _headings(text)
+        if len(heads) > 2:
+            continue
+        while len(found) + 1 in heads:
+            n = len(found) + 1
+            found.append((n, p, heads[n]))
+
+    ranges = {}
+    for j, (n, p, _) in enumerate(found):
+        if j + 1 < len(found):
+            _, next_p, next_top = found[j + 1]
+            last = next_p - 1 if next_top else next_p
+        else:
+            last = len(pages)
+        ranges[n] = [p, max(p, last)]
+    return ranges
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def update_pages(root: str = DOWNLOADS_DIR) -> str:
+    """Recalcule les plages des sujets nouveaux ou modifiés (par sha256)."""
+    with open(os.path.join(root, "exercises_standardises.json"), "r", encoding="utf-8") as f:
+        exercises = json.load(f)
+
+    previous = _read_json(PAGES_PATH, {}).get("subjects", {})
+    subjects = {}
+    for ex in exercises:
+        rel = ex.get("local_subject_file")
+        full = os.path.join(root, rel) if rel else None
+        if not full or rel in subjects or not os.path.isfile(full):
+            continue
+        sha = file_sha256(full)
+        if previous.get(rel, {}).get("sha256") == sha:
+            subjects[rel] = previous[rel]
+            continue
+        pages = load_pages(sha)
+        if pages is None:
+            print(f"  ⚠️ {rel} : texte absent (lancer fulltext.py)")
+            continue
+        ranges = detect_ranges(pages)
+        subjects[rel] = {"sha256": sha, "exercises": {str(n): r for n, r in ranges.items()}}
+
+    tmp = f"{PAGES_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"subjects": subjects}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, PAGES_PATH)
+    found = sum(len(s["exercises"]) for s in subjects.values())
+    print(f"Pages d'exercices : {found} plages dans {len(subjects)} sujets.")
+    return PAGES_PATH
+
+
+def load_ranges(path: str = PAGES_PATH) -> Dict[str, Dict[str, List[int]]]:
+    """{sujet: {numéro d'exercice (str): [première, dernière]}}, vide si absent."""
+    return {rel: s.get("exercises", {}) for rel, s in _read_json(path, {}).get("subjects", {}).items()}
+
+
+# ---------- Découpage (serveur) ----------
+
+def slice_pdf(src: str, dest: str, first: int, last: int):
+    """Écrit dans `dest` les pages first..last (incluses, à partir de 1) de `src`."""
+    reader = PdfReader(src)
+    writer = PdfWriter()
+    for i in range(first - 1, min(last, len(reader.pages))):
+        writer.add_page(reader.pages[i])
+    tmp = f"{dest}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        writer.write(f)
+    os.replace(tmp, dest)
+
+
+class SliceCache:
+    """Extraits de PDF sur disque, taille totale bornée, éviction LRU."""
+
+    def __init__(self, directory: str = SLICES_DIR, max_bytes: int = SLICE_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # nom -> taille, du moins au plus récemment servi
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".pdf"):
+                st = os.stat(os.path.join(directory, name))
+                files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    def open(self, src: str, src_digest: str, first: int, last: int) -> Optional[BinaryIO]:
+        """
+        Extrait ouvert en lecture (créé si besoin), None si pypdf est absent.
+        Le fichier est ouvert sous le verrou : une éviction concurrente peut
+        le supprimer du disque sans couper la lecture (à fermer par l'appelant).
+        """
+        name = f"{src_digest[:32]}-{first}-{last}.pdf"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name in self._entries:
+                try:
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    pass  # supprimé hors du cache : on le refait
+                else:
+                    self._entries.move_to_end(name)
+                    os.utime(path)  # l'ordre LRU survit à un redémarrage
+                    return f
+        if PdfWriter is None:
+            return None
+
+        slice_pdf(src, path, first, last)
+        with self._lock:
+            f = open(path, "rb")
+            size = os.fstat(f.fileno()).st_size
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old, size = self._entries.popitem(last=False)
+                self._total -= size
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+        return f
+
+if __name__ == "__main__":
+    from annales import standardiser
+
+    update_pages()
+    standardiser(DOWNLOADS_DIR)
@@ -0,0 +1,233 @@
+"""
+Recherche plein texte dans les PDF téléchargés (sujets et corrigés).
+
+Étape hors ligne (python fulltext.py, après getAnnales.py) :
+- extraction du texte de chaque PDF de downloads/NSI/, page par page, dans un
+  pool de processus (module optionnel pypdf) ;
+- le texte est mis en cache par empreinte du contenu
+  (downloads/fulltext/text/<2 car.>/<sha256>.json) : seuls les nouveaux PDF
+  sont relus ;
+- un index inversé (terme -> [(document, fréquence, pages)]) est écrit dans
+  downloads/fulltext/index.json.
+
+Côté serveur, FullTextIndex charge cet index et classe les documents par BM25 ;
+les pages qui contiennent la requête viennent de l'index, sans relire le texte.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from topics import strip_accents
+
+try:
+    from pypdf import PdfReader  # optionnel : seulement pour l'extraction
+except ImportError:
+    PdfReader = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
+FULLTEXT_DIR = os.path.join(DOWNLOADS_DIR, "fulltext")
+INDEX_PATH = os.path.join(FULLTEXT_DIR, "index.json")
+PDF_ROOT = "NSI"  # sous-dossier de downloads/ à indexer
+
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+INDEX_FORMAT = 2
+
+# BM25
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("""
+a au aux avec ce ces cet cette dans de des du elle en est et il ils la le les leur
+lui mais on ou par pas pour qu que qui sa se ses son sont sur un une vous nous ne
+si y l d s n c j m t qu on ete etre fait peut plus tout tous
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes normalisés (minuscules, sans accents, pluriel simple retiré)."""
+    out = []
+    for tok in _TOKEN_RE.findall(strip_accents((text or "").lower())):
+        if len(tok) < 2 or tok in STOP_WORDS:
+            continue
+        if len(tok) > 3 and tok[-1] in "sx" and not tok.isdigit():
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+# ---------- Extraction (hors ligne) ----------
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def text_cache_path(sha256: str) -> str:
+    return os.path.join(FULLTEXT_DIR, "text", sha256[:2], f"{sha256}.json")
+
+
+def extract_pages(path: str) -> dict:
+    """Texte de chaque page d'un PDF (exécuté dans un processus du pool)."""
+    logging.getLogger("pypdf").setLevel(logging.ERROR)  # avertissements de polices non bloquants
+    try:
+        reader = PdfReader(path)
+        return {"pages": [page.extract_text() or "" for page in reader.pages]}
+    except Exception as e:  # PDF corrompu / chiffré : on garde une trace
+        return {"pages": [], "error": f"{type(e).__name__}: {e}"}
+
+
+def load_pages(sha256: str) -> Optional[List[str]]:
+    """Pages en cache pour une empreinte, None si absentes."""
+    try:
+        with open(text_cache_path(sha256), "r", encoding="utf-8") as f:
+            return json.load(f).get("pages")
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json_atomic(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def list_pdfs(root: str = DOWNLOADS_DIR) -> List[str]:
+    """Chemins relatifs à downloads/ (séparateur /) des PDF à indexer."""
+    out = []
+    for dirpath, _, filenames in os.walk(os.path.join(root, PDF_ROOT)):
+        for name in filenames:
+            if name.lower().endswith(".pdf"):
+                out.append(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/"))
+    return sorted(out)
+
+
+def extract_all(pdfs: List[str], root: str = DOWNLOADS_DIR, workers: int = MAX_WORKERS) -> Dict[str, str]:
+    """
+    Empreinte de chaque PDF ; extrait (en parallèle) ceux dont le texte
+    n'est pas encore en cache. Retourne {chemin relatif: sha256}.
+    """
+    hashes = {rel: file_sha256(os.path.join(root, rel)) for rel in pdfs}
+    todo, seen = {}, set()
+    for rel, sha in hashes.items():
+        # un même PDF peut être présent sous plusieurs noms : extrait une fois
+        if sha not in seen and not os.path.exists(text_cache_path(sha)):
+            todo[rel] = sha
+        seen.add(sha)
+    if not todo:
+        return hashes
+    if PdfReader is None:
+        raise RuntimeError("Le module pypdf est nécessaire pour extraire le texte des PDF (pip install pypdf).")
+
+    print(f"Extraction du texte de {len(todo)} PDF...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = [os.path.join(root, rel) for rel in todo]
+        for (rel, sha), result in zip(todo.items(), pool.map(extract_pages, paths)):
+            if result.get("error"):
+                print(f"  ⚠️ {rel} : {result['error']}")
+            _write_json_atomic(text_cache_path(sha), result)
+    return hashes
+
+
+def build_index(hashes: Dict[str, str]) -> dict:
+    """Index inversé à partir des textes en cache."""
+    docs = []
+    postings: Dict[str, List[int]] = {}
+    for doc_id, (rel, sha) in enumerate(sorted(hashes.items())):
+        counts: Dict[str, int] = {}
+        pages: Dict[str, int] = {}  # terme -> pages qui le contiennent (bit p-1 pour la page p)
+        length = 0
+        for p, page in enumerate(load_pages(sha) or []):
+            for tok in tokenize(page):
+                counts[tok] = counts.get(tok, 0) + 1
+                pages[tok] = pages.get(tok, 0) | 1 << p
+                length += 1
+        docs.append({"path": rel, "sha256": sha, "length": length})
+        for tok, tf in counts.items():
+            # liste plate [doc, tf, pages, doc, tf, pages, ...] : plus compacte en JSON
+            postings.setdefault(tok, []).extend((doc_id, tf, pages[tok]))
+    return {"format": INDEX_FORMAT, "docs": docs, "postings": postings}
+
+
+def update_index(root: str = DOWNLOADS_DIR, workers: int = MAX_WORKERS) -> str:
+    """Extraction incrémentale + reconstruction de l'index si les PDF ont changé."""
+    hashes = extract_all(list_pdfs(root), root, workers)
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = None
+    if previous and previous.get("format") == INDEX_FORMAT and \
+            {d["path"]: d["sha256"] for d in previous["docs"]} == hashes:
+        print("Index plein texte à jour.")
+        return INDEX_PATH
+
+    index = build_index(hashes)
+    _write_json_atomic(INDEX_PATH, index)
+    print(f"Index plein texte : {len(index['docs'])} documents, {len(index['postings'])} termes.")
+    return INDEX_PATH
+
+
+# ---------- Recherche (serveur) ----------
+
+def page_numbers(pages: int) -> List[int]:
+    """Numéros (à partir de 1) des pages d'un masque de l'index."""
+    out = []
+    p = 1
+    while pages:
+        if pages & 1:
+            out.append(p)
+        pages >>= 1
+        p += 1
+    return out
+
+
+class FullTextIndex:
+    def __init__(self, data: dict):
+        if data.get("format") != INDEX_FORMAT:
+            raise ValueError("index plein texte d'un ancien format : relancer python fulltext.py")
+        self.docs = data["docs"]
+        self.postings = data["postings"]
+        n = len(self.docs)
+        self.avgdl = (sum(d["length"] for d in self.docs) / n) if n else 0.0
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "FullTextIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def search(self, q: str) -> List[tuple]:
+        """
+        [(score BM25, indice du document, pages)] par score décroissant ;
+        pages : masque des pages contenant un terme de `q` (page_numbers).
+        """
+        n = len(self.docs)
+        scores: Dict[int, float] = {}
+        pages: Dict[int, int] = {}
+        for term in dict.fromkeys(tokenize(q)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            df = len(plist) // 3
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for j in range(0, len(plist), 3):
+                doc, tf, mask = plist[j], plist[j + 1], plist[j + 2]
+                norm = K1 * (1 - B + B * self.docs[doc]["length"] / self.avgdl)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+                pages[doc] = pages.get(doc, 0) | mask
+        return sorted(((s, d, pages[d]) for d, s in scores.items()), key=lambda x: (-x[0], x[1]))
+
+
+if __name__ == "__main__":
+    update_index()
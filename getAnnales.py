@@ -1,9 +1,23 @@
-import os, re, json, time
+import os, re, json, time, threading, hashlib, shutil
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
 from urllib.parse import urljoin, urlparse
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from dateutil.parser import parse as parse_date
 
+from topics import RULES_VERSION, TOPIC_ALIASES, TOPIC_PATTERNS, clean_theme_text, norm_topic, split_topics  # noqa: F401
+
+# lxml (optionnel) est nettement plus rapide que le parseur HTML de la stdlib
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
 BASE = "https://www.math93.com"
 PAGES = [
     f"{BASE}/annales-du-bac/bac-specialite-nsi/annales-nsi-2025/nsi-ecrit-2025.html",
@@ -15,61 +29,38 @@ PAGES = [
 UA = {"User-Agent": "Mozilla/5.0 (compatible; annales-indexer/1.0)"}
 OUT_DIR = "downloads"
 
-TOPIC_ALIASES = {
-    "poo": "programmation orientée objet",
-    "bdd": "bases de données",
-    "bases de données relationnelles": "bases de données",
-    "sql": "sql",
-    "arbres binaires": "arbres binaires",
-    "graphes": "graphes",
-    "récursivité": "récursivité",
-    "réseaux": "réseaux",
-    "processus": "processus",
-    "piles": "piles",
-    "files": "files",
-    "dictionnaires": "dictionnaires",
-    "tableaux": "tableaux",
-    "tris": "tris",
-    "gloutons": "algorithmes gloutons",
-    "programmation dynamique": "programmation dynamique",
-    "huffman": "huffman",
-    "compression": "compression",
-    "décidabilité": "décidabilité",
-    "sécurisation des communications": "sécurité / crypto",
-    "cryptographie": "sécurité / crypto",
-}
-
-# Liste de thèmes "canon" + motifs de détection (tu peux enrichir)
-TOPIC_PATTERNS = [
-    ("sql", r"\bsql\b|requêtes?\s+sql|langage\s+sql"),
-    ("bases de données", r"bases?\s+de\s+donn(e|é)es?|mod[eè]le\s+relationnel"),
-    ("graphes", r"\bgraphes?\b|parcours\s+de\s+graphes?|chemins?\s+dans\s+un\s+graphe"),
-    ("arbres binaires", r"arbres?\s+binaires?"),
-    ("arbres binaires de recherche", r"arbres?\s+binaires?\s+de\s+recherche"),
-    ("récursivité", r"r[eé]cursivit[eé]|r[eé]cursif"),
-    ("programmation orientée objet", r"\bpoo\b|programmation\s+orient[eé]e\s+objet|programmation\s+objet"),
-    ("programmation python", r"\bpython\b|programmation\s+en\s+python"),
-    ("tableaux", r"\btableaux?\b"),
-    ("dictionnaires", r"\bdictionnaires?\b"),
-    ("listes", r"\blistes?\b"),
-    ("piles", r"\bpiles?\b|lifo"),
-    ("files", r"\bfiles?\b|fifo"),
-    ("tris", r"\btris?\b|tri\s+fusion|tri\s+rapide|algorithmes?\s+de\s+tri"),
-    ("algorithmes gloutons", r"\bglouton(s)?\b"),
-    ("programmation dynamique", r"\bprogrammation\s+dynamique\b"),
-    ("réseaux", r"r[eé]seaux?|adressage\s+ip|cidr|routeurs?|routage|ospf|rip|protocoles?\s+r[eé]seau"),
-    ("processus", r"\bprocessus\b|ordonnancement|interblocage"),
-    ("systèmes d’exploitation", r"syst[eè]mes?\s+d['’]exploitation|linux|unix|ligne\s+de\s+commande"),
-    ("sécurité / crypto", r"cryptographie|s[eé]curisation|s[eé]curit[eé]\s+des\s+communications"),
-    ("huffman", r"\bhuffman\b|compression"),
-    ("décidabilité", r"d[eé]cidabilit[eé]"),
-]
+# Téléchargements : pool de connexions partagé + concurrence bornée
+MAX_WORKERS = 8
+HOST_DELAY = 0.2          # délai minimal (s) entre deux requêtes vers un même hôte
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5        # 0.5s, 1s, 2s, 4s...
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Manifeste de crawl : validateurs HTTP + taille + hash par page et par PDF
+MANIFEST_PATH = os.path.join(OUT_DIR, "crawl_manifest.json")
+
+# À incrémenter quand parse_page (ou le découpage des thèmes dans topics.py)
+# change : les pages déjà vues sont alors reparsées même si le HTML est identique
+PARSER_VERSION = 1
+PARSE_VERSION = f"{PARSER_VERSION}-{RULES_VERSION}"
+
+# Store adressé par contenu : blobs/<2 car.>/<sha256>.pdf ; les chemins
+# NSI/<année>/<session>/<code>/... sont des hard links vers ces blobs
+BLOB_DIR = os.path.join(OUT_DIR, "blobs")
 
 SESSION_KEYWORDS = [
     "Métropole", "Asie", "Amérique Nord", "Amérique Sud",
     "Polynésie", "Centre Etrangers", "Asie Pacifique"
 ]
 
+# Motifs utilisés à chaque ligne du tableau (compilés une fois)
+YEAR_URL_RE = re.compile(r"annales-nsi-(20\d{2})")
+YEAR_RE = re.compile(r"(20\d{2})")
+SUBJECT_LABEL_RE = re.compile(r"Sujet\s*([0-9]+[A-Z]?)", re.I)
+CODE_RE = re.compile(r"\b\d{2}-NSI[A-Z0-9]+\b")
+DAY_RE = re.compile(r"\b\d{1,2}\b")
+EXERCISE_RE = re.compile(r"Exercice\s*(\d+)\s*\[(\d+)\s*points?\]\s*:\s*(.*)", re.I)
+
 def safe_name(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     s = re.sub(r"[^\w\-.() ]+", "_", s)
@@ -84,127 +75,497 @@ def rel_from_downloads(abs_path: str) -> str:
     rel = os.path.relpath(abs_p, abs_out)
     return rel.replace("\\", "/")
 
-def download(url: str, dest_path: str):
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    if os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
-        return
-    with requests.get(url, headers=UA, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        with open(dest_path, "wb") as f:
+class HostRateLimiter:
+    """
+    Espace les requêtes vers un même hôte d'au moins `delay` secondes,
+    quel que soit le nombre de threads (remplace le time.sleep global).
+    """
+    def __init__(self, delay: float = HOST_DELAY):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def make_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """Session partagée (keep-alive) avec un pool dimensionné pour les workers."""
+    s = requests.Session()
+    s.headers.update(UA)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def retry_after_seconds(value):
+    """Délai demandé par un en-tête Retry-After (secondes ou date HTTP), None s'il est absent ou illisible."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def fetch(session: requests.Session, url: str, limiter: HostRateLimiter = None, **kwargs):
+    """
+    GET avec rate limit par hôte et retries (backoff exponentiel) sur les
+    erreurs réseau et les statuts transitoires (429, 5xx). Un Retry-After
+    (secondes ou date HTTP) remplace le backoff s'il demande plus longtemps.
+    """
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.wait(url)
+        delay = BACKOFF_BASE * (2 ** attempt)
+        try:
+            r = session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= MAX_RETRIES:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUS or attempt >= MAX_RETRIES:
+                r.raise_for_status()
+                return r
+            retry_after = retry_after_seconds(r.headers.get("Retry-After"))
+            r.close()
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        time.sleep(delay)
+        attempt += 1
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> dict:
+    """
+    {"pages": {url: entry}, "urls": {url: entry}, "files": {chemin relatif: entry}}
+    avec entry = {"url", "etag", "last_modified", "size", "sha256"}
+    (+ "parser" = PARSE_VERSION pour les pages)
+    ("files" sert d'index chemin local -> blob)
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("pages", {})
+    data.setdefault("urls", {})
+    data.setdefault("files", {})
+    return data
+
+
+def write_json_if_changed(path: str, data, **dump_kwargs) -> bool:
+    """Écrit `data` (via un fichier temporaire + rename) seulement si le contenu change."""
+    text = json.dumps(data, ensure_ascii=False, **dump_kwargs)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return True
+
+
+def http_validators(r) -> dict:
+    return {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+
+
+def conditional_headers(entry) -> dict:
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def looks_like_pdf(path: str) -> bool:
+    """Contrôle rapide : en-tête %PDF- et marqueur %%EOF dans la fin du fichier."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(5)
+            f.seek(max(0, size - 1024))
+            tail = f.read()
+    except OSError:
+        return False
+    return head == b"%PDF-" and b"%%EOF" in tail
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _transfer(session, url, limiter, part_path: str, headers: dict):
+    """
+    Un essai de transfert vers `part_path`, en reprenant avec un Range si un
+    fichier partiel existe (If-Range : le serveur renvoie tout si la version a changé).
+    Retourne (réponse, taille totale attendue ou None) ; None si 304.
+    """
+    meta_path = part_path + ".json"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    meta = _read_json(meta_path) if offset else {}
+    validator = meta.get("etag") or meta.get("last_modified")
+    if offset and meta.get("url") == url and validator:
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+    else:
+        offset = 0
+
+    with fetch(session, url, limiter, stream=True, timeout=60, headers=headers) as r:
+        if r.status_code == 304:
+            return r, None
+
+        expected = None
+        if r.status_code == 206:
+            m = re.match(r"bytes (\d+)-\d+/(\d+|\*)", r.headers.get("Content-Range", ""))
+            if not m or int(m.group(1)) != offset:
+                raise ValueError(f"Content-Range inattendu: {r.headers.get('Content-Range')}")
+            if m.group(2) != "*":
+                expected = int(m.group(2))
+            mode = "ab"
+        else:
+            offset = 0
+            mode = "wb"
+        if expected is None and r.headers.get("Content-Length", "").isdigit() and "Content-Encoding" not in r.headers:
+            expected = offset + int(r.headers["Content-Length"])
+
+        # validateurs de la version en cours, pour pouvoir reprendre plus tard
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, **http_validators(r)}, f)
+
+        with open(part_path, mode) as f:
             for chunk in r.iter_content(chunk_size=1024 * 256):
                 if chunk:
                     f.write(chunk)
+    return r, expected
 
-def norm_topic(t: str) -> str:
-    t0 = t.strip().lower()
-    t0 = t0.replace("é","e").replace("è","e").replace("ê","e").replace("à","a").replace("ï","i").replace("î","i").replace("ô","o").replace("ù","u").replace("ç","c")
-    t0 = re.sub(r"[()]", "", t0)
-    t0 = re.sub(r"\s+", " ", t0).strip()
-    return TOPIC_ALIASES.get(t0, t.strip().lower())
 
+def download(url: str, dest_path: str, session: requests.Session = None, limiter: HostRateLimiter = None, known: dict = None):
+    """
+    Télécharge `url` vers `dest_path` avec une requête conditionnelle si le
+    fichier local correspond à l'entrée `known` du manifeste.
+    Le transfert se fait dans `dest_path + ".part"` (repris via Range après une
+    coupure), puis est vérifié (taille, trailer PDF) et renommé atomiquement.
+    Retourne ("downloaded" | "unchanged", nouvelle entrée du manifeste).
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    is_pdf = dest_path.lower().endswith(".pdf")
+    part_path = dest_path + ".part"
+    known = dict(known or {})
+    headers = {}
+    local_size = os.path.getsize(dest_path) if os.path.exists(dest_path) else 0
+    if local_size > 0 and is_pdf and not looks_like_pdf(dest_path):
+        local_size = 0  # PDF tronqué d'un ancien run : on le retélécharge
+    if local_size > 0:
+        if known.get("url") == url and known.get("size") == local_size:
+            headers = conditional_headers(known)
+        else:
+            # fichier présent mais absent du manifeste : on compare à sa date locale
+            headers = {"If-Modified-Since": formatdate(os.path.getmtime(dest_path), usegmt=True)}
+
+    session = session or make_session(1)
+    attempt = 0
+    while True:
+        try:
+            r, expected = _transfer(session, url, limiter, part_path, headers)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, requests.HTTPError) as e:
+            # coupure en cours de transfert : le .part est conservé et repris
+            if attempt >= MAX_RETRIES:
+                raise
+            if isinstance(e, requests.HTTPError):
+                if e.response is None or e.response.status_code != 416:
+                    raise
+                os.remove(part_path)  # Range refusé : on repart de zéro
+            time.sleep(BACKOFF_BASE * (2 ** attempt))
+            attempt += 1
+
+    if r.status_code == 304:
+        entry = {"url": url, "etag": known.get("etag"), "last_modified": known.get("last_modified")}
+        entry.update({k: v for k, v in http_validators(r).items() if v})
+        if known.get("url") == url and known.get("size") == local_size and known.get("sha256"):
+            entry.update(size=local_size, sha256=known["sha256"])
+        else:
+            entry.update(size=local_size, sha256=file_sha256(dest_path))
+        return "unchanged", entry
+
+    size = os.path.getsize(part_path)
+    problem = None
+    if expected is not None and size != expected:
+        problem = f"taille {size} != {expected} attendus"
+    elif is_pdf and not looks_like_pdf(part_path):
+        problem = "PDF invalide (en-tête ou %%EOF manquant)"
+    digest = file_sha256(part_path)
+    validators = http_validators(r)
+    if not problem and known.get("etag") and known.get("etag") == validators["etag"] \
+            and known.get("size") == size and known.get("sha256") not in (None, digest):
+        problem = "hash différent pour un même ETag"
+    if problem:
+        os.remove(part_path)
+        os.remove(part_path + ".json")
+        raise ValueError(f"{url}: {problem}")
+
+    os.replace(part_path, dest_path)
+    os.remove(part_path + ".json")
+    return "downloaded", {"url": url, **validators, "size": size, "sha256": digest}
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], f"{sha256}.pdf")
+
+
+def url_cache_path(url: str) -> str:
+    """Copie de travail d'une URL (hard link vers son blob), base des requêtes conditionnelles."""
+    return os.path.join(BLOB_DIR, "url", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".pdf")
+
+
+def link_or_copy(src: str, dest: str):
+    """Fait pointer `dest` sur le contenu de `src` (hard link, sinon copie), atomiquement."""
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    # nom propre au thread : deux workers peuvent viser la même destination
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.link"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
 
-def clean_theme_text(s: str) -> str:
-    s = (s or "").strip()
-
-    # Enlever parenthèses d'annotations (1re), (Tle), etc.
-    s = re.sub(r"\([^)]*\)", " ", s)
 
-    # Enlever les tournures "Cet exercice porte sur ..."
-    s = re.sub(r"^cet exercice (porte sur|traite de|concerne)\s+", "", s, flags=re.I)
+def download_to_store(url: str, dests, session: requests.Session = None, limiter: HostRateLimiter = None, known: dict = None):
+    """
+    Télécharge `url` une seule fois dans le store, puis fait pointer chaque
+    chemin de `dests` sur le blob correspondant.
+    Retourne (statut, entrée du manifeste) comme download().
+    """
+    cache = url_cache_path(url)
+    if not os.path.exists(cache):
+        # reprise d'un ancien layout : une copie locale valide évite de tout retélécharger
+        for d in dests:
+            if os.path.exists(d) and looks_like_pdf(d):
+                link_or_copy(d, cache)
+                break
 
-    # Nettoyage ponctuation/espaces
-    s = s.replace("POO", "programmation orientée objet")
-    s = s.replace("BDD", "bases de données")
-    s = re.sub(r"\s+", " ", s).strip(" .:-\n\t")
-    return s
+    status, entry = download(url, cache, session, limiter, known)
 
+    blob = blob_path(entry["sha256"])
+    if os.path.exists(blob):
+        link_or_copy(blob, cache)
+    else:
+        link_or_copy(cache, blob)
+    for d in dests:
+        link_or_copy(blob, d)
+    return status, entry
 
-def split_topics(raw: str):
-    s = clean_theme_text(raw).lower()
 
-    found = []
-    for canon, pat in TOPIC_PATTERNS:
-        if re.search(pat, s, flags=re.I):
-            found.append(canon)
+def prune_blobs(manifest: dict) -> int:
+    """
+    Supprime les blobs qui ne sont plus référencés par aucune URL du manifeste,
+    ainsi que les copies de travail (blobs/url/) des URL qui n'y sont plus.
+    """
+    alive = {e.get("sha256") for e in manifest["urls"].values()}
+    alive_urls = {os.path.basename(url_cache_path(url)) for url in manifest["urls"]}
+    removed = 0
+    for root, dirs, files in os.walk(BLOB_DIR):
+        in_url_dir = os.path.basename(root) == "url"
+        for name in files:
+            if not name.endswith(".pdf"):
+                continue
+            if (name not in alive_urls) if in_url_dir else (name[:-4] not in alive):
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
 
-    # fallback si rien trouvé : découpage soft (mais propre)
-    if not found:
-        parts = re.split(r",|;|/|\bet\b", clean_theme_text(raw), flags=re.I)
-        for p in parts:
-            p = p.strip(" .:-\n\t")
-            if len(p) >= 3:
-                found.append(norm_topic(p))
 
-    # dédoublonnage en gardant l’ordre
-    seen = set()
+def download_all(downloads, workers: int = MAX_WORKERS, session: requests.Session = None, limiter: HostRateLimiter = None, manifest: dict = None):
+    """
+    Télécharge la liste [(url, dest), ...] avec au plus `workers` transferts
+    simultanés sur une session partagée.
+    Chaque URL n'est téléchargée qu'une fois (store adressé par contenu), les
+    destinations qui la partagent deviennent des hard links vers le même blob.
+    Si `manifest` est fourni, ses entrées "urls" servent aux requêtes
+    conditionnelles et ses entrées "urls"/"files" sont mises à jour.
+    Retourne [(url, dest, statut, erreur ou None), ...] dans l'ordre d'entrée.
+    """
+    session = session or make_session(workers)
+    limiter = limiter or HostRateLimiter()
+    manifest = manifest if manifest is not None else {"urls": {}, "files": {}}
+
+    # une même destination n'est téléchargée qu'une fois, une même URL aussi
+    todo = list(dict((dest, url) for url, dest in downloads).items())
+    dests_by_url = {}
+    for dest, url in todo:
+        dests_by_url.setdefault(url, []).append(dest)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(download_to_store, url, dests, session, limiter, manifest["urls"].get(url)): url
+            for url, dests in dests_by_url.items()
+        }
+        for fut in as_completed(futures):
+            url = futures[fut]
+            try:
+                status, entry = fut.result()
+                manifest["urls"][url] = entry
+                for dest in dests_by_url[url]:
+                    manifest["files"][rel_from_downloads(dest)] = {"url": url, "size": entry["size"], "sha256": entry["sha256"]}
+                    results[dest] = (status, None)
+            except Exception as e:
+                for dest in dests_by_url[url]:
+                    results[dest] = ("failed", e)
+    return [(url, dest, *results[dest]) for dest, url in todo]
+
+
+def print_download_summary(results):
+    counts = {}
+    for url, dest, status, err in results:
+        counts[status] = counts.get(status, 0) + 1
+        if err is not None:
+            print(f"[WARN] Download fail: {url} -> {err}")
+    print(
+        f"PDF: {counts.get('downloaded', 0)} téléchargé(s), {counts.get('unchanged', 0)} inchangé(s), "
+        f"{counts.get('failed', 0)} échec(s) sur {len(results)} fichier(s)."
+    )
+
+
+def subject_downloads(subject: dict):
+    """[(url, chemin local), ...] des PDF d'un sujet (sujet + corrigés)."""
     out = []
-    for t in found:
-        if t not in seen:
-            seen.add(t)
-            out.append(t)
+    if subject.get("pdf_subject_url") and subject.get("local_subject_file"):
+        out.append((subject["pdf_subject_url"], os.path.join(OUT_DIR, subject["local_subject_file"].replace("/", os.sep))))
+    for c in subject.get("corriges") or []:
+        if c["url"].lower().endswith(".pdf") and "local_file" in c:
+            # reconstruire chemin absolu depuis OUT_DIR + local_file
+            out.append((c["url"], os.path.join(OUT_DIR, c["local_file"].replace("/", os.sep))))
     return out
 
+
+def load_previous_results():
+    """
+    Résultats du crawl précédent, regroupés pour pouvoir réutiliser une page
+    inchangée : ({page: [sujets]}, {subject_id: [exercices]}).
+    """
+    by_page, by_subject = {}, {}
+    try:
+        with open(os.path.join(OUT_DIR, "subjects.json"), "r", encoding="utf-8") as f:
+            for subj in json.load(f):
+                by_page.setdefault(subj.get("page"), []).append(subj)
+        with open(os.path.join(OUT_DIR, "exercises.json"), "r", encoding="utf-8") as f:
+            for ex in json.load(f):
+                by_subject.setdefault(ex.get("subject_id"), []).append(ex)
+    except (OSError, ValueError):
+        return {}, {}
+    return by_page, by_subject
+
+
 def extract_year_from_page(url: str, soup: BeautifulSoup):
-    m = re.search(r"annales-nsi-(20\d{2})", url)
+    m = YEAR_URL_RE.search(url)
     if m:
         return int(m.group(1))
     h = soup.find(["h1","h2"])
     if h:
-        m2 = re.search(r"(20\d{2})", h.get_text(" ", strip=True))
+        m2 = YEAR_RE.search(h.get_text(" ", strip=True))
         if m2:
             return int(m2.group(1))
     return None
 
 def detect_session(text: str):
+    low = text.lower()
     for k in SESSION_KEYWORDS:
-        if k.lower() in text.lower():
+        if k.lower() in low:
             return k
     return None
 
 def detect_subject_label(text: str):
-    m = re.search(r"Sujet\s*([0-9]+[A-Z]?)", text, flags=re.I)
+    m = SUBJECT_LABEL_RE.search(text)
     return f"Sujet {m.group(1)}" if m else None
 
 def detect_code(text: str):
-    m = re.search(r"\b\d{2}-NSI[A-Z0-9]+\b", text)
+    m = CODE_RE.search(text)
     return m.group(0) if m else None
 
+@lru_cache(maxsize=None)
+def _default_date(year: int):
+    return parse_date(f"01/01/{year}", dayfirst=True)
+
 def detect_date(text: str, year: int):
+    # pas de jour dans le texte : inutile de lancer le parseur de dates
+    if not DAY_RE.search(text):
+        return None
     try:
-        dt = parse_date(text, dayfirst=True, fuzzy=True, default=parse_date(f"01/01/{year}", dayfirst=True))
-        if re.search(r"\b\d{1,2}\b", text):
-            return dt.date().isoformat()
+        return parse_date(text, dayfirst=True, fuzzy=True, default=_default_date(year)).date().isoformat()
     except Exception:
-        pass
-    return None
+        return None
 
 def find_main_table(soup: BeautifulSoup):
+    """
+    Un seul parcours des <table> : la première dont la légende contient
+    "epreuves ecrites" gagne, sinon la première dont les premières cellules
+    mentionnent "sujet" et "corrig".
+    """
+    fallback = None
     for table in soup.find_all("table"):
         cap = table.find("caption")
         if cap and "epreuves ecrites" in cap.get_text(" ", strip=True).lower():
             return table
-    for table in soup.find_all("table"):
-        ths = [x.get_text(" ", strip=True).lower() for x in table.find_all(["th","td"], limit=10)]
-        if any("sujet" in t for t in ths) and any("corrig" in t for t in ths):
-            return table
-    return None
+        if fallback is None:
+            ths = [x.get_text(" ", strip=True).lower() for x in table.find_all(["th","td"], limit=10)]
+            if any("sujet" in t for t in ths) and any("corrig" in t for t in ths):
+                fallback = table
+    return fallback
 
-subjects = []
-exercises = []
-downloads = []
 
-for page_url in PAGES:
-    r = requests.get(page_url, headers=UA, timeout=30)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+def parse_page(page_url: str, html: str, parser: str = None):
+    """
+    Extrait (sujets, exercices) d'une page d'annales déjà téléchargée.
+    Fonction pure : utilisable sur des fixtures HTML enregistrées.
+    """
+    soup = BeautifulSoup(html, parser or HTML_PARSER)
+    subjects = []
+    exercises = []
 
     year = extract_year_from_page(page_url, soup)
     table = find_main_table(soup)
     if not table:
         print(f"[WARN] Table non trouvée: {page_url}")
-        continue
+        return subjects, exercises
 
-    rows = table.find("tbody").find_all("tr", recursive=False) if table.find("tbody") else table.find_all("tr", recursive=False)
+    tbody = table.find("tbody")
+    rows = tbody.find_all("tr", recursive=False) if tbody else table.find_all("tr", recursive=False)
     for tr in rows:
         tds = tr.find_all("td", recursive=False)
         if len(tds) < 2:
@@ -273,7 +634,7 @@ for page_url in PAGES:
         lis = contenu_td.find_all("li")
         for li in lis:
             txt = li.get_text(" ", strip=True)
-            m = re.search(r"Exercice\s*(\d+)\s*\[(\d+)\s*points?\]\s*:\s*(.*)", txt, flags=re.I)
+            m = EXERCISE_RE.search(txt)
             if not m:
                 continue
             ex_num = int(m.group(1))
@@ -297,29 +658,87 @@ for page_url in PAGES:
                 "corriges": corriges                      # contient local_file si PDF
             })
 
-        # téléchargement (cohérent avec les chemins écrits)
-        if year and pdf_subject_url and local_subject_abs:
-            downloads.append((pdf_subject_url, local_subject_abs))
-        for c in corriges:
-            if c["url"].lower().endswith(".pdf") and "local_file" in c:
-                # reconstruire chemin absolu depuis OUT_DIR + local_file
-                downloads.append((c["url"], os.path.join(OUT_DIR, c["local_file"].replace("/", os.sep))))
-
-# Écriture JSON
-os.makedirs(OUT_DIR, exist_ok=True)
-with open(os.path.join(OUT_DIR, "subjects.json"), "w", encoding="utf-8") as f:
-    json.dump(subjects, f, ensure_ascii=False, indent=2)
+    return subjects, exercises
 
-with open(os.path.join(OUT_DIR, "exercises.json"), "w", encoding="utf-8") as f:
-    json.dump(exercises, f, ensure_ascii=False, indent=2)
-
-# Download PDFs
-for (url, dest) in downloads:
-    try:
-        download(url, dest)
-        time.sleep(0.2)
-    except Exception as e:
-        print(f"[WARN] Download fail: {url} -> {e}")
 
-print(f"OK: {len(subjects)} sujets, {len(exercises)} exercices.")
-print(f"JSON: {OUT_DIR}/subjects.json et {OUT_DIR}/exercises.json")
+def _scrape_page(page_url: str, session, limiter, known: dict, previous):
+    """
+    Télécharge (conditionnellement) et parse une page.
+    Retourne (sujets, exercices, entrée du manifeste ou None si inchangée).
+    """
+    prev_by_page, prev_by_subject = previous
+    # résultats réutilisables seulement s'ils viennent du même parseur / des mêmes règles
+    cached = page_url in prev_by_page and known.get("parser") == PARSE_VERSION
+    r = fetch(session, page_url, limiter, timeout=30, headers=conditional_headers(known) if cached else {})
+    entry = None
+    if r.status_code != 304:
+        digest = hashlib.sha256(r.content).hexdigest()
+        entry = {"url": page_url, **http_validators(r), "size": len(r.content), "sha256": digest,
+                 "parser": PARSE_VERSION}
+
+    # page inchangée : on reprend les sujets/exercices du crawl précédent
+    if r.status_code == 304 or (cached and entry["sha256"] == known.get("sha256")):
+        print(f"[=] Page inchangée: {page_url}")
+        subjects = prev_by_page[page_url]
+        exercises = [ex for subj in subjects for ex in prev_by_subject.get(subj["id"], [])]
+        return subjects, exercises, entry
+
+    subjects, exercises = parse_page(page_url, r.text)
+    return subjects, exercises, entry
+
+
+def scrape(pages=PAGES, session: requests.Session = None, limiter: HostRateLimiter = None, manifest: dict = None, previous=None, workers: int = None):
+    """
+    Récupère et parse les pages d'annales en parallèle.
+    `manifest` (optionnel) active les requêtes conditionnelles et est mis à
+    jour ; `previous` = load_previous_results() pour réutiliser les pages
+    inchangées.
+    Retourne (sujets, exercices) dans l'ordre de `pages`.
+    """
+    session = session or make_session()
+    limiter = limiter or HostRateLimiter()
+    previous = previous or ({}, {})
+    known_pages = manifest["pages"] if manifest is not None else {}
+
+    with ThreadPoolExecutor(max_workers=workers or min(MAX_WORKERS, len(pages) or 1)) as pool:
+        futures = [
+            pool.submit(_scrape_page, url, session, limiter, known_pages.get(url) or {}, previous)
+            for url in pages
+        ]
+        results = [f.result() for f in futures]
+
+    subjects = []
+    exercises = []
+    for page_url, (subj, exs, entry) in zip(pages, results):
+        subjects.extend(subj)
+        exercises.extend(exs)
+        if entry is not None and manifest is not None:
+            manifest["pages"][page_url] = entry
+    return subjects, exercises
+
+
+def main():
+    http = make_session()
+    limiter = HostRateLimiter()
+    manifest = load_manifest()
+
+    subjects, exercises = scrape(PAGES, http, limiter, manifest, load_previous_results())
+
+    # Écriture JSON (seulement si le contenu a changé)
+    write_json_if_changed(os.path.join(OUT_DIR, "subjects.json"), subjects, indent=2)
+    write_json_if_changed(os.path.join(OUT_DIR, "exercises.json"), exercises, indent=2)
+
+    # Download PDFs (téléchargement cohérent avec les chemins écrits)
+    downloads = [d for subj in subjects for d in subject_downloads(subj)]
+    manifest["urls"] = {u: e for u, e in manifest["urls"].items() if u in {url for url, _ in downloads}}
+    manifest["files"] = {p: e for p, e in manifest["files"].items() if p in {rel_from_downloads(d) for _, d in downloads}}
+    print_download_summary(download_all(downloads, session=http, limiter=limiter, manifest=manifest))
+    print(f"Blobs: {len(set(e['sha256'] for e in manifest['urls'].values()))} PDF unique(s), {prune_blobs(manifest)} orphelin(s) supprimé(s).")
+    write_json_if_changed(MANIFEST_PATH, manifest, indent=1, sort_keys=True)
+
+    print(f"OK: {len(subjects)} sujets, {len(exercises)} exercices.")
+    print(f"JSON: {OUT_DIR}/subjects.json et {OUT_DIR}/exercises.json")
+
+
+if __name__ == "__main__":
+    main()
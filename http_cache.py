@@ -0,0 +1,97 @@
+"""
+Réponses cachables pour /data et /pdf.
+
+- les JSON de /data sont servis minifiés, avec des variantes gzip (et brotli
+  si le module est installé) calculées une fois par version du fichier ;
+- chaque représentation a un ETag fort (empreinte du contenu), ce qui permet
+  les 304 et les Range (If-Range) ;
+- une URL suffixée de ?v=<empreinte> est adressée par contenu : elle peut
+  être gardée indéfiniment par le navigateur.
+"""
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from cache import LRUCache
+
+try:
+    import brotli  # optionnel
+except ImportError:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_VARIANTS = LRUCache(maxsize=32)   # (chemin, signature) -> Precompressed
+_DIGESTS = LRUCache(maxsize=4096)  # (chemin, signature) -> sha256
+CACHES = {"precompressed": _VARIANTS, "file_digest": _DIGESTS}  # exposés dans /metrics
+
+
+def file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class Precompressed:
+    """Corps minifié + variantes compressées d'un fichier, avec leur ETag."""
+
+    def __init__(self, body: bytes):
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies: Dict[str, bytes] = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        # ETag fort : une représentation (encodage) = une valeur
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+    def choose(self, accept_encodings) -> str:
+        """Meilleur encodage accepté (werkzeug Accept), brotli d'abord."""
+        for enc in ("br", "gzip"):
+            if enc in self.bodies and accept_encodings[enc] > 0:
+                return enc
+        return "identity"
+
+
+def _minify(path: str, raw: bytes) -> bytes:
+    if not path.endswith(".json"):
+        return raw
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except ValueError:
+        return raw
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def precompressed(path: str) -> Optional[Precompressed]:
+    """Variantes de `path`, recalculées seulement quand le fichier change."""
+    key = (path, file_signature(path))
+    if key[1] is None:
+        return None
+    variants = _VARIANTS.get(key)
+    if variants is None:
+        with open(path, "rb") as f:
+            variants = Precompressed(_minify(path, f.read()))
+        _VARIANTS.put(key, variants)
+    return variants
+
+
+def file_digest(path: str) -> Optional[str]:
+    """sha256 du fichier, mémorisé tant que le fichier ne change pas."""
+    key = (path, file_signature(path))
+    if key[1] is None:
+        return None
+    digest = _DIGESTS.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _DIGESTS.put(key, digest)
+    return digest
@@ -0,0 +1,219 @@
+"""
+Métriques du serveur au format texte Prometheus (sans dépendance).
+
+- Counter / Histogram : séries étiquetées, protégées par un verrou ;
+- PhaseTimer : découpe le traitement d'une requête en phases (filtrage,
+  score, complétion, sérialisation...) ; chaque phase alimente un
+  histogramme et est gardée pour l'en-tête Server-Timing ;
+- SlowProfiler : profilage (cProfile) des requêtes, activable à chaud ; seuls
+  les profils des requêtes plus lentes que le seuil sont conservés.
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name, self.help = name, help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # labels -> [comptes par seau (non cumulés)..., somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        for labels, s in items:
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s):
+                acc += n
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {s[-1]}")
+        return out
+
+
+class Gauge:
+    """Valeurs lues au moment de l'export : fn() -> {(étiquettes...): valeur}."""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str], fn: Callable[[], Dict[Tuple, float]],
+                 kind: str = "gauge"):
+        self.name, self.help = name, help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self.fn().items())]
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics:
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+
+# ---------- Phases d'une requête ----------
+
+_current = threading.local()  # route et phases de la requête en cours (par thread)
+
+
+def start_request(route: str):
+    _current.route = route
+    _current.phases = []
+
+
+def end_request() -> List[Tuple[str, float]]:
+    phases = getattr(_current, "phases", None) or []
+    _current.route = _current.phases = None
+    return phases
+
+
+class PhaseTimer:
+    """
+    timer.lap("filtre") mesure le temps écoulé depuis le lap précédent (ou
+    la création). Hors requête (script, processus du pool), la route vaut "-".
+    """
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.histogram.observe(elapsed, getattr(_current, "route", None) or "-", phase)
+        phases = getattr(_current, "phases", None)
+        if phases is not None:
+            phases.append((phase, elapsed))
+
+
+def server_timing(phases: List[Tuple[str, float]]) -> str:
+    """Valeur de l'en-tête Server-Timing (durées en ms, phases de même nom cumulées)."""
+    total: Dict[str, float] = {}
+    for name, dt in phases:
+        total[name] = total.get(name, 0.0) + dt
+    return ", ".join(f"{name};dur={dt * 1000:.2f}" for name, dt in total.items())
+
+
+# ---------- Profilage des requêtes lentes ----------
+
+class SlowProfiler:
+    """
+    Désactivé par défaut. configure(slow_ms=..., sample=...) l'active à chaud :
+    une fraction `sample` des requêtes est profilée (une à la fois, le
+    profilage ralentit la requête), et le profil est gardé si la requête a
+    duré au moins `slow_ms`.
+    """
+
+    def __init__(self, keep: int = 20, top: int = 30):
+        self.slow_ms: Optional[float] = None
+        self.sample = 1.0
+        self.top = top
+        self.profiles = deque(maxlen=keep)
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms is not None
+
+    def configure(self, slow_ms: Optional[float], sample: float = 1.0):
+        self.slow_ms = None if slow_ms is None else max(0.0, float(slow_ms))
+        self.sample = max(0.0, min(1.0, float(sample)))
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self.enabled or random.random() >= self.sample or not self._busy.acquire(blocking=False):
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # autre profileur actif
+            self._busy.release()
+            return None
+        return prof
+
+    def stop(self, prof: cProfile.Profile, route: str, method: str, elapsed: float):
+        prof.disable()
+        self._busy.release()
+        if self.slow_ms is None or elapsed * 1000 < self.slow_ms:
+            return
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(self.top)
+        self.profiles.append({
+            "route": route, "method": method, "ms": round(elapsed * 1000, 2),
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stats": buf.getvalue(),
+        })
+        print(f"[metrics] requête lente {method} {route} : {elapsed * 1000:.0f} ms (profil conservé)")
+
+    def state(self) -> dict:
+        return {"slow_ms": self.slow_ms, "sample": self.sample, "profiles": list(self.profiles)}
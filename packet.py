@@ -0,0 +1,129 @@
+"""
+Assemblage d'un "paquet" pour une combinaison d'exercices générée :
+- ZIP : sujets (pages de l'exercice seulement quand elles sont connues) +
+  corrigés locaux + summary.json, écrit au fil de l'eau ;
+- PDF : les mêmes PDF fusionnés en un seul fichier (module optionnel pypdf).
+
+Rien n'est construit en mémoire : le ZIP est produit morceau par morceau
+pendant l'envoi, le PDF fusionné passe par un fichier temporaire.
+"""
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from typing import Iterable, Iterator, List, Tuple
+
+try:
+    from pypdf import PdfReader, PdfWriter  # optionnel : seulement pour le format PDF
+except ImportError:
+    PdfReader = PdfWriter = None
+
+CHUNK_SIZE = 64 * 1024
+
+_UNSAFE_RE = re.compile(r'[\\/:*?"<>|]+')
+
+
+def _safe_name(s) -> str:
+    return _UNSAFE_RE.sub("_", str(s)).strip() or "fichier"
+
+
+def packet_entries(exercises: List[dict], subject_file, corrige_file, include_corriges=True, prefix="") -> List[Tuple[str, str]]:
+    """
+    [(nom dans l'archive, chemin local)] pour une combinaison.
+    `subject_file(ex)` / `corrige_file(c)` renvoient le chemin local à
+    utiliser, ou une fonction qui ouvre le fichier au moment de l'écrire
+    (None si le fichier n'est pas disponible).
+    """
+    entries = []
+    seen = set()
+    for n, ex in enumerate(exercises, start=1):
+        folder = f"{prefix}{n:02d} - {_safe_name(ex.get('code') or ex.get('subject_id'))} ex{ex.get('exercise')}"
+        path = subject_file(ex)
+        if path:
+            entries.append((f"{folder}/sujet.pdf", path))
+        if not include_corriges:
+            continue
+        for c in ex.get("corriges") or []:
+            path = corrige_file(c)
+            if not path:
+                continue
+            name = f"{folder}/corrigé - {_safe_name(c.get('label'))}.pdf"
+            if name not in seen:
+                seen.add(name)
+                entries.append((name, path))
+    return entries
+
+
+class _Sink(io.RawIOBase):
+    """Flux non positionnable : zipfile écrit dedans, on vide au fur et à mesure."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _open(path):
+    """Chemin ou fonction d'ouverture (extrait du cache) : fichier binaire à fermer."""
+    return open(path, "rb") if isinstance(path, str) else path()
+
+
+def stream_zip(entries: Iterable[Tuple[str, str]], summary: dict) -> Iterator[bytes]:
+    """
+    ZIP produit morceau par morceau (PDF stockés sans recompression : ils
+    sont déjà compressés). La mémoire utilisée ne dépend pas de la taille
+    de l'archive.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr("summary.json", json.dumps(summary, ensure_ascii=False, indent=2),
+                    compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+        for arcname, path in entries:
+            with _open(path) as src, zf.open(arcname, "w") as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    dst.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()  # répertoire central
+
+
+def merged_pdf(paths: List[str]):
+    """PDF unique (fichier temporaire ouvert, positionné au début)."""
+    writer = PdfWriter()
+    sources = []
+    try:
+        for path in paths:
+            sources.append(_open(path))
+            writer.append(PdfReader(sources[-1]))
+        out = tempfile.TemporaryFile()
+        writer.write(out)
+        writer.close()
+    finally:
+        for src in sources:
+            src.close()
+    out.seek(0)
+    return out
+
+
+def stream_file(f) -> Iterator[bytes]:
+    try:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            yield chunk
+    finally:
+        f.close()
+
+
+def file_size(f) -> int:
+    return os.fstat(f.fileno()).st_size
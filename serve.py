@@ -0,0 +1,85 @@
+"""
+Serveur de production (app.py lancé directement reste le serveur de
+développement, avec rechargement automatique) :
+
+    python serve.py                         # waitress s'il est installé, sinon gunicorn
+    NSIBAC_SERVER=gunicorn python serve.py
+
+- waitress (pip install waitress ; Windows, Linux, macOS) : un processus,
+  NSIBAC_THREADS threads. Les PDF passent par wsgi.file_wrapper et sont
+  envoyés par la boucle d'entrées-sorties de waitress : le thread de la
+  requête est rendu dès les en-têtes, un afflux d'ouvertures de sujets ne
+  bloque pas /api/generate. La génération longue (mode optimal, gros corpus,
+  lots) part dans NSIBAC_GENERATE_PROCESSES processus (défaut : 2).
+- gunicorn (pip install gunicorn ; Linux, macOS) : NSIBAC_WORKERS processus
+  de NSIBAC_THREADS threads (gthread), PDF envoyés par sendfile(2).
+
+Derrière nginx, NSIBAC_ACCEL_REDIRECT délègue l'envoi des PDF à nginx
+(voir le README). Adresse : NSIBAC_HOST (127.0.0.1), NSIBAC_PORT (8000).
+"""
+import os
+import sys
+
+HOST = os.environ.get("NSIBAC_HOST", "127.0.0.1")
+PORT = int(os.environ.get("NSIBAC_PORT", "8000"))
+THREADS = int(os.environ.get("NSIBAC_THREADS", "8"))
+WORKERS = int(os.environ.get("NSIBAC_WORKERS", str(min(4, os.cpu_count() or 1))))
+GENERATE_PROCESSES = min(2, os.cpu_count() or 1)
+
+
+def _load_app():
+    import app
+    app.DATASET.current()  # chargé avant la première requête
+    return app.app
+
+
+def run_waitress():
+    from waitress import serve
+
+    # un seul processus : la génération longue est confiée à un pool
+    os.environ.setdefault("NSIBAC_GENERATE_PROCESSES", str(GENERATE_PROCESSES))
+    print(f"waitress : http://{HOST}:{PORT} ({THREADS} threads)")
+    serve(_load_app(), host=HOST, port=PORT, threads=THREADS, ident="nsibac")
+
+
+def run_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": f"{HOST}:{PORT}",
+                "workers": WORKERS,
+                "threads": THREADS,
+                "worker_class": "gthread",
+                "sendfile": True,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # chaque processus charge son jeu de données (l'instantané binaire
+            # est projeté en mémoire : ses pages sont partagées entre processus)
+            return _load_app()
+
+    Server().run()
+
+
+def main():
+    server = os.environ.get("NSIBAC_SERVER", "auto")
+    if server == "auto":
+        try:
+            import waitress  # noqa: F401
+            server = "waitress"
+        except ImportError:
+            server = "gunicorn"
+    run = {"waitress": run_waitress, "gunicorn": run_gunicorn}.get(server)
+    if run is None:
+        sys.exit(f"NSIBAC_SERVER doit valoir waitress, gunicorn ou auto (reçu : {server}).")
+    try:
+        run()
+    except ImportError as e:
+        sys.exit(f"{e.name} n'est pas installé : pip install waitress (ou gunicorn sous Linux/macOS).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Instantané binaire compact de exercises_standardises.json, écrit par la
+standardisation (annales.py) à côté du JSON.
+
+Format (petit-boutiste) : b"NSIBSNP1", longueur (uint32) et en-tête JSON,
+puis des sections alignées sur 8 octets :
+- table de chaînes internées (un blob UTF-8 + offsets) : ids, sessions,
+  codes, URL, thèmes... n'y figurent qu'une fois ;
+- une colonne par champ (array uint32 d'ids de chaîne ou int32) ;
+- thèmes : offsets par exercice + ids de chaîne ;
+- corrigés : table partagée (label, url, fichier) et groupes de corrigés,
+  chaque exercice pointant vers un groupe ;
+- texte normalisé de la recherche (voir exercise_index.py), déjà concaténé.
+
+Le fichier est ouvert en mmap : rien n'est décodé au chargement, chaque
+exercice est reconstruit (au format JSON habituel) quand on le lit. L'index
+est construit depuis les colonnes (index_rows) sans reconstruire les
+exercices.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterator, List, Optional, Set
+
+from cache import LRUCache
+from exercise_index import _SEP, _haystack
+
+MAGIC = b"NSIBSNP1"
+FORMAT = 2
+SNAPSHOT_FILE = "exercises_standardises.snapshot"
+
+NONE = 0xFFFFFFFF      # chaîne absente
+NO_INT = -(2 ** 31)    # entier absent
+
+# champs des enregistrements, dans l'ordre du JSON
+STR_FIELDS = ["id", "subject_id", "session", "subject_label", "code", "raw", "pdf_subject_url", "local_subject_file"]
+INT_FIELDS = ["year", "exercise", "points"]
+FIELDS = ["id", "subject_id", "year", "session", "subject_label", "code", "exercise", "points",
+          "topics", "raw", "pdf_subject_url", "local_subject_file", "corriges", "pages"]
+CORRIGE_FIELDS = ("label", "url", "local_file")
+
+RECORD_CACHE = 4096
+
+
+def snapshot_path(json_path: str) -> str:
+    return os.path.join(os.path.dirname(json_path), SNAPSHOT_FILE)
+
+
+def write_snapshot(records: List[dict], path: str, version: str, source_path: Optional[str] = None):
+    """
+    Écrit l'instantané de `records` (remplacement atomique). `source_path` :
+    le JSON d'origine, dont la taille et la date sont notées pour détecter
+    un instantané périmé. ValueError si un enregistrement a un champ inconnu.
+    """
+    strings = {}
+    blob = bytearray()
+    str_offsets = array("I", [0])
+
+    def sid(s) -> int:
+        if s is None:
+            return NONE
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(str_offsets) - 1
+            blob.extend(s.encode("utf-8"))
+            str_offsets.append(len(blob))
+        return i
+
+    def num(v) -> int:
+        return NO_INT if v is None else int(v)
+
+    cols = {f: array("I") for f in STR_FIELDS}
+    cols.update({f: array("i") for f in INT_FIELDS})
+    cols["page_first"], cols["page_last"] = array("i"), array("i")
+    topic_offsets, topic_refs = array("I", [0]), array("I")
+    corrige_ids, corrige_cols = {}, {f: array("I") for f in CORRIGE_FIELDS}
+    group_ids, group_offsets, group_refs = {}, array("I", [0]), array("I")
+    ex_group = array("I")
+    text, text_starts, offset = [], array("I"), 0
+
+    for ex in records:
+        unknown = set(ex) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"champ(s) non pris en charge par l'instantané : {', '.join(sorted(unknown))}")
+        for f in STR_FIELDS:
+            cols[f].append(sid(ex.get(f)))
+        for f in INT_FIELDS:
+            cols[f].append(num(ex.get(f)))
+        pages = ex.get("pages") or [None, None]
+        cols["page_first"].append(num(pages[0]))
+        cols["page_last"].append(num(pages[1]))
+
+        topic_refs.extend(sid(t) for t in ex.get("topics") or [])
+        topic_offsets.append(len(topic_refs))
+
+        refs = []
+        for c in ex.get("corriges") or []:
+            if set(c) - set(CORRIGE_FIELDS):
+                raise ValueError("champ de corrigé non pris en charge par l'instantané")
+            key = tuple(sid(c.get(f)) for f in CORRIGE_FIELDS)
+            cid = corrige_ids.get(key)
+            if cid is None:
+                cid = corrige_ids[key] = len(corrige_ids)
+                for f, v in zip(CORRIGE_FIELDS, key):
+                    corrige_cols[f].append(v)
+            refs.append(cid)
+        gid = group_ids.get(tuple(refs))
+        if gid is None:
+            gid = group_ids[tuple(refs)] = len(group_ids)
+            group_refs.extend(refs)
+            group_offsets.append(len(group_refs))
+        ex_group.append(gid)
+
+        h = _haystack(ex)
+        text_starts.append(offset)
+        text.append(h)
+        offset += len(h) + len(_SEP)
+
+    sections = [("strings", array("B", bytes(blob))), ("string_offsets", str_offsets)]
+    sections += [(f"col_{f}", a) for f, a in cols.items()]
+    sections += [("topic_offsets", topic_offsets), ("topic_refs", topic_refs), ("ex_group", ex_group),
+                 ("group_offsets", group_offsets), ("group_refs", group_refs)]
+    sections += [(f"corrige_{f}", a) for f, a in corrige_cols.items()]
+    sections += [("text", array("B", _SEP.join(text).encode("utf-8"))), ("text_starts", text_starts)]
+
+    source = None
+    if source_path is not None:
+        st = os.stat(source_path)
+        source = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    # les offsets des sections dépendent de la taille de l'en-tête : on
+    # recommence jusqu'à ce que celle-ci ne bouge plus
+    header = b""
+    while True:
+        start = _align(len(MAGIC) + 4 + len(header))
+        layout, pos = {}, start
+        for name, a in sections:
+            layout[name] = [pos, len(a), a.typecode]
+            pos = _align(pos + len(a) * a.itemsize)
+        new = json.dumps({"format": FORMAT, "version": version, "count": len(records),
+                          "source": source, "sections": layout}).encode("utf-8")
+        new += b" " * (_align(len(MAGIC) + 4 + len(new)) - (len(MAGIC) + 4 + len(new)))
+        if len(new) == len(header):
+            header = new
+            break
+        header = new
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, a in sections:
+            f.write(b"\0" * (layout[name][0] - f.tell()))
+            if sys.byteorder != "little" and a.itemsize > 1:
+                a = array(a.typecode, a)
+                a.byteswap()
+            f.write(a.tobytes())
+    os.replace(tmp, path)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class Snapshot:
+    """Instantané ouvert en mmap ; séquence d'exercices (format JSON) relus à la demande."""
+
+    def __init__(self, path: str, available: Optional[Set[str]] = None):
+        self.path = path
+        self.available = available  # chemins locaux présents (drapeaux available_locally)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} n'est pas un instantané ({MAGIC!r} attendu)")
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        self.header = json.loads(self._mm[len(MAGIC) + 4:len(MAGIC) + 4 + hlen])
+        if self.header.get("format") != FORMAT:
+            raise ValueError(f"{path} : format d'instantané {self.header.get('format')} non pris en charge")
+        self.version = self.header["version"]
+        self._len = self.header["count"]
+        self.cache = LRUCache(maxsize=RECORD_CACHE)
+
+        view = memoryview(self._mm)
+        self._s = {}
+        for name, (pos, count, typecode) in self.header["sections"].items():
+            size = count * array(typecode).itemsize
+            if sys.byteorder == "little":
+                self._s[name] = view[pos:pos + size].cast(typecode)
+            else:  # gros-boutiste : copie retournée
+                a = array(typecode, bytes(view[pos:pos + size]))
+                a.byteswap()
+                self._s[name] = a
+        self._blob = self._s["strings"]
+        self._str_offsets = self._s["string_offsets"]
+
+    def __reduce__(self):
+        # envoyé à un processus du pool : il rouvre le fichier (le mmap ne se copie pas)
+        return Snapshot, (self.path, self.available)
+
+    def is_fresh(self, source_path: str) -> bool:
+        """L'instantané correspond-il toujours au JSON (taille et date) ?"""
+        source = self.header.get("source")
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            return False
+        return bool(source) and source["size"] == st.st_size and source["mtime_ns"] == st.st_mtime_ns
+
+    def string(self, i: int) -> Optional[str]:
+        if i == NONE:
+            return None
+        return bytes(self._blob[self._str_offsets[i]:self._str_offsets[i + 1]]).decode("utf-8")
+
+    def local_files(self) -> Set[str]:
+        """Chemins locaux référencés par les sujets et les corrigés."""
+        ids = set(self._s["col_local_subject_file"]) | set(self._s["corrige_local_file"])
+        ids.discard(NONE)
+        return {self.string(i) for i in ids}
+
+    def index_rows(self) -> Iterator[dict]:
+        """Champs utiles à ExerciseIndex, lus dans les colonnes (chaînes décodées une fois)."""
+        s, decoded = self._s, {}
+
+        def string(i):
+            v = decoded.get(i)
+            if v is None and i not in decoded:
+                v = decoded[i] = self.string(i)
+            return v
+
+        def num(col, pos):
+            v = col[pos]
+            return None if v == NO_INT else v
+
+        offsets, refs = s["topic_offsets"], s["topic_refs"]
+        for pos in range(self._len):
+            yield {
+                "id": string(s["col_id"][pos]),
+                "subject_id": string(s["col_subject_id"][pos]),
+                "year": num(s["col_year"], pos),
+                "session": string(s["col_session"][pos]),
+                "points": num(s["col_points"], pos),
+                "topics": [string(i) for i in refs[offsets[pos]:offsets[pos + 1]]],
+            }
+
+    def search_text(self):
+        """(texte normalisé concaténé, début de chaque exercice), comme dans ExerciseIndex."""
+        return bytes(self._s["text"]).decode("utf-8"), list(self._s["text_starts"])
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, pos: int) -> dict:
+        if pos < 0:
+            pos += self._len
+        if not 0 <= pos < self._len:
+            raise IndexError(pos)
+        rec = self.cache.get(pos)
+        if rec is None:
+            rec = self._record(pos)
+            self.cache.put(pos, rec)
+        return rec
+
+    def __iter__(self) -> Iterator[dict]:
+        for pos in range(self._len):
+            yield self._record(pos)
+
+    def _record(self, pos: int) -> dict:
+        s, string = self._s, self.string
+
+        def num(f):
+            v = s[f"col_{f}"][pos]
+            return None if v == NO_INT else v
+
+        t0, t1 = s["topic_offsets"][pos], s["topic_offsets"][pos + 1]
+        g = s["ex_group"][pos]
+        corriges = []
+        for cid in s["group_refs"][s["group_offsets"][g]:s["group_offsets"][g + 1]]:
+            c = {"label": string(s["corrige_label"][cid]), "url": string(s["corrige_url"][cid])}
+            local = s["corrige_local_file"][cid]
+            if local != NONE:
+                c["local_file"] = string(local)
+            corriges.append(c)
+
+        rec = {
+            "id": string(s["col_id"][pos]),
+            "subject_id": string(s["col_subject_id"][pos]),
+            "year": num("year"),
+            "session": string(s["col_session"][pos]),
+            "subject_label": string(s["col_subject_label"][pos]),
+            "code": string(s["col_code"][pos]),
+            "exercise": num("exercise"),
+            "points": num("points"),
+            "topics": [string(i) for i in s["topic_refs"][t0:t1]],
+            "raw": string(s["col_raw"][pos]),
+            "pdf_subject_url": string(s["col_pdf_subject_url"][pos]),
+            "local_subject_file": string(s["col_local_subject_file"][pos]),
+            "corriges": corriges,
+        }
+        first = num("page_first")
+        if first is not None:
+            rec["pages"] = [first, num("page_last")]
+        if self.available is not None:
+            subject = rec["local_subject_file"]
+            rec["subject_available_locally"] = bool(subject) and subject in self.available
+            for c in corriges:
+                c["available_locally"] = bool(c.get("local_file")) and c["local_file"] in self.available
+        return rec
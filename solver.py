@@ -0,0 +1,138 @@
+"""
+Recherche exacte d'une combinaison de k exercices couvrant le plus de tags
+demandés (max-coverage), par séparation-évaluation sur les bitmasks de
+l'index (exercise_index.py).
+
+- contraintes : au plus un exercice par sujet (avoid_same_subject) et
+  jamais deux fois le même id d'exercice ;
+- élagage par dominance : dans un même groupe de conflit, un exercice dont
+  les tags utiles sont inclus dans ceux d'un autre est inutile ;
+- borne : couverture actuelle + somme des meilleurs gains restants, bornée
+  par l'union des masques restants ;
+- budget de temps : au-delà, on rend la meilleure solution trouvée, sans
+  garantie d'optimalité.
+"""
+import time
+from typing import List, Optional, Tuple
+
+DEFAULT_BUDGET = 0.25  # secondes
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _prune_dominated(cands, relevant, groups, id_counts, ids, global_dominance):
+    """Retire les candidats dominés (masque utile inclus dans celui d'un autre)."""
+    by_group = {}
+    for i in cands:
+        by_group.setdefault(groups[i], []).append(i)
+
+    kept = []
+    for members in by_group.values():
+        # masques décroissants : un candidat ne peut être dominé que par un précédent
+        members.sort(key=lambda i: -relevant[i].bit_count())
+        group_kept = []
+        for i in members:
+            if not any(relevant[i] & ~relevant[j] == 0 for j in group_kept):
+                group_kept.append(i)
+        kept.extend(group_kept)
+
+    if global_dominance:
+        # sans contrainte de sujet, un candidat est aussi dominé par un candidat
+        # d'un autre groupe, si celui-ci n'a pas de doublon d'id
+        kept.sort(key=lambda i: -relevant[i].bit_count())
+        out = []
+        for i in kept:
+            if not any(relevant[i] & ~relevant[j] == 0 and id_counts[ids[j]] == 1 for j in out):
+                out.append(i)
+        kept = out
+    return kept
+
+
+def max_coverage(index, pool: List[int], wanted: int, k: int, avoid_same_subject: bool = True,
+                 incumbent: Optional[List[int]] = None, budget: float = DEFAULT_BUDGET) -> Tuple[Optional[List[int]], bool]:
+    """
+    Cherche parmi `pool` (positions dans l'index, dans l'ordre de départage)
+    au plus k exercices maximisant popcount(union des masques & wanted).
+
+    Retourne (solution, prouvée) :
+    - solution : positions choisies si elles couvrent strictement plus que
+      `incumbent`, sinon None ;
+    - prouvée : True si la recherche est allée au bout (ou si `incumbent`
+      couvre déjà tout), False si le budget a été dépassé.
+    """
+    masks, subjects, ids = index.masks, index.subjects, index.ids
+    full = wanted.bit_count()
+
+    best_cov = 0
+    for i in incumbent or []:
+        best_cov |= masks[i] & wanted
+    best_count = best_cov.bit_count()
+    if best_count == full or k <= 0:
+        return None, True
+
+    relevant = {i: masks[i] & wanted for i in pool}
+    cands = [i for i in pool if relevant[i]]
+    groups = subjects if avoid_same_subject else ids
+    id_counts = {}
+    for i in cands:
+        id_counts[ids[i]] = id_counts.get(ids[i], 0) + 1
+    cands = _prune_dominated(cands, relevant, groups, id_counts, ids, global_dominance=not avoid_same_subject)
+
+    # meilleurs gains d'abord (tri stable : l'ordre de départage est conservé)
+    order = sorted(cands, key=lambda i: -relevant[i].bit_count())
+    m = len(order)
+    rel = [relevant[i] for i in order]
+    grp = [groups[i] for i in order]
+    eid = [ids[i] for i in order]
+    sizes = [r.bit_count() for r in rel]
+    suffix_union = [0] * (m + 1)
+    for p in range(m - 1, -1, -1):
+        suffix_union[p] = suffix_union[p + 1] | rel[p]
+
+    deadline = time.perf_counter() + budget
+    state = {"nodes": 0, "best": None, "best_count": best_count}
+
+    def bound(p, covered, slots):
+        # somme des `slots` plus gros masques restants (triés) / union des restants
+        by_sizes = covered.bit_count() + sum(sizes[p:p + slots])
+        by_union = (covered | suffix_union[p]).bit_count()
+        return min(by_sizes, by_union)
+
+    def dfs(p, covered, slots, picked, used_groups, used_ids):
+        state["nodes"] += 1
+        if state["nodes"] & 1023 == 0 and time.perf_counter() > deadline:
+            raise _Timeout()
+
+        count = covered.bit_count()
+        if count > state["best_count"]:
+            state["best_count"] = count
+            state["best"] = list(picked)
+            if count == full:
+                return True
+        if slots == 0 or p >= m or bound(p, covered, slots) <= state["best_count"]:
+            return False
+
+        for q in range(p, m):
+            if bound(q, covered, slots) <= state["best_count"]:
+                break
+            if grp[q] in used_groups or eid[q] in used_ids or not rel[q] & ~covered:
+                continue
+            picked.append(order[q])
+            used_groups.add(grp[q])
+            used_ids.add(eid[q])
+            done = dfs(q + 1, covered | rel[q], slots - 1, picked, used_groups, used_ids)
+            picked.pop()
+            used_groups.discard(grp[q])
+            used_ids.discard(eid[q])
+            if done:
+                return True
+        return False
+
+    try:
+        dfs(0, 0, k, [], set(), set())
+        proven = True
+    except _Timeout:
+        proven = False
+    return state["best"], proven
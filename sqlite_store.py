@@ -0,0 +1,282 @@
+"""
+Stockage SQLite optionnel (alternative aux fichiers JSON de downloads/).
+
+Tables normalisées :
+- subjects     : un sujet (métadonnées + lien PDF) ;
+- corriges     : corrigés d'un sujet (plus recopiés pour chaque exercice) ;
+- exercises    : un exercice, rattaché à son sujet (pos = ordre du JSON) ;
+- topics / exercise_topics : thèmes internés, dans l'ordre de l'exercice ;
+- exercises_fts : FTS5 (tokenizer trigram) sur le texte normalisé de
+  l'exercice (raw + métadonnées), pour la recherche par sous-chaîne.
+
+Import : python sqlite_store.py [chemin.sqlite]
+(depuis subjects.json et exercises_standardises.json).
+
+Le serveur peut ensuite tourner sur la base (variable NSIBAC_DB) : seuls
+l'index en bitsets reste en mémoire, les exercices sont relus à la demande
+(avec un petit cache LRU).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from typing import Iterator, List, Optional, Set
+
+from cache import LRUCache
+from exercise_index import _haystack, normalize_text
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
+DB_PATH = os.path.join(DOWNLOADS_DIR, "annales.sqlite")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE subjects (
+    key INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    year INTEGER,
+    session TEXT,
+    label TEXT,
+    code TEXT,
+    date TEXT,
+    page TEXT,
+    pdf_url TEXT,
+    local_file TEXT
+);
+CREATE TABLE corriges (
+    subject_key INTEGER NOT NULL REFERENCES subjects(key),
+    rank INTEGER NOT NULL,
+    label TEXT,
+    url TEXT,
+    local_file TEXT,
+    PRIMARY KEY (subject_key, rank)
+);
+CREATE TABLE exercises (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    subject_key INTEGER NOT NULL REFERENCES subjects(key),
+    exercise INTEGER,
+    points INTEGER,
+    raw TEXT,
+    page_first INTEGER,
+    page_last INTEGER
+);
+CREATE TABLE topics (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE exercise_topics (
+    exercise_pos INTEGER NOT NULL REFERENCES exercises(pos),
+    rank INTEGER NOT NULL,
+    topic_id INTEGER NOT NULL REFERENCES topics(id),
+    PRIMARY KEY (exercise_pos, rank)
+);
+CREATE INDEX subjects_year ON subjects(year);
+CREATE INDEX subjects_session ON subjects(session);
+CREATE INDEX subjects_id ON subjects(id);
+CREATE INDEX exercises_id ON exercises(id);
+CREATE INDEX exercises_subject ON exercises(subject_key);
+CREATE INDEX exercise_topics_topic ON exercise_topics(topic_id);
+CREATE VIRTUAL TABLE exercises_fts USING fts5(text, tokenize='trigram');
+"""
+
+RECORD_CACHE = 4096  # exercices matérialisés gardés en mémoire
+_BATCH = 1000
+
+
+def _subject_payload(d: dict) -> str:
+    """Ce qui définit un sujet côté exercice (deux variantes d'un même id restent distinctes)."""
+    return json.dumps([d.get("subject_id", d.get("id")), d.get("year"), d.get("session"), d.get("subject_label"),
+                       d.get("code"), d.get("pdf_subject_url"), d.get("local_subject_file"), d.get("corriges") or []],
+                      ensure_ascii=False, sort_keys=True)
+
+
+def import_json(db_path: str = DB_PATH, root: str = DOWNLOADS_DIR) -> str:
+    """(Re)construit la base depuis les JSON ; remplacement atomique du fichier."""
+    subjects_path = os.path.join(root, "subjects.json")
+    exercises_path = os.path.join(root, "exercises_standardises.json")
+    h = hashlib.sha1()
+    with open(exercises_path, "rb") as f:
+        raw = f.read()
+        h.update(raw)
+        exercises = json.loads(raw.decode("utf-8"))
+    subjects = []
+    if os.path.exists(subjects_path):
+        with open(subjects_path, "rb") as f:
+            raw = f.read()
+            h.update(raw)
+            subjects = json.loads(raw.decode("utf-8"))
+
+    tmp = f"{db_path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(SCHEMA)
+        keys = {}
+
+        def add_subject(d, subject_id):
+            payload = _subject_payload(d)
+            key = keys.get(payload)
+            if key is None:
+                cur = conn.execute(
+                    "INSERT INTO subjects (id, year, session, label, code, date, page, pdf_url, local_file)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (subject_id, d.get("year"), d.get("session"), d.get("subject_label"), d.get("code"),
+                     d.get("date"), d.get("page"), d.get("pdf_subject_url"), d.get("local_subject_file")))
+                key = keys[payload] = cur.lastrowid
+                conn.executemany(
+                    "INSERT INTO corriges (subject_key, rank, label, url, local_file) VALUES (?, ?, ?, ?, ?)",
+                    [(key, r, c.get("label"), c.get("url"), c.get("local_file")) for r, c in enumerate(d.get("corriges") or [])])
+            return key
+
+        for s in subjects:
+            add_subject(s, s.get("id"))
+
+        topic_ids = {}
+        for pos, ex in enumerate(exercises):
+            key = add_subject(ex, ex.get("subject_id"))
+            pages = ex.get("pages") or [None, None]
+            conn.execute(
+                "INSERT INTO exercises (pos, id, subject_key, exercise, points, raw, page_first, page_last)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (pos, ex.get("id"), key, ex.get("exercise"), ex.get("points"), ex.get("raw"), pages[0], pages[1]))
+            rows = []
+            for rank, t in enumerate(ex.get("topics") or []):
+                tid = topic_ids.get(t)
+                if tid is None:
+                    tid = topic_ids[t] = conn.execute("INSERT INTO topics (name) VALUES (?)", (t,)).lastrowid
+                rows.append((pos, rank, tid))
+            conn.executemany("INSERT INTO exercise_topics (exercise_pos, rank, topic_id) VALUES (?, ?, ?)", rows)
+            conn.execute("INSERT INTO exercises_fts (rowid, text) VALUES (?, ?)", (pos, _haystack(ex)))
+
+        conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (h.hexdigest()[:16],))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, db_path)
+    print(f"Base SQLite : {len(exercises)} exercices, {len(keys)} sujets -> {db_path}")
+    return db_path
+
+
+class ExerciseRows:
+    """
+    Séquence d'exercices lue dans la base, au même format que les
+    enregistrements JSON. Les exercices sont relus à la demande (cache LRU) ;
+    l'itération parcourt la base par lots.
+    """
+
+    def __init__(self, db_path: str, available: Optional[Set[str]] = None):
+        self.db_path = db_path
+        self.available = available  # chemins (tels qu'enregistrés) des fichiers locaux présents
+        self._local = threading.local()
+        self.cache = LRUCache(maxsize=RECORD_CACHE)
+        self._len = self._conn().execute("SELECT COUNT(*) FROM exercises").fetchone()[0]
+
+    def __getstate__(self):
+        # envoyé à un processus du pool : connexions et cache ne se copient pas
+        return {"db_path": self.db_path, "available": self.available, "_len": self._len}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self.cache = LRUCache(maxsize=RECORD_CACHE)
+
+    def _conn(self) -> sqlite3.Connection:
+        # une connexion (lecture seule) par thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{pathname2url(self.db_path)}?mode=ro", uri=True,
+                                                       check_same_thread=False)
+        return conn
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, pos: int) -> dict:
+        if pos < 0:
+            pos += self._len
+        rec = self.cache.get(pos)
+        if rec is None:
+            recs = self._fetch(pos, pos + 1)
+            if not recs:
+                raise IndexError(pos)
+            rec = recs[0]
+            self.cache.put(pos, rec)
+        return rec
+
+    def __iter__(self) -> Iterator[dict]:
+        for start in range(0, self._len, _BATCH):
+            yield from self._fetch(start, start + _BATCH)
+
+    def version(self) -> str:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else ""
+
+    def local_files(self) -> Set[str]:
+        """Chemins locaux référencés par les sujets et les corrigés."""
+        conn = self._conn()
+        out = {r[0] for r in conn.execute("SELECT local_file FROM subjects WHERE local_file IS NOT NULL")}
+        out.update(r[0] for r in conn.execute("SELECT local_file FROM corriges WHERE local_file IS NOT NULL"))
+        return out
+
+    def _fetch(self, start: int, stop: int) -> List[dict]:
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT e.pos, e.id, s.id, s.year, s.session, s.label, s.code, e.exercise, e.points, e.raw,"
+            " s.pdf_url, s.local_file, e.subject_key, e.page_first, e.page_last"
+            " FROM exercises e JOIN subjects s ON s.key = e.subject_key"
+            " WHERE e.pos >= ? AND e.pos < ? ORDER BY e.pos", (start, stop)).fetchall()
+        topics = {}
+        for pos, name in conn.execute(
+                "SELECT et.exercise_pos, t.name FROM exercise_topics et JOIN topics t ON t.id = et.topic_id"
+                " WHERE et.exercise_pos >= ? AND et.exercise_pos < ? ORDER BY et.exercise_pos, et.rank", (start, stop)):
+            topics.setdefault(pos, []).append(name)
+        subject_keys = sorted({r[12] for r in rows})
+        corriges = {}
+        for i in range(0, len(subject_keys), 500):
+            chunk = subject_keys[i:i + 500]
+            for key, label, url, local in conn.execute(
+                    f"SELECT subject_key, label, url, local_file FROM corriges WHERE subject_key IN ({','.join('?' * len(chunk))})"
+                    " ORDER BY subject_key, rank", chunk):
+                c = {"label": label, "url": url}
+                if local is not None:
+                    c["local_file"] = local
+                corriges.setdefault(key, []).append(c)
+
+        out = []
+        for (pos, ex_id, subject_id, year, session, label, code, exercise, points, raw,
+             pdf_url, local_file, subject_key, first, last) in rows:
+            rec = {
+                "id": ex_id, "subject_id": subject_id, "year": year, "session": session,
+                "subject_label": label, "code": code, "exercise": exercise, "points": points,
+                "topics": topics.get(pos, []), "raw": raw,
+                "pdf_subject_url": pdf_url, "local_subject_file": local_file,
+                "corriges": [dict(c) for c in corriges.get(subject_key, [])],
+            }
+            if first is not None:
+                rec["pages"] = [first, last]
+            if self.available is not None:
+                _mark(rec, self.available)
+            out.append(rec)
+        return out
+
+    def text_search(self, q: str) -> List[int]:
+        """Positions des exercices dont le texte normalisé contient `q` (index trigram)."""
+        q = normalize_text(q)
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return [r[0] for r in self._conn().execute(
+            "SELECT rowid FROM exercises_fts WHERE text LIKE ? ESCAPE '\\' ORDER BY rowid", (pattern,))]
+
+
+def _mark(rec: dict, available: Set[str]):
+    subject = rec.get("local_subject_file")
+    rec["subject_available_locally"] = bool(subject) and subject in available
+    for c in rec["corriges"]:
+        local = c.get("local_file")
+        c["available_locally"] = bool(local) and local in available
+
+
+if __name__ == "__main__":
+    import sys
+
+    import_json(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
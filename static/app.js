@@ -1,9 +1,12 @@
 // static/app.js
 const state = {
-  all: [],
   selectedTags: new Set(),
+  nextCursor: null,
+  controller: null,
 };
 
+const PAGE_SIZE = 100;
+
 const $ = (id) => document.getElementById(id);
 
 let ALL_TOPICS_SORTED = [];
@@ -35,16 +38,12 @@ function normalize(s) {
     .trim();
 }
 
-async function openLocalThenFallback(localPathFromDownloads, fallbackUrl) {
-  if (localPathFromDownloads) {
+// available : drapeau calculé par le serveur (fichier présent dans downloads/)
+function openLocalThenFallback(localPathFromDownloads, available, fallbackUrl) {
+  if (localPathFromDownloads && available) {
     const localUrl = "/pdf/" + localPathFromDownloads.replace(/^downloads\//, "");
-    try {
-      const res = await fetch(localUrl, { method: "HEAD" });
-      if (res.ok) {
-        window.open(localUrl, "_blank", "noopener,noreferrer");
-        return;
-      }
-    } catch (_) {}
+    window.open(localUrl, "_blank", "noopener,noreferrer");
+    return;
   }
   if (fallbackUrl) {
     window.open(fallbackUrl, "_blank", "noopener,noreferrer");
@@ -53,6 +52,59 @@ async function openLocalThenFallback(localPathFromDownloads, fallbackUrl) {
   }
 }
 
+// sujet : seulement les pages de l'exercice quand elles sont connues
+function openSubject(ex) {
+  if (ex.pages && ex.subject_available_locally) {
+    window.open("/pdf/exercise/" + encodeURIComponent(ex.id), "_blank", "noopener,noreferrer");
+    return;
+  }
+  openLocalThenFallback(ex.local_subject_file, ex.subject_available_locally, ex.pdf_subject_url);
+}
+
+/* ---------- Aperçus (python thumbnails.py) ---------- */
+
+// {fichier: {sha256, pages, size, thumbs}} : vide si les aperçus n'ont pas été générés
+let PREVIEWS = {};
+
+function loadPreviews() {
+  return fetch("/data/thumbnails/index.json")
+    .then((r) => (r.ok ? r.json() : null))
+    .then((m) => {
+      PREVIEWS = (m && m.files) || {};
+    })
+    .catch(() => {});
+}
+
+function fileInfo(localPath) {
+  return localPath ? PREVIEWS[localPath.replace(/^downloads\//, "")] : undefined;
+}
+
+function formatSize(bytes) {
+  if (bytes >= 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(1).replace(".", ",")} Mo`;
+  return `${Math.max(1, Math.round(bytes / 1024))} Ko`;
+}
+
+function describeFile(info) {
+  return info && info.pages ? `${info.pages} p. · ${formatSize(info.size)}` : "";
+}
+
+// première page de l'exercice (sinon du sujet) ; l'image est gardée par le navigateur
+function thumbnail(ex) {
+  const info = ex.subject_available_locally ? fileInfo(ex.local_subject_file) : undefined;
+  if (!info) return null;
+  const page = ex.pages && info.thumbs.includes(ex.pages[0]) ? ex.pages[0] : 1;
+  if (!info.thumbs.includes(page)) return null;
+
+  const img = document.createElement("img");
+  img.className = "thumb";
+  img.loading = "lazy";
+  img.decoding = "async";
+  img.alt = `Aperçu de l'exercice ${ex.exercise}`;
+  img.src = `/thumbs/${info.sha256}-${page}.jpg`;
+  img.onclick = () => openSubject(ex);
+  return img;
+}
+
 /* ---------- Tags: propreté + tri fréquence + voir plus ---------- */
 
 function isUsefulTag(t) {
@@ -85,17 +137,11 @@ function isUsefulTag(t) {
   return true;
 }
 
-function buildTopicStats(exercises) {
-  const freq = new Map();
-  exercises.forEach((ex) => {
-    (ex.topics || []).forEach((t) => {
-      const tag = String(t).trim();
-      if (!isUsefulTag(tag)) return;
-      freq.set(tag, (freq.get(tag) || 0) + 1);
-    });
-  });
-
-  return [...freq.entries()]
+// topics: [{topic, count}] précalculé côté serveur (/api/stats)
+function buildTopicStats(topics) {
+  return topics
+    .map((t) => [String(t.topic).trim(), t.count])
+    .filter(([tag]) => isUsefulTag(tag))
     .sort((a, b) => (b[1] - a[1]) || a[0].localeCompare(b[0], "fr"))
     .map(([tag]) => tag);
 }
@@ -141,51 +187,38 @@ function renderTags() {
   }
 }
 
-/* ---------- Filtrage ---------- */
-
-function matches(ex) {
-  const q = normalize($("q").value);
-  const year = $("year").value;
-  const session = $("session").value;
-  const points = $("points").value;
+/* ---------- Filtrage (côté serveur : /api/search) ---------- */
 
-  if (year && String(ex.year) !== String(year)) return false;
-  if (session && ex.session !== session) return false;
-  if (points && String(ex.points) !== String(points)) return false;
+function searchParams(cursor) {
+  const params = new URLSearchParams();
+  const q = $("q").value.trim();
+  if (q) params.set("q", q);
+  ["year", "session", "points"].forEach((id) => {
+    if ($(id).value) params.set(id, $(id).value);
+  });
 
   // tags: match ALL tags sélectionnés
-  if (state.selectedTags.size > 0) {
-    const exTopics = new Set((ex.topics || []).map((t) => t));
-    for (const t of state.selectedTags) {
-      if (!exTopics.has(t)) return false;
-    }
-  }
+  state.selectedTags.forEach((t) => params.append("tags", t));
 
   // mode strict: n'utiliser QUE les thèmes sélectionnés
-  const strict = $("onlySelectedSearch")?.checked;
-  if (strict && state.selectedTags.size > 0) {
-    const exTopics = new Set((ex.topics || []).map((t) => t));
-    for (const t of exTopics) {
-      if (!state.selectedTags.has(t)) return false;
-    }
+  if ($("onlySelectedSearch")?.checked && state.selectedTags.size > 0) {
+    params.set("strict", "1");
   }
 
-  // recherche texte
-  if (!q) return true;
-
-  const hay = normalize(
-    [
-      ex.session,
-      ex.subject_label,
-      ex.code,
-      `exercice ${ex.exercise}`,
-      `${ex.points} points`,
-      (ex.topics || []).join(" "),
-      ex.raw,
-    ].join(" | ")
-  );
+  params.set("limit", String(PAGE_SIZE));
+  if (cursor) params.set("cursor", cursor);
+  return params;
+}
 
-  return hay.includes(q);
+async function search(cursor) {
+  // une nouvelle frappe annule la requête précédente
+  if (state.controller) state.controller.abort();
+  state.controller = new AbortController();
+  const res = await fetch("/api/search?" + searchParams(cursor), {
+    signal: state.controller.signal,
+  });
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+  return res.json();
 }
 
 /* ---------- Cartes ---------- */
@@ -194,6 +227,9 @@ function card(ex) {
   const el = document.createElement("article");
   el.className = "card";
 
+  const thumb = thumbnail(ex);
+  if (thumb) el.appendChild(thumb);
+
   const title = document.createElement("h3");
   title.textContent = `${ex.year} — ${ex.session} — ${ex.subject_label} — Ex ${ex.exercise} (${ex.points} pts)`;
   el.appendChild(title);
@@ -210,6 +246,14 @@ function card(ex) {
   meta.textContent = `${ex.code} · ${shownTopics.join(", ") || "—"}`;
   el.appendChild(meta);
 
+  const subjectInfo = describeFile(fileInfo(ex.local_subject_file));
+  if (subjectInfo) {
+    const size = document.createElement("p");
+    size.className = "muted";
+    size.textContent = `Sujet : ${subjectInfo}`;
+    el.appendChild(size);
+  }
+
   const raw = document.createElement("p");
   raw.textContent = ex.raw || "";
   el.appendChild(raw);
@@ -221,7 +265,7 @@ function card(ex) {
   b1.className = "btn";
   b1.textContent = "Ouvrir le sujet (PDF)";
   b1.onclick = () =>
-    openLocalThenFallback(ex.local_subject_file, ex.pdf_subject_url);
+    openSubject(ex);
   actions.appendChild(b1);
 
   const corr = (ex.corriges || []).filter((c) => c.url);
@@ -230,7 +274,8 @@ function card(ex) {
     const b2 = document.createElement("button");
     b2.className = "btn";
     b2.textContent = "Ouvrir le corrigé";
-    b2.onclick = () => openLocalThenFallback(corr[0].local_file, corr[0].url);
+    b2.title = describeFile(fileInfo(corr[0].local_file));
+    b2.onclick = () => openLocalThenFallback(corr[0].local_file, corr[0].available_locally, corr[0].url);
     actions.appendChild(b2);
   } else if (corr.length > 1) {
     const sel = document.createElement("select");
@@ -243,7 +288,8 @@ function card(ex) {
     corr.forEach((c, i) => {
       const opt = document.createElement("option");
       opt.value = String(i);
-      opt.textContent = c.label || `Corrigé ${i + 1}`;
+      const info = describeFile(fileInfo(c.local_file));
+      opt.textContent = (c.label || `Corrigé ${i + 1}`) + (info ? ` (${info})` : "");
       sel.appendChild(opt);
     });
 
@@ -253,7 +299,7 @@ function card(ex) {
     b2.onclick = () => {
       const i = Number(sel.value);
       if (Number.isNaN(i) || sel.value === "") return;
-      openLocalThenFallback(corr[i].local_file, corr[i].url);
+      openLocalThenFallback(corr[i].local_file, corr[i].available_locally, corr[i].url);
     };
 
     actions.appendChild(sel);
@@ -266,35 +312,71 @@ function card(ex) {
 
 /* ---------- Refresh ---------- */
 
-function refresh() {
-  const filtered = state.all.filter(matches);
-  $("count").textContent = `${filtered.length} exercice(s)`;
+function renderMore(res) {
+  const old = $("more");
+  if (old) old.remove();
+  if (!state.nextCursor) return;
+
+  const more = document.createElement("button");
+  more.id = "more";
+  more.className = "btn";
+  more.textContent = "Voir plus";
+  more.onclick = () => loadPage(state.nextCursor, false).catch(onSearchError);
+  res.after(more);
+}
+
+async function loadPage(cursor, replace) {
+  const data = await search(cursor);
+  $("count").textContent = `${data.total} exercice(s)`;
 
   const res = $("results");
-  res.innerHTML = "";
-  filtered.slice(0, 400).forEach((ex) => res.appendChild(card(ex)));
+  if (replace) res.innerHTML = "";
+  data.items.forEach((ex) => res.appendChild(card(ex)));
+
+  state.nextCursor = data.next_cursor;
+  renderMore(res);
+  return data;
+}
+
+function onSearchError(err) {
+  if (err.name === "AbortError") return;
+  console.error(err);
+}
+
+let refreshTimer = null;
+
+function refresh() {
+  clearTimeout(refreshTimer);
+  refreshTimer = setTimeout(() => {
+    loadPage(null, true).catch(onSearchError);
+  }, 150);
 }
 
 /* ---------- Init ---------- */
 
 async function init() {
-  const res = await fetch("/data/exercises_standardises.json");
-  state.all = await res.json();
-
-  buildSelect($("year"), uniqSorted(state.all.map((x) => x.year)), "Toutes les années");
+  // première page + facettes (sans filtre) pour les listes déroulantes ;
+  // les tags viennent des statistiques précalculées
+  const [data, stats] = await Promise.all([
+    loadPreviews().then(() => loadPage(null, true)),
+    fetch("/api/stats").then((r) => r.json()),
+  ]);
+  const values = (name) => data.facets[name].map((f) => f.value);
+
+  buildSelect($("year"), uniqSorted(values("year")), "Toutes les années");
   buildSelect(
     $("session"),
-    uniqSorted(state.all.map((x) => x.session)),
+    uniqSorted(values("session")),
     "Toutes les sessions"
   );
   buildSelect(
     $("points"),
-    uniqSorted(state.all.map((x) => x.points)),
+    uniqSorted(values("points")),
     "Tous les points"
   );
 
   // Tags
-  ALL_TOPICS_SORTED = buildTopicStats(state.all);
+  ALL_TOPICS_SORTED = buildTopicStats(stats.topics);
   SHOW_ALL_TAGS = false;
   renderTags();
 
@@ -330,11 +412,9 @@ async function init() {
     renderTags();
     refresh();
   };
-
-  refresh();
 }
 
 init().catch((err) => {
   console.error(err);
-  alert("Impossible de charger exercises.json. Vérifie que downloads/exercises_standardises.json existe.");
+  alert("Impossible de charger les exercices. Vérifie que downloads/exercises_standardises.json existe.");
 });
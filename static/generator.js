@@ -7,33 +7,74 @@ function normalize(s) {
     .trim();
 }
 
-async function openLocalThenFallback(localPathFromDownloads, fallbackUrl) {
-  if (localPathFromDownloads) {
+// available : drapeau calculé par le serveur (fichier présent dans downloads/)
+function openLocalThenFallback(localPathFromDownloads, available, fallbackUrl) {
+  if (localPathFromDownloads && available) {
     const localUrl = "/pdf/" + localPathFromDownloads.replace(/^downloads\//, "");
-    try {
-      const res = await fetch(localUrl, { method: "HEAD" });
-      if (res.ok) {
-        window.open(localUrl, "_blank", "noopener,noreferrer");
-        return;
-      }
-    } catch (_) {}
+    window.open(localUrl, "_blank", "noopener,noreferrer");
+    return;
   }
   if (fallbackUrl) window.open(fallbackUrl, "_blank", "noopener,noreferrer");
   else alert("Fichier introuvable (local) et aucun lien de secours.");
 }
 
-let EXS = [];
+// sujet : seulement les pages de l'exercice quand elles sont connues
+function openSubject(ex) {
+  if (ex.pages && ex.subject_available_locally) {
+    window.open("/pdf/exercise/" + encodeURIComponent(ex.id), "_blank", "noopener,noreferrer");
+    return;
+  }
+  openLocalThenFallback(ex.local_subject_file, ex.subject_available_locally, ex.pdf_subject_url);
+}
+
+// aperçus (python thumbnails.py) : {fichier: {sha256, pages, size, thumbs}}, vide s'ils sont absents
+let PREVIEWS = {};
+
+function loadPreviews() {
+  return fetch("/data/thumbnails/index.json")
+    .then(r => r.ok ? r.json() : null)
+    .then(m => { PREVIEWS = (m && m.files) || {}; })
+    .catch(() => {});
+}
+
+function fileInfo(localPath) {
+  return localPath ? PREVIEWS[localPath.replace(/^downloads\//, "")] : undefined;
+}
+
+function describeFile(info) {
+  if (!info || !info.pages) return "";
+  const size = info.size >= 1024 * 1024
+    ? `${(info.size / (1024 * 1024)).toFixed(1).replace(".", ",")} Mo`
+    : `${Math.max(1, Math.round(info.size / 1024))} Ko`;
+  return `${info.pages} p. · ${size}`;
+}
+
+// première page de l'exercice (sinon du sujet) ; l'image est gardée par le navigateur
+function thumbnail(ex) {
+  const info = ex.subject_available_locally ? fileInfo(ex.local_subject_file) : undefined;
+  if (!info) return null;
+  const page = ex.pages && info.thumbs.includes(ex.pages[0]) ? ex.pages[0] : 1;
+  if (!info.thumbs.includes(page)) return null;
+
+  const img = document.createElement("img");
+  img.className = "thumb";
+  img.loading = "lazy";
+  img.decoding = "async";
+  img.alt = `Aperçu de l'exercice ${ex.exercise}`;
+  img.src = `/thumbs/${info.sha256}-${page}.jpg`;
+  img.onclick = () => openSubject(ex);
+  return img;
+}
+
 let ALL_TAGS = [];
 let selected = new Set();
+let LAST_IDS = [];
 
-function computeTags(exs) {
-  const freq = new Map();
-  exs.forEach(ex => (ex.topics || []).forEach(t => {
-    const tag = String(t).trim();
-    if (!tag) return;
-    freq.set(tag, (freq.get(tag) || 0) + 1);
-  }));
-  return [...freq.entries()]
+// fréquences précalculées côté serveur (/api/stats) : il ne reste qu'à trier
+function computeTags(topics) {
+  return topics
+    .map(t => [String(t.topic).trim(), t.count])
+    .filter(([tag]) => tag)
     .sort((a,b) => (b[1]-a[1]) || a[0].localeCompare(b[0], "fr"))
     .map(([t]) => t);
 }
@@ -61,6 +102,9 @@ function card(ex) {
   const el = document.createElement("article");
   el.className = "card";
 
+  const thumb = thumbnail(ex);
+  if (thumb) el.appendChild(thumb);
+
   const title = document.createElement("h3");
   title.textContent = `${ex.year} — ${ex.session} — ${ex.subject_label} — Ex ${ex.exercise} (${ex.points} pts)`;
   el.appendChild(title);
@@ -69,6 +113,8 @@ function card(ex) {
   meta.className = "muted";
   const used = (ex.topics_used && ex.topics_used.length) ? ex.topics_used : (ex.topics || []);
   meta.textContent = `${ex.code} · ${used.join(", ") || "—"}`;
+  const subjectInfo = describeFile(fileInfo(ex.local_subject_file));
+  if (subjectInfo) meta.textContent += ` · sujet : ${subjectInfo}`;
   el.appendChild(meta);
 
   if (ex.topics_other && ex.topics_other.length && !$("onlySelected").checked) {
@@ -89,16 +135,17 @@ function card(ex) {
   const b1 = document.createElement("button");
   b1.className = "btn";
   b1.textContent = "Sujet (PDF)";
-  b1.onclick = () => openLocalThenFallback(ex.local_subject_file, ex.pdf_subject_url);
+  b1.onclick = () => openSubject(ex);
   actions.appendChild(b1);
 
   const corr = (ex.corriges || []).filter(c => c.url);
   if (corr.length > 0) {
     const sel = document.createElement("select");
     sel.className = "select";
-    sel.innerHTML = `<option value="">Corrigé…</option>` + corr.map((c, i) =>
-      `<option value="${i}">${c.label || ("Corrigé " + (i+1))}</option>`
-    ).join("");
+    sel.innerHTML = `<option value="">Corrigé…</option>` + corr.map((c, i) => {
+      const info = describeFile(fileInfo(c.local_file));
+      return `<option value="${i}">${c.label || ("Corrigé " + (i+1))}${info ? ` (${info})` : ""}</option>`;
+    }).join("");
 
     const b2 = document.createElement("button");
     b2.className = "btn";
@@ -106,7 +153,7 @@ function card(ex) {
     b2.onclick = () => {
       if (sel.value === "") return;
       const i = Number(sel.value);
-      openLocalThenFallback(corr[i].local_file, corr[i].url);
+      openLocalThenFallback(corr[i].local_file, corr[i].available_locally, corr[i].url);
     };
 
     actions.appendChild(sel);
@@ -123,7 +170,8 @@ async function generate() {
     tags: [...selected],
     k: Number($("k").value),
     avoid_same_subject: $("avoidSame").checked,
-    only_selected_topics: $("onlySelected").checked
+    only_selected_topics: $("onlySelected").checked,
+    mode: $("optimal").checked ? "optimal" : "greedy"
   };
 
 
@@ -137,32 +185,58 @@ async function generate() {
   if (!res.ok) {
     $("coverage").textContent = data.error || "Erreur génération";
     $("combo").innerHTML = "";
+    $("packet").hidden = true;
     return;
   }
 
   $("coverage").textContent =
     `Couverts: ${data.covered_tags.length}/${data.requested_tags.length}` +
-    (data.missing_tags.length ? ` · Manquants: ${data.missing_tags.join(", ")}` : "");
+    (data.missing_tags.length ? ` · Manquants: ${data.missing_tags.join(", ")}` : "") +
+    (data.mode === "optimal" ? (data.optimal ? " · optimal" : " · optimal non prouvé (temps dépassé)") : "");
 
   const wrap = $("combo");
   wrap.innerHTML = "";
   data.exercises.forEach(ex => wrap.appendChild(card(ex)));
+
+  LAST_IDS = data.exercises.map(ex => ex.id);
+  $("packet").hidden = LAST_IDS.length === 0;
+}
+
+async function downloadPacket() {
+  const res = await fetch("/api/generate/packet", {
+    method: "POST",
+    headers: {"Content-Type":"application/json"},
+    body: JSON.stringify({ exercise_ids: LAST_IDS, format: "zip" })
+  });
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    alert(data.error || "Erreur lors de la création du paquet.");
+    return;
+  }
+  const url = URL.createObjectURL(await res.blob());
+  const a = document.createElement("a");
+  a.href = url;
+  a.download = "paquet.zip";
+  a.click();
+  URL.revokeObjectURL(url);
 }
 
 async function init() {
-  const r = await fetch("/data/exercises_standardises.json");
-  EXS = await r.json();
-  ALL_TAGS = computeTags(EXS);
+  // statistiques des thèmes seulement (plus besoin de télécharger tous les exercices)
+  const [stats] = await Promise.all([fetch("/api/stats").then(r => r.json()), loadPreviews()]);
+  ALL_TAGS = computeTags(stats.topics);
 
   $("selCount").textContent = `${selected.size} tag(s) sélectionné(s)`;
   $("tagSearch").addEventListener("input", renderTags);
   $("generate").onclick = generate;
+  $("packet").onclick = downloadPacket;
   $("clear").onclick = () => {
     selected.clear();
     $("selCount").textContent = `0 tag(s) sélectionné(s)`;
     renderTags();
     $("coverage").textContent = "—";
     $("combo").innerHTML = "";
+    $("packet").hidden = true;
   };
 
   renderTags();
@@ -0,0 +1,69 @@
+"""
+Statistiques des thèmes, calculées par la standardisation (annales.py) et
+écrites à côté du jeu de données (exercises_stats.json) :
+- fréquence de chaque thème ;
+- co-occurrences : pour chaque paire de thèmes présents ensemble, le nombre
+  d'exercices et leurs positions (ordre du JSON) ;
+- couverture par année et par session (exercices, exercices par thème).
+
+Le serveur les expose sur /api/stats et s'en sert pour élaguer la
+génération (ExerciseIndex.set_pairs). Si le fichier manque ou ne correspond
+plus au JSON (champ `version`), elles sont recalculées au chargement.
+"""
+import json
+import os
+from typing import Iterable, Optional
+
+STATS_FILE = "exercises_stats.json"
+FORMAT = 1
+
+
+def stats_path(json_path: str) -> str:
+    return os.path.join(os.path.dirname(json_path), STATS_FILE)
+
+
+def compute_stats(records: Iterable[dict], version: Optional[str] = None) -> dict:
+    """Statistiques des enregistrements (itérés une seule fois)."""
+    topic_count = {}
+    pairs = {}  # (thème, thème) triés -> positions
+    coverage = {"year": {}, "session": {}}
+    n = 0
+    for pos, ex in enumerate(records):
+        n += 1
+        topics = sorted({t for t in ex.get("topics") or [] if t})
+        for t in topics:
+            topic_count[t] = topic_count.get(t, 0) + 1
+        for x, a in enumerate(topics):
+            for b in topics[x + 1:]:
+                pairs.setdefault((a, b), []).append(pos)
+        for field, by_value in coverage.items():
+            value = ex.get(field)
+            if value is None:
+                continue
+            c = by_value.setdefault(str(value), {"count": 0, "topics": {}})
+            c["count"] += 1
+            for t in topics:
+                c["topics"][t] = c["topics"].get(t, 0) + 1
+
+    return {
+        "format": FORMAT,
+        "version": version,
+        "count": n,
+        "topics": [{"topic": t, "count": c} for t, c in sorted(topic_count.items(), key=lambda x: (-x[1], x[0]))],
+        "pairs": [{"topics": list(p), "count": len(ps), "exercises": ps}
+                  for p, ps in sorted(pairs.items(), key=lambda x: (-len(x[1]), x[0]))],
+        "by_year": dict(sorted(coverage["year"].items())),
+        "by_session": dict(sorted(coverage["session"].items())),
+    }
+
+
+def load_stats(path: str, version: str) -> Optional[dict]:
+    """Statistiques écrites pour cette version du jeu de données, None sinon."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stats.get("format") != FORMAT or stats.get("version") != version:
+        return None
+    return stats
@@ -0,0 +1,65 @@
+"""Routes de génération sur le jeu de données de downloads/."""
+import pytest
+
+flask = pytest.importorskip("flask")
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("route, extra", [
+    ("/api/generate", {}),
+    ("/api/generate/batch", {"n": 3}),
+])
+def test_sessions_string_is_one_session(client, route, extra):
+    def sessions(value):
+        r = client.post(route, json={"tags": ["arbres"], "sessions": value, "seed": 1, **extra})
+        assert r.status_code == 200
+        return r.get_json()
+
+    # une chaîne ne doit pas être lue caractère par caractère
+    assert sessions("Métropole") == sessions(["Métropole"])
+
+
+def test_metrics_endpoints_are_not_profiled(client, monkeypatch):
+    monkeypatch.setattr(app, "PROFILER", app.metrics.SlowProfiler())
+    app.PROFILER.configure(0)  # toute requête profilée est conservée
+    client.get("/metrics")
+    client.get("/metrics/profile")
+    client.get("/")
+    assert [p["route"] for p in client.get("/metrics/profile").get_json()["profiles"]] == ["/"]
+
+
+@pytest.mark.parametrize("ids", [[["a"]], "abc", [], [1, 2], {"a": 1}])
+def test_packet_rejects_invalid_exercise_ids(client, ids):
+    r = client.post("/api/generate/packet", json={"exercise_ids": ids})
+    assert r.status_code == 400
+    assert "exercise_ids" in r.get_json()["error"]
+
+
+@pytest.mark.parametrize("fmt", ["zip", "pdf"])
+def test_packet_opens_slices_only_while_streaming(client, monkeypatch, fmt):
+    if fmt == "pdf":
+        pytest.importorskip("pypdf")
+    opened = []
+    real_open = app.SLICES.open
+
+    def tracking_open(*args):
+        f = real_open(*args)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr(app.SLICES, "open", tracking_open)
+    ds = app.DATASET.current()
+    ex = next(e for e in ds.exercises if e.get("pages") and e.get("subject_available_locally"))
+    r = client.post("/api/generate/packet", json={"exercise_ids": [ex["id"]], "format": fmt})
+    assert r.status_code == 200
+    if fmt == "zip":
+        assert opened == []  # rien n'est ouvert avant l'envoi
+        r.get_data()
+    r.close()
+    assert opened and all(f is None or f.closed for f in opened)
@@ -0,0 +1,374 @@
+"""
+Téléchargements (getAnnales.download_all / fetch) contre un serveur HTTP
+local : concurrence, retries avec backoff, 429 + Retry-After, bilan final.
+"""
+import json
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import getAnnales
+
+
+def pdf(n: int) -> bytes:
+    return b"%PDF-1.4\n" + f"contenu {n}\n".encode() * 50 + b"%%EOF\n"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.setdefault(self.path, []).append(time.monotonic())
+            server.headers.setdefault(self.path, []).append(dict(self.headers))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            replies = server.routes.get(self.path, [(404, {}, b"")])
+            # une liste de réponses par chemin : la dernière se répète
+            status, headers, body = replies.pop(0) if len(replies) > 1 else replies[0]
+        headers = dict(headers)
+        cut = headers.pop("X-Cut", None)  # coupe la connexion après ce nombre d'octets
+        try:
+            time.sleep(server.delay)
+            etag = headers.get("ETag")
+            length = len(body)
+            if status == 200 and etag and self.headers.get("If-None-Match") == etag:
+                status, body, length = 304, b"", 0
+            elif status == 200 and etag and self.headers.get("Range") and self.headers.get("If-Range") == etag:
+                start = int(self.headers["Range"][len("bytes="):].rstrip("-"))
+                if start >= len(body):
+                    status, body, length = 416, b"", 0
+                else:
+                    headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                    status, body, length = 206, body[start:], len(body) - start
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+            self.wfile.write(body if cut is None else body[:int(cut)])
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """
+    Serveur HTTP (un thread par requête) : server.routes = {chemin: [(statut, en-têtes, corps), ...]}.
+    Une réponse 200 avec ETag honore If-None-Match et Range + If-Range ;
+    l'en-tête "X-Cut" tronque la réponse (connexion coupée).
+    """
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    srv.lock = threading.Lock()
+    srv.routes, srv.hits, srv.headers = {}, {}, {}
+    srv.active = srv.max_active = 0
+    srv.delay = 0.0
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}"
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    """downloads/ et le store de blobs dans un répertoire temporaire, backoff court."""
+    out = tmp_path / "downloads"
+    monkeypatch.setattr(getAnnales, "OUT_DIR", str(out))
+    monkeypatch.setattr(getAnnales, "BLOB_DIR", str(out / "blobs"))
+    monkeypatch.setattr(getAnnales, "BACKOFF_BASE", 0.05)
+    return out
+
+
+def run(server, store, paths, manifest=None, workers=4):
+    downloads = [(server.url + p, str(store / "NSI" / p.strip("/"))) for p in paths]
+    return getAnnales.download_all(downloads, workers=workers, limiter=getAnnales.HostRateLimiter(0),
+                                   manifest=manifest)
+
+
+def gaps(times):
+    return [b - a for a, b in zip(times, times[1:])]
+
+
+def test_concurrent_downloads(server, store):
+    server.delay = 0.3
+    for i in range(4):
+        server.routes[f"/s{i}.pdf"] = [(200, {}, pdf(i))]
+    server.routes["/copie.pdf"] = [(200, {}, pdf(0))]
+    paths = [f"/s{i}.pdf" for i in range(4)] + ["/copie.pdf"]
+
+    start = time.monotonic()
+    results = run(server, store, paths)
+
+    assert [status for _, _, status, _ in results] == ["downloaded"] * 5
+    assert server.max_active >= 2
+    assert time.monotonic() - start < 5 * server.delay
+    for i, p in enumerate(paths[:4]):
+        with open(results[i][1], "rb") as f:
+            assert f.read() == pdf(i)
+    # même contenu sous deux URL : un seul blob
+    assert os.path.samefile(results[0][1], results[4][1])
+
+
+def test_retry_with_backoff_on_5xx(server, store):
+    server.routes["/s.pdf"] = [(503, {}, b""), (500, {}, b""), (502, {}, b""), (200, {}, pdf(1))]
+
+    (_, dest, status, err), = run(server, store, ["/s.pdf"])
+
+    assert (status, err) == ("downloaded", None)
+    hits = server.hits["/s.pdf"]
+    assert len(hits) == 4
+    # 0.05 s, 0.1 s, 0.2 s : backoff exponentiel
+    for gap, expected in zip(gaps(hits), (0.05, 0.1, 0.2)):
+        assert gap >= expected * 0.9
+    with open(dest, "rb") as f:
+        assert f.read() == pdf(1)
+
+
+def test_gives_up_after_max_retries(server, store, monkeypatch):
+    monkeypatch.setattr(getAnnales, "MAX_RETRIES", 2)
+    server.routes["/s.pdf"] = [(503, {}, b"")]
+
+    (_, dest, status, err), = run(server, store, ["/s.pdf"])
+
+    assert status == "failed"
+    assert err.response.status_code == 503
+    assert len(server.hits["/s.pdf"]) == 3
+    assert not os.path.exists(dest)
+
+
+def test_429_honours_retry_after(server, store, monkeypatch):
+    monkeypatch.setattr(getAnnales, "BACKOFF_BASE", 0.5)
+    server.routes["/s.pdf"] = [(429, {"Retry-After": "1"}, b""), (200, {}, pdf(1))]
+
+    (_, _, status, _), = run(server, store, ["/s.pdf"])
+
+    assert status == "downloaded"
+    hits = server.hits["/s.pdf"]
+    assert len(hits) == 2
+    # le délai demandé remplace le backoff (0.5 s) au lieu de s'y ajouter
+    assert 1.0 <= gaps(hits)[0] < 1.4
+
+
+def test_503_retry_after_http_date(server, store):
+    retry_at = formatdate(time.time() + 2, usegmt=True)
+    server.routes["/s.pdf"] = [(503, {"Retry-After": retry_at}, b""), (200, {}, pdf(1))]
+
+    (_, _, status, _), = run(server, store, ["/s.pdf"])
+
+    assert status == "downloaded"
+    # date HTTP à la seconde près : entre 1 et 2 s d'attente
+    assert 0.9 <= gaps(server.hits["/s.pdf"])[0] < 2.5
+
+
+def test_retry_after_seconds():
+    assert getAnnales.retry_after_seconds("3") == 3.0
+    assert getAnnales.retry_after_seconds(None) is None
+    assert getAnnales.retry_after_seconds("bientôt") is None
+    assert getAnnales.retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_summary_counts(server, store, capsys):
+    server.routes["/a.pdf"] = [(200, {"ETag": '"a1"'}, pdf(1))]
+    server.routes["/b.pdf"] = [(200, {}, pdf(2))]
+    server.routes["/absent.pdf"] = [(404, {}, b"")]
+    manifest = {"urls": {}, "files": {}}
+    run(server, store, ["/a.pdf"], manifest)
+
+    # second passage : /a.pdf est revalidé (304), /b.pdf est nouveau, /absent.pdf échoue
+    results = run(server, store, ["/a.pdf", "/b.pdf", "/absent.pdf"], manifest)
+    getAnnales.print_download_summary(results)
+
+    assert [status for _, _, status, _ in results] == ["unchanged", "downloaded", "failed"]
+    out = capsys.readouterr().out
+    assert "/absent.pdf" in out
+    assert out.strip().endswith("PDF: 1 téléchargé(s), 1 inchangé(s), 1 échec(s) sur 3 fichier(s).")
+    assert set(manifest["urls"]) == {server.url + "/a.pdf", server.url + "/b.pdf"}
+
+
+def test_prune_removes_stale_url_copies(server, store):
+    server.routes["/a.pdf"] = [(200, {}, pdf(1))]
+    server.routes["/b.pdf"] = [(200, {}, pdf(2))]
+    manifest = {"urls": {}, "files": {}}
+    run(server, store, ["/a.pdf", "/b.pdf"], manifest)
+
+    # /b.pdf disparaît des pages : son blob et sa copie de travail sont supprimés
+    del manifest["urls"][server.url + "/b.pdf"]
+    assert getAnnales.prune_blobs(manifest) == 2
+    assert os.path.exists(getAnnales.url_cache_path(server.url + "/a.pdf"))
+    assert not os.path.exists(getAnnales.url_cache_path(server.url + "/b.pdf"))
+    assert os.listdir(store / "blobs" / "url") == [os.path.basename(getAnnales.url_cache_path(server.url + "/a.pdf"))]
+
+
+def test_link_or_copy_same_destination_from_threads(store):
+    store.mkdir()
+    sources = []
+    for i in range(8):
+        src = store / f"src{i}.pdf"
+        src.write_bytes(pdf(i))
+        sources.append(str(src))
+    dest = str(store / "NSI" / "dest.pdf")
+    errors = []
+
+    def link(src):
+        try:
+            for _ in range(200):
+                getAnnales.link_or_copy(src, dest)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=link, args=(src,)) for src in sources]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert os.listdir(store / "NSI") == ["dest.pdf"]
+
+
+def test_scrape_reparses_pages_from_an_older_parser(server, monkeypatch):
+    fixture = os.path.join(os.path.dirname(__file__), "fixtures", "annales-nsi-2025.html")
+    with open(fixture, "rb") as f:
+        html = f.read()
+    page = server.url + "/annales-nsi-2025/nsi-ecrit-2025.html"
+    server.routes["/annales-nsi-2025/nsi-ecrit-2025.html"] = [(200, {"ETag": '"p1"'}, html)]
+    fresh = getAnnales.parse_page(page, html.decode("utf-8"))
+
+    # crawl précédent : même HTML, mais parsé par une version antérieure
+    stale = [dict(s, session="Ancien parseur") for s in fresh[0]]
+    previous = ({page: stale}, {})
+    manifest = {"pages": {page: {"url": page, "etag": '"p1"', "sha256": "x"}}, "urls": {}, "files": {}}
+    limiter = getAnnales.HostRateLimiter(0)
+
+    assert getAnnales.scrape([page], limiter=limiter, manifest=manifest, previous=previous) == fresh
+    assert "If-None-Match" not in server.headers["/annales-nsi-2025/nsi-ecrit-2025.html"][0]
+    assert manifest["pages"][page]["parser"] == getAnnales.PARSE_VERSION
+
+    # même version : 304, les résultats précédents sont repris sans reparser
+    monkeypatch.setattr(getAnnales, "parse_page", lambda *a: pytest.fail("page reparsée"))
+    previous = ({page: fresh[0]}, {})
+    for ex in fresh[1]:
+        previous[1].setdefault(ex["subject_id"], []).append(ex)
+    assert getAnnales.scrape([page], limiter=limiter, manifest=manifest, previous=previous) == fresh
+    assert server.headers["/annales-nsi-2025/nsi-ecrit-2025.html"][1]["If-None-Match"] == '"p1"'
+
+
+# ---------- reprise et validation d'un transfert (download) ----------
+
+def big_pdf(n: int, size: int = 2_000_000) -> bytes:
+    filler = f"bloc {n} ".encode() * (size // 8)
+    return b"%PDF-1.4\n" + filler + b"\n%%EOF\n"
+
+
+def fetch_one(server, dest, known=None):
+    return getAnnales.download(server.url + "/s.pdf", str(dest), getAnnales.make_session(1),
+                               getAnnales.HostRateLimiter(0), known)
+
+
+def write_part(dest, data: bytes, etag: str, url: str):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    (dest.parent / (dest.name + ".part")).write_bytes(data)
+    (dest.parent / (dest.name + ".part.json")).write_text(
+        json.dumps({"url": url, "etag": etag, "last_modified": None}), encoding="utf-8")
+
+
+def test_cut_transfer_resumes_with_range(server, store):
+    body = big_pdf(1)
+    server.routes["/s.pdf"] = [(200, {"ETag": '"v1"', "X-Cut": "900000"}, body), (200, {"ETag": '"v1"'}, body)]
+    dest = store / "NSI" / "s.pdf"
+
+    status, entry = fetch_one(server, dest)
+
+    assert status == "downloaded"
+    assert dest.read_bytes() == body
+    assert entry["size"] == len(body)
+    first, second = server.headers["/s.pdf"]
+    assert "Range" not in first
+    offset = int(second["Range"][len("bytes="):].rstrip("-"))
+    assert 0 < offset <= 900000
+    assert second["If-Range"] == '"v1"'
+    assert not os.path.exists(str(dest) + ".part")
+
+
+def test_changed_validator_restarts_from_scratch(server, store):
+    old, new = big_pdf(1), big_pdf(2)
+    dest = store / "NSI" / "s.pdf"
+    write_part(dest, old[:500_000], '"v1"', server.url + "/s.pdf")
+    server.routes["/s.pdf"] = [(200, {"ETag": '"v2"'}, new)]
+
+    status, entry = fetch_one(server, dest)
+
+    # If-Range ne correspond plus : 200 complet, le début partiel est remplacé
+    assert status == "downloaded"
+    assert server.headers["/s.pdf"][0]["If-Range"] == '"v1"'
+    assert dest.read_bytes() == new
+    assert entry["etag"] == '"v2"'
+
+
+def test_416_discards_part_and_restarts(server, store):
+    body = pdf(1)
+    dest = store / "NSI" / "s.pdf"
+    write_part(dest, body + b"octets en trop", '"v1"', server.url + "/s.pdf")
+    server.routes["/s.pdf"] = [(200, {"ETag": '"v1"'}, body)]
+
+    status, _ = fetch_one(server, dest)
+
+    assert status == "downloaded"
+    assert [("Range" in h) for h in server.headers["/s.pdf"]] == [True, False]
+    assert dest.read_bytes() == body
+
+
+def test_size_mismatch_is_rejected(server, store):
+    body = pdf(1)
+    dest = store / "NSI" / "s.pdf"
+    dest.parent.mkdir(parents=True)
+    dest.write_bytes(pdf(0))
+    write_part(dest, body[:100], '"v1"', server.url + "/s.pdf")
+    # le serveur annonce une taille totale qui ne correspond pas à ce qu'il envoie
+    server.routes["/s.pdf"] = [(206, {"ETag": '"v1"', "Content-Range": f"bytes 100-{len(body) - 1}/{len(body) + 50}"},
+                                body[100:])]
+
+    with pytest.raises(ValueError, match="taille"):
+        fetch_one(server, dest)
+
+    assert dest.read_bytes() == pdf(0)
+    assert not os.path.exists(str(dest) + ".part")
+
+
+def test_pdf_without_eof_is_rejected(server, store):
+    dest = store / "NSI" / "s.pdf"
+    dest.parent.mkdir(parents=True)
+    dest.write_bytes(pdf(0))
+    server.routes["/s.pdf"] = [(200, {}, pdf(1)[:-len(b"%%EOF\n")])]
+
+    with pytest.raises(ValueError, match="EOF"):
+        fetch_one(server, dest)
+
+    # la version précédente reste en place
+    assert dest.read_bytes() == pdf(0)
+    assert not os.path.exists(str(dest) + ".part")
+
+
+def test_failed_download_leaves_destination_untouched(server, store, monkeypatch):
+    monkeypatch.setattr(getAnnales, "MAX_RETRIES", 1)
+    body = big_pdf(1)
+    dest = store / "NSI" / "s.pdf"
+    dest.parent.mkdir(parents=True)
+    dest.write_bytes(pdf(0))
+    server.routes["/s.pdf"] = [(200, {"ETag": '"v1"', "X-Cut": "300000"}, body)]
+
+    with pytest.raises(Exception):
+        fetch_one(server, dest)
+
+    assert dest.read_bytes() == pdf(0)
+    # le partiel est gardé pour une reprise au prochain passage
+    assert 0 < os.path.getsize(str(dest) + ".part") < len(body)
@@ -0,0 +1,37 @@
+"""
+parse_page sur des pages d'annales enregistrées (tests/fixtures) : les
+sujets et exercices extraits doivent être exactement ceux attendus.
+Pour ajouter une page : l'enregistrer en <nom>.html et écrire à côté
+<nom>.expected.json ({"page", "subjects", "exercises"}).
+"""
+import glob
+import json
+import os
+
+import pytest
+
+import getAnnales
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+PAGES = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+PARSERS = ["html.parser", pytest.param("lxml", marks=pytest.mark.skipif(
+    getAnnales.HTML_PARSER != "lxml", reason="lxml absent"))]
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("html_path", PAGES, ids=os.path.basename)
+def test_parse_page_matches_expected(html_path, parser):
+    with open(html_path, "r", encoding="utf-8") as f:
+        html = f.read()
+    with open(html_path[:-len(".html")] + ".expected.json", "r", encoding="utf-8") as f:
+        expected = json.load(f)
+
+    subjects, exercises = getAnnales.parse_page(expected["page"], html, parser)
+
+    assert subjects == expected["subjects"]
+    assert exercises == expected["exercises"]
+
+
+def test_parse_page_without_table():
+    html = "<html><body><p>Page en travaux</p></body></html>"
+    assert getAnnales.parse_page(getAnnales.PAGES[0], html, "html.parser") == ([], [])
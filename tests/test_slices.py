@@ -0,0 +1,36 @@
+"""Cache d'extraits de PDF (exercise_pages.SliceCache)."""
+import os
+
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+
+from exercise_pages import SliceCache  # noqa: E402
+
+
+@pytest.fixture
+def src(tmp_path):
+    writer = pypdf.PdfWriter()
+    for _ in range(4):
+        writer.add_blank_page(width=200, height=200)
+    path = tmp_path / "SUJET.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_open_handle_survives_eviction(tmp_path, src):
+    cache = SliceCache(str(tmp_path / "slices"), max_bytes=1)
+    with cache.open(src, "a" * 64, 1, 2) as first:
+        # une autre requête remplit le cache : le premier extrait est supprimé du disque
+        cache.open(src, "a" * 64, 3, 4).close()
+        assert not os.path.exists(first.name)
+        assert len(pypdf.PdfReader(first).pages) == 2
+
+
+def test_open_recreates_deleted_slice(tmp_path, src):
+    cache = SliceCache(str(tmp_path / "slices"))
+    with cache.open(src, "a" * 64, 2, 3) as f:
+        os.remove(f.name)
+    with cache.open(src, "a" * 64, 2, 3) as f:
+        assert len(pypdf.PdfReader(f).pages) == 2
@@ -0,0 +1,154 @@
+"""
+Aperçus des PDF téléchargés (sujets et corrigés) pour les cartes de résultats.
+
+Étape hors ligne (python thumbnails.py, après exercise_pages.py) :
+- chaque PDF de downloads/NSI/ est lu dans un pool de processus (module
+  optionnel pymupdf) : nombre de pages et miniature JPEG de la première
+  page, ainsi que de la première page de chaque exercice des sujets
+  (plages de exercise_pages.json) ;
+- les miniatures sont rangées par empreinte du contenu
+  (downloads/thumbnails/<2 car.>/<sha256>-<page>.jpg, avec <sha256>.json :
+  pages, miniatures déjà produites) : seuls les nouveaux PDF, ou les
+  nouvelles pages, sont rendus ;
+- le manifeste downloads/thumbnails/index.json associe chaque fichier
+  ({"sha256", "pages", "size", "thumbs"}) ; l'interface le lit via /data.
+
+Côté serveur, /thumbs/<sha256>-<page>.jpg est adressé par contenu : les
+navigateurs gardent les miniatures indéfiniment, sans jamais ouvrir les PDF.
+"""
+import importlib.util
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DOWNLOADS_DIR = os.path.join(BASE_DIR, "downloads")
+THUMBS_DIR = os.path.join(DOWNLOADS_DIR, "thumbnails")
+MANIFEST_PATH = os.path.join(THUMBS_DIR, "index.json")
+
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+MANIFEST_FORMAT = 1
+WIDTH = 240         # pixels (affichée en 120 px : nette sur écran haute densité)
+JPEG_QUALITY = 70
+
+THUMB_NAME_RE = re.compile(r"^([0-9a-f]{64})-(\d+)\.jpg$")
+
+
+def thumb_path(sha256: str, page: int) -> str:
+    return os.path.join(THUMBS_DIR, sha256[:2], f"{sha256}-{page}.jpg")
+
+
+def _meta_path(sha256: str) -> str:
+    return os.path.join(THUMBS_DIR, sha256[:2], f"{sha256}.json")
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+# ---------- Rendu (hors ligne) ----------
+
+def render_pages(path: str, sha256: str, pages: List[int]) -> dict:
+    """
+    Nombre de pages du PDF et miniatures des pages demandées (à partir de 1,
+    celles qui dépassent sont ignorées). Exécuté dans un processus du pool :
+    les images sont écrites directement dans le cache.
+    """
+    import pymupdf  # optionnel, lourd : chargé seulement par les processus de rendu
+
+    try:
+        with pymupdf.open(path) as doc:
+            rendered = []
+            for p in pages:
+                if not 1 <= p <= doc.page_count:
+                    continue
+                page = doc[p - 1]
+                zoom = WIDTH / page.rect.width
+                pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+                dest = thumb_path(sha256, p)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = f"{dest}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY))
+                os.replace(tmp, dest)
+                rendered.append(p)
+            return {"pages": doc.page_count, "thumbs": rendered}
+    except Exception as e:  # PDF corrompu / chiffré : on garde une trace
+        return {"pages": None, "thumbs": [], "error": f"{type(e).__name__}: {e}"}
+
+
+def _wanted_pages(pdfs: List[str], root: str) -> Dict[str, set]:
+    """{chemin relatif: pages à prévisualiser} : la première, et celle de chaque exercice."""
+    from exercise_pages import load_ranges
+    ranges = load_ranges(os.path.join(root, "exercise_pages.json"))
+    return {rel: {1} | {r[0] for r in ranges.get(rel, {}).values()} for rel in pdfs}
+
+
+def update_thumbnails(root: str = DOWNLOADS_DIR, workers: int = MAX_WORKERS) -> str:
+    """Rendu incrémental (par sha256) puis réécriture du manifeste."""
+    # imports locaux : le serveur n'utilise que thumb_path/existing_thumb,
+    # sans charger pypdf (importé par fulltext)
+    from fulltext import _write_json_atomic, file_sha256, list_pdfs
+    pdfs = list_pdfs(root)
+    hashes = {rel: file_sha256(os.path.join(root, rel)) for rel in pdfs}
+
+    # un même PDF peut être présent sous plusieurs noms : rendu une fois
+    wanted: Dict[str, set] = {}
+    source: Dict[str, str] = {}
+    for rel, pages in _wanted_pages(pdfs, root).items():
+        wanted.setdefault(hashes[rel], set()).update(pages)
+        source.setdefault(hashes[rel], rel)
+
+    metas: Dict[str, dict] = {}
+    todo = []
+    for sha, pages in wanted.items():
+        meta = _read_json(_meta_path(sha), None)
+        if meta is not None and (meta.get("error") or
+                                 all(p in meta["thumbs"] or p > meta["pages"] for p in pages)):
+            metas[sha] = meta
+            continue
+        done = set(meta["thumbs"]) if meta else set()
+        todo.append((sha, sorted(pages - done), meta))
+
+    if todo:
+        if importlib.util.find_spec("pymupdf") is None:
+            raise RuntimeError("Le module pymupdf est nécessaire pour les aperçus des PDF (pip install pymupdf).")
+        print(f"Aperçus de {len(todo)} PDF...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths = [os.path.join(root, source[sha]) for sha, _, _ in todo]
+            results = pool.map(render_pages, paths, [sha for sha, _, _ in todo], [p for _, p, _ in todo])
+            for (sha, _, previous), result in zip(todo, results):
+                if result.get("error"):
+                    print(f"  ⚠️ {source[sha]} : {result['error']}")
+                elif previous:
+                    result["thumbs"] = sorted(set(previous["thumbs"]) | set(result["thumbs"]))
+                _write_json_atomic(_meta_path(sha), result)
+                metas[sha] = result
+
+    files = {}
+    for rel, sha in hashes.items():
+        meta = metas[sha]
+        files[rel] = {"sha256": sha, "pages": meta["pages"], "size": os.path.getsize(os.path.join(root, rel)),
+                      "thumbs": meta["thumbs"]}
+    _write_json_atomic(MANIFEST_PATH, {"format": MANIFEST_FORMAT, "width": WIDTH, "files": files})
+    print(f"Aperçus : {sum(len(f['thumbs']) for f in files.values())} miniatures pour {len(files)} PDF.")
+    return MANIFEST_PATH
+
+
+def existing_thumb(name: str) -> Optional[str]:
+    """Chemin de la miniature `<sha256>-<page>.jpg` si elle existe, None sinon."""
+    m = THUMB_NAME_RE.match(name)
+    if m is None:
+        return None
+    path = thumb_path(m.group(1), int(m.group(2)))
+    return path if os.path.isfile(path) else None
+
+
+if __name__ == "__main__":
+    update_thumbnails()
@@ -0,0 +1,326 @@
+"""
+Classification des thèmes, partagée par le scraper (getAnnales.py) et la
+standardisation (annales.py).
+
+Toutes les règles sont compilées une fois à l'import :
+- TOPIC_PATTERNS -> un automate d'Aho-Corasick sur les sous-chaînes que
+  chaque motif impose (un passage sur le texte), seuls les motifs candidats
+  étant ensuite vérifiés par leur regex ;
+- CONTAINS_RULES -> une alternation de sous-chaînes ;
+et les normalisations de thèmes sont mémoïsées (LRU, à la taille du
+vocabulaire des thèmes).
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    from re import _constants as _sre, _parser as _sre_parse  # Python 3.11+
+except ImportError:
+    import sre_constants as _sre, sre_parse as _sre_parse
+
+CACHE_SIZE = 4096  # thèmes distincts gardés (les libellés bruts, eux, ne sont pas mémoïsés)
+
+# ---------- Règles du scraper (libellés bruts -> thèmes "canon") ----------
+
+TOPIC_ALIASES = {
+    "poo": "programmation orientée objet",
+    "bdd": "bases de données",
+    "bases de données relationnelles": "bases de données",
+    "sql": "sql",
+    "arbres binaires": "arbres binaires",
+    "graphes": "graphes",
+    "récursivité": "récursivité",
+    "réseaux": "réseaux",
+    "processus": "processus",
+    "piles": "piles",
+    "files": "files",
+    "dictionnaires": "dictionnaires",
+    "tableaux": "tableaux",
+    "tris": "tris",
+    "gloutons": "algorithmes gloutons",
+    "programmation dynamique": "programmation dynamique",
+    "huffman": "huffman",
+    "compression": "compression",
+    "décidabilité": "décidabilité",
+    "sécurisation des communications": "sécurité / crypto",
+    "cryptographie": "sécurité / crypto",
+}
+
+# Liste de thèmes "canon" + motifs de détection (tu peux enrichir)
+TOPIC_PATTERNS = [
+    ("sql", r"\bsql\b|requêtes?\s+sql|langage\s+sql"),
+    ("bases de données", r"bases?\s+de\s+donn(e|é)es?|mod[eè]le\s+relationnel"),
+    ("graphes", r"\bgraphes?\b|parcours\s+de\s+graphes?|chemins?\s+dans\s+un\s+graphe"),
+    ("arbres binaires", r"arbres?\s+binaires?"),
+    ("arbres binaires de recherche", r"arbres?\s+binaires?\s+de\s+recherche"),
+    ("récursivité", r"r[eé]cursivit[eé]|r[eé]cursif"),
+    ("programmation orientée objet", r"\bpoo\b|programmation\s+orient[eé]e\s+objet|programmation\s+objet"),
+    ("programmation python", r"\bpython\b|programmation\s+en\s+python"),
+    ("tableaux", r"\btableaux?\b"),
+    ("dictionnaires", r"\bdictionnaires?\b"),
+    ("listes", r"\blistes?\b"),
+    ("piles", r"\bpiles?\b|lifo"),
+    ("files", r"\bfiles?\b|fifo"),
+    ("tris", r"\btris?\b|tri\s+fusion|tri\s+rapide|algorithmes?\s+de\s+tri"),
+    ("algorithmes gloutons", r"\bglouton(s)?\b"),
+    ("programmation dynamique", r"\bprogrammation\s+dynamique\b"),
+    ("réseaux", r"r[eé]seaux?|adressage\s+ip|cidr|routeurs?|routage|ospf|rip|protocoles?\s+r[eé]seau"),
+    ("processus", r"\bprocessus\b|ordonnancement|interblocage"),
+    ("systèmes d’exploitation", r"syst[eè]mes?\s+d['’]exploitation|linux|unix|ligne\s+de\s+commande"),
+    ("sécurité / crypto", r"cryptographie|s[eé]curisation|s[eé]curit[eé]\s+des\s+communications"),
+    ("huffman", r"\bhuffman\b|compression"),
+    ("décidabilité", r"d[eé]cidabilit[eé]"),
+]
+
+# ---------- Règles de standardisation (thèmes -> format homogène) ----------
+
+# règles "contient → devient" (la première règle présente gagne)
+CONTAINS_RULES = [
+    ("objet", "poo"),
+    ("gloutons", "algorithmes gloutons"),
+    ("arbres", "arbres"),
+    ("arbre", "arbres"),
+    ("algo", "programmation"),
+    ("securite", "chiffrement"),
+    ("sql", "bases de donnees"),
+    ("programmation", "programmation"),
+    ("graphe", "graphes"),
+    ("liste", "listes"),
+    ("tableau", "tableaux"),
+    ("huffman", "divers"),
+    ("goban", "divers"),
+]
+
+# exemples de standardisation (tu peux enrichir)
+STANDARD_ALIASES = {
+    "poo": "programmation orientee objet",
+    "programmation orientee objet": "programmation orientee objet",
+    "programmation orientee objet (poo)": "programmation orientee objet",
+    "arbres binaires": "arbres binaires",
+    "recursivite": "recursivite",
+    "algorithmes": "algorithmes",
+}
+
+# Empreinte des règles : change dès qu'une table ci-dessus est modifiée
+RULES_VERSION = hashlib.sha256(
+    json.dumps([TOPIC_ALIASES, TOPIC_PATTERNS, CONTAINS_RULES, STANDARD_ALIASES], ensure_ascii=False).encode("utf-8")
+).hexdigest()[:16]
+
+
+# ---------- Compilation ----------
+
+_PATTERNS = [re.compile(pat, re.I) for _, pat in TOPIC_PATTERNS]
+
+
+def _required(items) -> Optional[Set[str]]:
+    """
+    Sous-chaînes (minuscules) dont au moins une figure dans toute
+    correspondance de la regex analysée (sre_parse), None si on ne sait pas
+    en trouver. Parmi les possibilités, garde celle dont la plus courte
+    sous-chaîne est la plus longue (la plus sélective).
+    """
+    options, run = [], []
+
+    def flush():
+        if run:
+            options.append({"".join(run)})
+            run.clear()
+
+    for op, av in items:
+        if op is _sre.LITERAL:
+            run.append(chr(av).lower())
+        elif op is _sre.AT:  # \b, ^... : ne consomme rien
+            continue
+        else:
+            flush()
+            if op is _sre.BRANCH:
+                subs = [_required(b) for b in av[1]]
+                if all(subs):
+                    options.append(set().union(*subs))
+            elif op is _sre.SUBPATTERN:
+                sub = _required(av[-1])
+                if sub:
+                    options.append(sub)
+            elif op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT) and av[0] >= 1:
+                sub = _required(av[2])
+                if sub:
+                    options.append(sub)
+    flush()
+    if not options:
+        return None
+    return max(options, key=lambda o: min(len(x) for x in o))
+
+
+def _build_automaton(needles: List[Optional[Set[str]]]):
+    """
+    Automate d'Aho-Corasick (transitions complètes) : état -> {car: état},
+    et pour chaque état les motifs dont une sous-chaîne s'y termine.
+    """
+    goto: List[Dict[str, int]] = [{}]
+    out: List[Set[int]] = [set()]
+    for i, subs in enumerate(needles):
+        for sub in subs or ():
+            state = 0
+            for ch in sub:
+                if ch not in goto[state]:
+                    goto[state][ch] = len(goto)
+                    goto.append({})
+                    out.append(set())
+                state = goto[state][ch]
+            out[state].add(i)
+
+    # parcours en largeur : l'état de repli (fail) est toujours déjà complet
+    delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        delta[state] = dict(delta[fail[state]])
+        delta[state].update(goto[state])
+        out[state] |= out[fail[state]]
+        for ch, child in goto[state].items():
+            fail[child] = delta[fail[state]].get(ch, 0)
+            queue.append(child)
+    return delta, [frozenset(o) for o in out]
+
+
+_NEEDLES = [_required(_sre_parse.parse(pat, re.I)) for _, pat in TOPIC_PATTERNS]
+_DELTA, _OUT = _build_automaton(_NEEDLES)
+_ALWAYS = frozenset(i for i, subs in enumerate(_NEEDLES) if subs is None)  # toujours vérifiés
+
+# lookahead : à chaque position, la première règle (dans l'ordre) qui commence là
+_CONTAINS_RE = re.compile("(?=" + "|".join(f"({re.escape(needle)})" for needle, _ in CONTAINS_RULES) + ")")
+
+_PARENS_RE = re.compile(r"\([^)]*\)")
+_INTRO_RE = re.compile(r"^cet exercice (porte sur|traite de|concerne)\s+", re.I)
+_SPACES_RE = re.compile(r"\s+")
+_SPLIT_RE = re.compile(r",|;|/|\bet\b", re.I)
+_ACCENTS = str.maketrans("éèêàïîôùç", "eeeaiiouc")
+
+
+def strip_accents(s: str) -> str:
+    # enlève les accents (Amérique -> Amerique)
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", s)
+        if not unicodedata.combining(c)
+    )
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def norm_topic(t: str) -> str:
+    t0 = t.strip().lower().translate(_ACCENTS)
+    t0 = t0.replace("(", "").replace(")", "")
+    t0 = _SPACES_RE.sub(" ", t0).strip()
+    return TOPIC_ALIASES.get(t0, t.strip().lower())
+
+
+def clean_theme_text(s: str) -> str:
+    s = (s or "").strip()
+
+    # Enlever parenthèses d'annotations (1re), (Tle), etc.
+    s = _PARENS_RE.sub(" ", s)
+
+    # Enlever les tournures "Cet exercice porte sur ..."
+    s = _INTRO_RE.sub("", s)
+
+    # Nettoyage ponctuation/espaces
+    s = s.replace("POO", "programmation orientée objet")
+    s = s.replace("BDD", "bases de données")
+    s = _SPACES_RE.sub(" ", s).strip(" .:-\n\t")
+    return s
+
+
+def _matching_patterns(s: str) -> List[int]:
+    """
+    Indices des TOPIC_PATTERNS présents dans `s` (en minuscules) : un passage
+    de l'automate donne les motifs candidats, seuls ceux-là sont vérifiés
+    par re.search. Résultat identique à un re.search par motif.
+    """
+    delta, out = _DELTA, _OUT
+    state, candidates = 0, set(_ALWAYS)
+    for ch in s:
+        state = delta[state].get(ch, 0)
+        if out[state]:
+            candidates |= out[state]
+    return [i for i in sorted(candidates) if _PATTERNS[i].search(s)]
+
+
+def _split_topics(raw: str):
+    cleaned = clean_theme_text(raw)
+    found = [TOPIC_PATTERNS[i][0] for i in _matching_patterns(cleaned.lower())]
+
+    # fallback si rien trouvé : découpage soft (mais propre)
+    if not found:
+        for p in _SPLIT_RE.split(cleaned):
+            p = p.strip(" .:-\n\t")
+            if len(p) >= 3:
+                found.append(norm_topic(p))
+
+    # dédoublonnage en gardant l’ordre
+    return tuple(dict.fromkeys(found))
+
+
+def split_topics(raw: str) -> List[str]:
+    """Thèmes "canon" d'un libellé brut d'exercice (ordre de TOPIC_PATTERNS)."""
+    return list(_split_topics(raw or ""))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_topic(topic: str) -> str:
+    """
+    Normalise un topic vers un format homogène.
+    À adapter selon tes règles métier.
+    """
+    if not isinstance(topic, str):
+        return ""
+
+    t = topic.strip().lower()
+    t = t.replace("’", "'")
+    t = strip_accents(t)
+
+    # espaces propres
+    t = _SPACES_RE.sub(" ", t)
+
+    # règles "contient → devient" : la règle de plus petit indice présente
+    best = None
+    for m in _CONTAINS_RE.finditer(t):
+        i = m.lastindex - 1
+        if best is None or i < best:
+            best = i
+            if best == 0:
+                break
+    if best is not None:
+        return CONTAINS_RULES[best][1]
+
+    return STANDARD_ALIASES.get(t, t)
+
+
+def standardize_topics(topics: Any) -> List[str]:
+    """
+    - garde seulement les strings
+    - normalise
+    - supprime les vides
+    - supprime doublons en gardant l'ordre
+    - tri optionnel (désactivé ici, on garde l'ordre d'apparition)
+    """
+    if not isinstance(topics, list):
+        return []
+
+    seen = set()
+    out: List[str] = []
+    for x in topics:
+        if not isinstance(x, str):
+            continue
+        nx = normalize_topic(x)
+        if not nx:
+            continue
+        if nx in seen:
+            continue
+        seen.add(nx)
+        out.append(nx)
+    return out